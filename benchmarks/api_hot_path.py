@@ -0,0 +1,300 @@
+"""
+Microbenchmark of the API request hot path: validation, cache lookup, serialization and
+logging, calling the ASGI app in-process without an HTTP client or server. Redis is replaced
+by fakeredis and the queue by the in-memory stand-in, so only the Python side is measured.
+
+Logs are written at INFO to /dev/null, so their formatting is measured but not the terminal.
+Besides the req/s of wall time, the req/s of CPU time of the process are reported, as they
+are less sensitive to the other load of the host.
+
+Example:
+
+    python -m benchmarks.api_hot_path --requests 5000 --concurrency 20 --output hot_path.json
+
+Run it on two commits to compare their req/s.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from urllib.parse import urlencode
+
+from benchmarks.run import random_cnpj
+from benchmarks.standins import InMemoryRabbitMQClient, in_memory_redis
+
+SCENARIOS = ("results_hit", "scrape_hit", "scrape_enqueue", "batch")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument(
+        "--requests", type=int, default=5000, help="Requests per scenario"
+    )
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="CNPJs per /scrape/batch request"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON report file. Defaults to stdout only")
+    return parser.parse_args()
+
+
+def create_app():
+    """
+    :return: The API app with the in-memory stand-ins
+    :rtype: fastapi.FastAPI
+    """
+    os.environ.update(
+        SCRAPE_URL="http://in-memory",
+        RABBITMQ_URL="amqp://in-memory",
+        RABBITMQ_QUEUE="benchmark",
+        REDIS_URL="redis://in-memory",
+        RESULT_STORE="none",
+        LOG_LEVEL="INFO",
+    )
+    from webscraper.app import create_app as create_api
+
+    app = create_api()
+    app.state.redis_client._redis = in_memory_redis()
+    app.state.rabbitmq_client = InMemoryRabbitMQClient()
+    return app
+
+
+async def seed_cache(app, cnpjs):
+    """
+    Stores a COMPLETED result for each CNPJ, as the worker would.
+
+    :param fastapi.FastAPI app: The API app
+    :param list[str] cnpjs: The CNPJs
+    :rtype: None
+    """
+    from webscraper.models.cache_dto import CacheMessageDTO
+    from webscraper.services.scrape import ScrapeService
+
+    service = ScrapeService("http://in-memory", app.state.redis_client)
+    data = {f"field_{i}": f"value {i}" for i in range(30)}
+    for cnpj in cnpjs:
+        await service.set_cache(cnpj, CacheMessageDTO(status="COMPLETED", data=data))
+
+
+def formatted(cnpj):
+    """
+    :param str cnpj: The 14 digits of a CNPJ
+    :return: The CNPJ with its punctuation, as clients usually send it
+    :rtype: str
+    """
+    return f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+
+
+def build_requests(scenario, rng, count, cached, batch_size):
+    """
+    :return: The (method, path, query string, JSON body) of each request of the scenario
+    :rtype: list[tuple[str, str, bytes, bytes]]
+    """
+    if scenario == "results_hit":
+        return [
+            ("GET", f"/results/{rng.choice(cached)}", b"", b"") for _ in range(count)
+        ]
+    if scenario == "scrape_hit":
+        return [
+            (
+                "POST",
+                "/scrape/",
+                urlencode({"cnpj": formatted(rng.choice(cached))}).encode(),
+                b"",
+            )
+            for _ in range(count)
+        ]
+    if scenario == "scrape_enqueue":
+        return [
+            (
+                "POST",
+                "/scrape/",
+                urlencode({"cnpj": formatted(random_cnpj(rng))}).encode(),
+                b"",
+            )
+            for _ in range(count)
+        ]
+    return [
+        (
+            "POST",
+            "/scrape/batch",
+            b"",
+            json.dumps(
+                {"cnpjs": [formatted(random_cnpj(rng)) for _ in range(batch_size)]}
+            ).encode(),
+        )
+        for _ in range(count)
+    ]
+
+
+async def call(app, method, path, query_string, body):
+    """
+    Calls the ASGI app directly, so the time of an HTTP client is not measured.
+
+    :return: The status code of the response
+    :rtype: int
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": [
+            (b"host", b"api"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("api", 80),
+    }
+    response = {}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+
+    await app(scope, receive, send)
+    return response["status"]
+
+
+async def run_scenario(app, requests, concurrency):
+    """
+    Sends the requests with 'concurrency' clients at once.
+
+    :return: Requests per second of wall time and of CPU time, and the status codes seen
+    :rtype: tuple[float, float, dict[int, int]]
+    """
+    statuses = {}
+    pending = iter(requests)
+
+    async def send_forever():
+        for request in pending:
+            status = await call(app, *request)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    await asyncio.gather(*(send_forever() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    cpu_elapsed = time.process_time() - cpu_started
+
+    return len(requests) / elapsed, len(requests) / cpu_elapsed, statuses
+
+
+def time_components(rng, batch_size, repeat):
+    """
+    Times the steps of the hot path on their own, taking the best of 'repeat' runs, which is
+    steadier than the req/s on a busy host.
+
+    :return: Microseconds per call of each step
+    :rtype: list[dict]
+    """
+    from webscraper.helpers.views_helper import ViewsHelper
+    from webscraper.models.batch_dto import BatchItemDTO
+    from webscraper.models.message_dto import ScrapeJobMessageDTO
+
+    cnpj = formatted(random_cnpj(rng))
+    batch = [formatted(random_cnpj(rng)) for _ in range(batch_size)]
+    # Every tenth CNPJ of the batch is not valid
+    batch[::10] = ["not a CNPJ"] * len(batch[::10])
+    items = [BatchItemDTO(cnpj=c, status="QUEUED") for c in batch]
+
+    components = {
+        "message_dto": (lambda: ScrapeJobMessageDTO(cnpj=cnpj), 2000),
+        "validate_batch": (lambda: ViewsHelper.validate_cnpjs(batch), 20),
+        "render_batch": (lambda: ViewsHelper.make_response(data=items).body, 20),
+    }
+    results = []
+    for name, (function, number) in components.items():
+        best = min(timeit.repeat(function, number=number, repeat=repeat))
+        results.append(
+            {"component": name, "us_per_call": round(best / number * 1e6, 2)}
+        )
+    return results
+
+
+def git_commit():
+    """
+    :return: The commit of the working tree, or None outside of a git repository
+    :rtype: str | None
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main():
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        stream=open(os.devnull, "w"),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    app = create_app()
+    rng = random.Random(args.seed)
+    cached = [random_cnpj(rng) for _ in range(1000)]
+    await seed_cache(app, cached)
+
+    report = {"commit": git_commit(), "python": sys.version.split()[0], "results": []}
+    for scenario in args.scenario:
+        count = args.requests if scenario != "batch" else max(args.requests // 50, 1)
+        rates = []
+        cpu_rates = []
+        for _ in range(args.repeat):
+            requests = build_requests(scenario, rng, count, cached, args.batch_size)
+            rate, cpu_rate, statuses = await run_scenario(
+                app, requests, args.concurrency
+            )
+            rates.append(rate)
+            cpu_rates.append(cpu_rate)
+        result = {
+            "scenario": scenario,
+            "requests": count,
+            "req_per_s": round(statistics.median(rates), 1),
+            "req_per_cpu_s": round(statistics.median(cpu_rates), 1),
+            "statuses": statuses,
+        }
+        if scenario == "batch":
+            result["cnpjs_per_s"] = round(result["req_per_s"] * args.batch_size, 1)
+        report["results"].append(result)
+        print(json.dumps(result), flush=True)
+
+    report["components"] = time_components(rng, args.batch_size, args.repeat)
+    for component in report["components"]:
+        print(json.dumps(component), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
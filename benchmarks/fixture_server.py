@@ -0,0 +1,149 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FixtureServer(object):
+    """
+    Local HTTP server that mimics the target CNPJ form and its result page.
+
+    The form page is a plain HTML form with the same fields as the real one, and the
+    result page renders 'fields' items under div.container.doc. Every response is delayed
+    by 'latency' seconds and pages reference 'asset_kb' KB of static assets.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fields=30, asset_kb=0):
+        """
+        :param str host: Host to bind the server to
+        :param int port: Port to bind the server to, 0 picks a free one
+        :param float latency: Seconds each response is delayed
+        :param int fields: Number of fields in the result document
+        :param int asset_kb: Size in KB of the image and stylesheet referenced by the pages
+        :rtype: None
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fields = fields
+        self.asset_kb = asset_kb
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        :return: URL of the form page
+        :rtype: str
+        """
+        return f"http://{self.host}:{self.port}/Sintegra/Consulta/default.html"
+
+    def form_page(self):
+        """
+        :return: Markup of the form page
+        :rtype: str
+        """
+        return f"""<html><head>{self._assets()}</head><body>
+<form name="frmConsulta" method="post" action="consultar">
+  <input type="hidden" name="session" value="fixture">
+  <input type="radio" id="rTipoDocCNPJ" name="rTipoDoc" value="2">
+  <input type="radio" id="rTipoDocIE" name="rTipoDoc" value="1" checked>
+  <input type="text" id="tCNPJ" name="tCNPJ">
+  <input type="submit" name="btCGC" value="Consultar">
+</form></body></html>"""
+
+    def result_page(self, cnpj):
+        """
+        :param str cnpj: The CNPJ submitted in the form
+        :return: Markup of the result page
+        :rtype: str
+        """
+        items = [
+            '<div class="item"><span class="label_title">CNPJ:</span>'
+            f'<span class="label_text">{cnpj}</span></div>'
+        ]
+        for index in range(1, self.fields):
+            if index % 2:
+                items.append(
+                    f'<div class="item"><span class="label_title">Campo {index}:</span>'
+                    f'<span class="label_text"> Valor {index} </span></div>'
+                )
+            else:
+                items.append(
+                    '<div class="col box"><span class="label_text">'
+                    f"<strong>Campo {index}:</strong></span>"
+                    f'<span class="label_text">Valor {index}</span></div>'
+                )
+        return (
+            f"<html><head>{self._assets()}</head><body>"
+            f'<div class="container doc">{"".join(items)}</div></body></html>'
+        )
+
+    def _assets(self):
+        """
+        :return: Markup referencing the static assets, if any
+        :rtype: str
+        """
+        if not self.asset_kb:
+            return ""
+        return '<link rel="stylesheet" href="/static/style.css"><img src="/static/logo.png">'
+
+    def _handler(self):
+        """
+        :return: Request handler class bound to this server
+        :rtype: type
+        """
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body, content_type="text/html; charset=utf-8"):
+                time.sleep(fixture.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/static/"):
+                    self._send(
+                        b" " * fixture.asset_kb * 1024, "application/octet-stream"
+                    )
+                else:
+                    self._send(fixture.form_page().encode())
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                cnpj = form.get("tCNPJ", [""])[0]
+                self._send(fixture.result_page(cnpj).encode())
+
+        return Handler
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+
+        :rtype: None
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the server.
+
+        :rtype: None
+        """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,402 @@
+"""
+End-to-end benchmark of the API and the scrape worker against local stand-ins.
+
+Example:
+
+    python -m benchmarks.run --engine http playwright --concurrency 1 10 --jobs 200 \
+        --output bench.json
+
+Resource blocking and form page reuse can be compared with --block-resources on off and
+--reuse-form-page on off, the report has the KB downloaded and requests blocked per job.
+
+With --bulk-fraction, that share of the jobs is submitted first through /scrape/batch in
+the bulk lane, and the latency is also reported per lane.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.standins import InMemoryRabbitMQClient, in_memory_redis
+
+
+def random_cnpj(rng):
+    """
+    Generates a random CNPJ with valid check digits.
+
+    :param random.Random rng: Random generator
+    :return: The 14 digits CNPJ
+    :rtype: str
+    """
+    digits = [rng.randint(0, 9) for _ in range(8)] + [0, 0, 0, 1]
+    for weights in (
+        (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2),
+        (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2),
+    ):
+        remainder = sum(d * w for d, w in zip(digits, weights)) % 11
+        digits.append(0 if remainder < 2 else 11 - remainder)
+    return "".join(map(str, digits))
+
+
+def percentile(values, pct):
+    """
+    :param list[float] values: Sorted values
+    :param float pct: Percentile between 0 and 100
+    :return: The nearest-rank percentile, or None if there are no values
+    :rtype: float | None
+    """
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def rss_bytes(pid=None):
+    """
+    Resident memory of a process and all its descendants (e.g. browser processes).
+    Falls back to the peak RSS of this process outside Linux.
+
+    :param int pid: Process id, defaults to the current process
+    :return: Resident memory in bytes
+    :rtype: int
+    """
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            rss = next(
+                int(line.split()[1]) * 1024
+                for line in status
+                if line.startswith("VmRSS:")
+            )
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return rss + sum(rss_bytes(int(child)) for child in children.read().split())
+    except (OSError, StopIteration):
+        if pid != os.getpid():
+            return 0
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def page_totals():
+    """
+    :return: Cumulative bytes downloaded by the browser pages, jobs and blocked requests
+    :rtype: tuple[float, float, float]
+    """
+    from webscraper.helpers.metrics import Metrics
+
+    totals = {}
+    for metric in (Metrics.PAGE_BYTES, Metrics.PAGE_REQUESTS_TOTAL):
+        for collected in metric.collect():
+            for sample in collected.samples:
+                totals[(sample.name, sample.labels.get("outcome"))] = sample.value
+    return (
+        totals.get(("webscraper_page_bytes_sum", None), 0.0),
+        totals.get(("webscraper_page_bytes_count", None), 0.0),
+        totals.get(("webscraper_page_requests_total", "blocked"), 0.0),
+    )
+
+
+def stage_totals():
+    """
+    :return: Cumulative (sum, count) of each scrape stage histogram
+    :rtype: dict[str, list[float]]
+    """
+    from webscraper.helpers.metrics import Metrics
+
+    totals = {}
+    for metric in Metrics.SCRAPE_STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            stage = sample.labels.get("stage")
+            if sample.name.endswith("_sum"):
+                totals.setdefault(stage, [0.0, 0.0])[0] = sample.value
+            elif sample.name.endswith("_count"):
+                totals.setdefault(stage, [0.0, 0.0])[1] = sample.value
+    return totals
+
+
+def latency_report(latencies):
+    """
+    :param list[float] latencies: Sorted latencies in milliseconds
+    :return: Mean and percentiles of the latencies, None if there are none
+    :rtype: dict | None
+    """
+    if not latencies:
+        return None
+    return {
+        "mean": round(statistics.fmean(latencies), 3),
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+    }
+
+
+async def run_scenario(
+    fixture,
+    engine,
+    concurrency,
+    pool_size,
+    jobs,
+    api_concurrency,
+    seed,
+    bulk_fraction=0,
+    rate_limit=0,
+    block_resources=True,
+    reuse_form_page=False,
+):
+    """
+    Runs one benchmark scenario: submits 'jobs' CNPJs through the API and waits until
+    the worker completed all of them.
+
+    :return: The scenario report
+    :rtype: dict
+    """
+    os.environ.update(
+        SCRAPE_URL=fixture.url,
+        SCRAPE_ENGINE=engine,
+        RABBITMQ_URL="amqp://in-memory",
+        RABBITMQ_QUEUE="benchmark",
+        REDIS_URL="redis://in-memory",
+        WORKER_CONCURRENCY=str(concurrency),
+        BROWSER_POOL_SIZE=str(pool_size),
+        BROWSER_MAX_PAGES=str(concurrency),
+        LOG_LEVEL="WARNING",
+        UPSTREAM_RATE_LIMIT=str(bool(rate_limit)).lower(),
+        UPSTREAM_RATE_INITIAL=str(rate_limit or 5),
+        UPSTREAM_RATE_MAX=str(rate_limit or 50),
+        BROWSER_BLOCK_RESOURCES=(
+            '["image", "media", "font", "stylesheet"]' if block_resources else "[]"
+        ),
+        BROWSER_BLOCK_THIRD_PARTY=str(block_resources).lower(),
+        BROWSER_REUSE_FORM_PAGE=str(reuse_form_page).lower(),
+        RESULT_STORE="none",
+    )
+
+    from webscraper.app import create_app
+    from webscraper.config import Settings
+    from webscraper.worker.worker import ScrapeWorker
+
+    redis = in_memory_redis()
+    rabbitmq_client = InMemoryRabbitMQClient()
+
+    app = create_app()
+    app.state.redis_client._redis = redis
+    app.state.rabbitmq_client = rabbitmq_client
+
+    worker = ScrapeWorker(Settings())
+    worker._redis_client._redis = redis
+    worker._rabbitmq_client = rabbitmq_client
+
+    submitted = {}
+    finished = {}
+    done = asyncio.Event()
+    set_cache = worker._scrape_service.set_cache
+
+    async def tracking_set_cache(cnpj, cache, *args, **kwargs):
+        await set_cache(cnpj, cache, *args, **kwargs)
+        if cache.status in ("COMPLETED", "FAILED") and cnpj not in finished:
+            finished[cnpj] = (time.perf_counter(), cache.status)
+            if len(finished) == jobs:
+                done.set()
+
+    worker._scrape_service.set_cache = tracking_set_cache
+
+    rng = random.Random(seed)
+    cnpjs = set()
+    while len(cnpjs) < jobs:
+        cnpjs.add(random_cnpj(rng))
+    cnpjs = sorted(cnpjs)
+    bulk_count = int(jobs * bulk_fraction)
+    bulk, interactive = cnpjs[:bulk_count], cnpjs[bulk_count:]
+
+    stages_before = stage_totals()
+    pages_before = page_totals()
+    worker_task = asyncio.create_task(worker.start_worker())
+    slots = asyncio.Semaphore(api_concurrency)
+    started = time.perf_counter()
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://api"
+    ) as client:
+
+        async def submit(cnpj):
+            async with slots:
+                submitted[cnpj] = time.perf_counter()
+                response = await client.post("/scrape/", params={"cnpj": cnpj})
+                response.raise_for_status()
+
+        if bulk:
+            now = time.perf_counter()
+            submitted.update((cnpj, now) for cnpj in bulk)
+            response = await client.post(
+                "/scrape/batch",
+                json={"cnpjs": bulk, "priority": "bulk"},
+                headers={"X-Tenant-ID": "backfill"},
+            )
+            response.raise_for_status()
+
+        await asyncio.gather(*(submit(cnpj) for cnpj in interactive))
+        await done.wait()
+
+    elapsed = time.perf_counter() - started
+    memory = rss_bytes()
+
+    worker.stop()
+    await asyncio.gather(worker_task, return_exceptions=True)
+
+    def latencies(cnpjs):
+        return sorted((finished[c][0] - submitted[c]) * 1000 for c in cnpjs)
+
+    stages_after = stage_totals()
+    page_bytes, page_jobs, blocked = (
+        after - before for after, before in zip(page_totals(), pages_before)
+    )
+    stages = {}
+    for stage, (total, count) in stages_after.items():
+        total_before, count_before = stages_before.get(stage, (0.0, 0.0))
+        if count > count_before:
+            stages[stage] = round(
+                (total - total_before) / (count - count_before) * 1000, 3
+            )
+
+    return {
+        "config": {
+            "engine": engine,
+            "concurrency": concurrency,
+            "browser_pool_size": pool_size,
+            "jobs": jobs,
+            "api_concurrency": api_concurrency,
+            "latency_s": fixture.latency,
+            "fields": fixture.fields,
+            "bulk_fraction": bulk_fraction,
+            "rate_limit": rate_limit,
+            "block_resources": block_resources,
+            "reuse_form_page": reuse_form_page,
+        },
+        "duration_s": round(elapsed, 3),
+        "jobs_per_sec": round(jobs / elapsed, 2),
+        "failed": sum(status == "FAILED" for _, status in finished.values()),
+        "latency_ms": latency_report(latencies(cnpjs)),
+        "lanes_latency_ms": {
+            "interactive": latency_report(latencies(interactive)),
+            "bulk": latency_report(latencies(bulk)),
+        },
+        "stages_ms": stages,
+        "page_kb_per_job": (
+            round(page_bytes / page_jobs / 1024, 1) if page_jobs else None
+        ),
+        "blocked_requests_per_job": (
+            round(blocked / page_jobs, 2) if page_jobs else None
+        ),
+        "memory_rss_mb": round(memory / 1024 / 1024, 1),
+    }
+
+
+async def main(args):
+    fixture = FixtureServer(
+        latency=args.latency, fields=args.fields, asset_kb=args.asset_kb
+    )
+    fixture.start()
+
+    results = []
+    try:
+        for engine, concurrency, pool_size, block, reuse in itertools.product(
+            args.engine,
+            args.concurrency,
+            args.pool_size,
+            args.block_resources,
+            args.reuse_form_page,
+        ):
+            report = await run_scenario(
+                fixture,
+                engine,
+                concurrency,
+                pool_size,
+                args.jobs,
+                args.api_concurrency,
+                args.seed,
+                args.bulk_fraction,
+                args.rate_limit,
+                block == "on",
+                reuse == "on",
+            )
+            results.append(report)
+            print(
+                f"engine={engine} concurrency={concurrency} pool={pool_size} "
+                f"block={block} reuse={reuse}: "
+                f"{report['jobs_per_sec']} jobs/s, p50={report['latency_ms']['p50']}ms "
+                f"p95={report['latency_ms']['p95']}ms p99={report['latency_ms']['p99']}ms, "
+                f"rss={report['memory_rss_mb']}MB",
+                file=sys.stderr,
+            )
+    finally:
+        fixture.stop()
+
+    output = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(output, output_file, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--engine", nargs="+", default=["http"], choices=["http", "playwright"]
+    )
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10])
+    parser.add_argument("--pool-size", nargs="+", type=int, default=[1])
+    parser.add_argument(
+        "--block-resources", nargs="+", default=["on"], choices=["on", "off"]
+    )
+    parser.add_argument(
+        "--reuse-form-page", nargs="+", default=["off"], choices=["on", "off"]
+    )
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--api-concurrency", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Fixture latency in seconds"
+    )
+    parser.add_argument(
+        "--fields", type=int, default=30, help="Fields in the result document"
+    )
+    parser.add_argument(
+        "--asset-kb", type=int, default=0, help="Size of the fixture static assets"
+    )
+    parser.add_argument(
+        "--bulk-fraction",
+        type=float,
+        default=0,
+        help="Share of the jobs submitted first as a bulk batch",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0,
+        help="Upstream rate limit in requests/s, 0 disables the limiter",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="Writes the JSON report to this file instead of stdout"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
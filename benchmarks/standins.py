@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import fakeredis
+
+from webscraper.clients.rabbitmq import AsyncRabbitMQClient
+from webscraper.helpers.fair_scheduler import FairScheduler
+
+
+def in_memory_redis():
+    """
+    :return: An in-process Redis server connection, to be shared by the API and the workers
+    :rtype: fakeredis.FakeAsyncRedis
+    """
+    return fakeredis.FakeAsyncRedis()
+
+
+class InMemoryRabbitMQClient(AsyncRabbitMQClient):
+    """
+    In-process stand-in for AsyncRabbitMQClient backed by a FairScheduler.
+    Keeps the same lanes, publish and consume semantics, without a broker.
+    """
+
+    def __init__(self, queue_name="benchmark"):
+        """
+        :param str queue_name: Name of the stand-in queue
+        :rtype: None
+        """
+        super().__init__("amqp://in-memory", queue_name)
+        self._scheduler = FairScheduler({lane: 1 for lane in self.LANES})
+        self._dead = []
+
+    async def connect(self):
+        pass
+
+    async def publish(self, body):
+        self._scheduler.put(body.priority, body.tenant, body.model_dump_json())
+
+    async def publish_many(self, bodies):
+        for body in bodies:
+            await self.publish(body)
+        return [None] * len(bodies)
+
+    async def publish_delayed(self, body, delay, attempt):
+        asyncio.get_running_loop().call_later(
+            delay,
+            self._scheduler.put,
+            body.priority,
+            body.tenant,
+            body.model_dump_json(),
+        )
+
+    async def publish_dead(self, body):
+        self._dead.append(body.model_dump_json())
+
+    async def get_dead(self, limit=100):
+        return [json.loads(raw) for raw in self._dead[:limit]]
+
+    async def replay_dead(self, limit=100):
+        bodies = await self.get_dead(limit)
+        del self._dead[:limit]
+        for body in bodies:
+            body.update(attempts=0, last_error=None)
+            self._scheduler.put(
+                body.get("priority", self.DEFAULT_LANE),
+                body.get("tenant"),
+                json.dumps(body),
+            )
+        return bodies
+
+    async def consume_forever(
+        self,
+        callback,
+        concurrency=1,
+        weights=None,
+        prefetch=None,
+        gate=None,
+        drain_timeout=None,
+    ):
+        if weights:
+            self._scheduler.weights.update(weights)
+        slots = asyncio.Semaphore(concurrency)
+        tasks = set()
+        gated = set()
+
+        async def process(raw):
+            try:
+                await callback(json.loads(raw))
+            except Exception as e:
+                self.logger.error(f"Error processing message {raw}: {e}")
+            finally:
+                slots.release()
+
+        def start(raw):
+            task = asyncio.create_task(process(raw))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        async def pass_gate(lane, raw):
+            try:
+                await gate()
+                await slots.acquire()
+            except asyncio.CancelledError:
+                # Put back, as the broker redelivers the unacked messages
+                self._scheduler.put(lane, json.loads(raw).get("tenant"), raw)
+                raise
+            finally:
+                self._scheduler.resume(lane)
+            start(raw)
+
+        async def dispatch_forever():
+            while True:
+                await slots.acquire()
+                slots.release()
+                raw = await self._scheduler.get()
+                if not gate:
+                    await slots.acquire()
+                    start(raw)
+                    continue
+                # Like the real client, only the lane of the message waits for the gate
+                lane = json.loads(raw).get("priority", self.DEFAULT_LANE)
+                self._scheduler.pause(lane)
+                task = asyncio.create_task(pass_gate(lane, raw))
+                gated.add(task)
+                task.add_done_callback(gated.discard)
+
+        dispatcher = asyncio.create_task(dispatch_forever())
+        stopping = asyncio.create_task(self._stopping.wait())
+        try:
+            await asyncio.wait(
+                {dispatcher, stopping}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            stopping.cancel()
+            dispatcher.cancel()
+            for task in gated:
+                task.cancel()
+            await self._drain(tasks, drain_timeout)
+
+    async def queue_depths(self):
+        return {
+            self.queue_for(lane): self._scheduler.pending(lane) for lane in self.LANES
+        }
+
+    async def close(self):
+        pass
@@ -0,0 +1,23 @@
+import fakeredis
+import pytest
+
+from webscraper.clients.redis import AsyncRedisClient
+
+
+@pytest.fixture
+def anyio_backend():
+    """
+    Runs the async tests, marked with pytest.mark.anyio, on asyncio only.
+    """
+    return "asyncio"
+
+
+@pytest.fixture
+async def redis_client():
+    """
+    Redis client backed by an in-process fakeredis server, with Lua scripting.
+    """
+    client = AsyncRedisClient("redis://fakeredis")
+    client._redis = fakeredis.FakeAsyncRedis()
+    yield client
+    await client._redis.aclose()
@@ -0,0 +1,62 @@
+import pytest
+
+from webscraper.exceptions import InvalidParameterException
+from webscraper.helpers.bloom_filter import BloomFilter
+
+
+def test_added_items_are_always_found():
+    seen = BloomFilter(10000, error_rate=1e-3)
+    items = [f"{number:014d}" for number in range(10000)]
+
+    for item in items:
+        seen.add(item)
+
+    assert all(item in seen for item in items)
+
+
+def test_add_tells_whether_the_item_is_new():
+    seen = BloomFilter(100)
+
+    assert seen.add("11222333000181")
+    assert not seen.add("11222333000181")
+    assert len(seen) == 1
+
+
+def test_false_positive_rate_at_capacity():
+    capacity = 20000
+    seen = BloomFilter(capacity, error_rate=1e-3)
+    for number in range(capacity):
+        seen.add(f"{number:014d}")
+
+    tries = 50000
+    false_positives = sum(
+        f"{number:014d}" in seen for number in range(capacity, capacity + tries)
+    )
+
+    # The blocked layout is allowed a few times the nominal rate
+    assert false_positives / tries < 5e-3
+
+
+def test_size():
+    seen = BloomFilter(1000000, error_rate=1e-5)
+
+    # About 24 bits per item for 1e-5, rounded up to whole blocks
+    assert 2.8 * 2**20 < seen.nbytes < 3 * 2**20
+    assert seen.nbytes % BloomFilter.BLOCK_BYTES == 0
+    assert 1 <= seen.hashes <= BloomFilter.MAX_HASHES
+
+
+def test_small_filter_has_a_single_block():
+    seen = BloomFilter(1, error_rate=0.5)
+
+    assert seen.blocks == 1
+    assert seen.add("11222333000181")
+    assert "11222333000181" in seen
+
+
+@pytest.mark.parametrize(
+    "capacity, error_rate", [(0, 1e-5), (100, 0), (100, 1), (100, 1.5)]
+)
+def test_invalid_parameters(capacity, error_rate):
+    with pytest.raises(InvalidParameterException):
+        BloomFilter(capacity, error_rate)
@@ -0,0 +1,112 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+import pytest
+
+from webscraper.services.callbacks import CallbackService
+
+from webscraper.exceptions import ForbiddenCallbackException
+
+
+class CallbackReceiver(object):
+    """
+    Local HTTP server that records the callbacks it receives. POST /redirect answers with a
+    redirect to /target.
+    """
+
+    def __init__(self):
+        self.requests = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.requests.append((self.path, self.headers["Host"], body))
+                if self.path == "/redirect":
+                    self.send_response(302)
+                    self.send_header("Location", "/target")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "url",
+    [
+        "http://127.0.0.1:8000/hook",
+        "http://localhost/hook",
+        "http://169.254.169.254/latest/meta-data/",
+        "http://10.0.0.1/hook",
+        "http://192.168.0.10:15672/api/queues",
+        "http://[::1]:8080/hook",
+        "http://[::ffff:127.0.0.1]/hook",
+        "http://0.0.0.0/hook",
+        "ftp://example.com/hook",
+    ],
+)
+async def test_resolve_rejects_non_public_hosts(url):
+    with pytest.raises(ForbiddenCallbackException):
+        await CallbackService().resolve(url)
+
+
+@pytest.mark.anyio
+async def test_resolve_rejects_hosts_out_of_the_allowlist():
+    service = CallbackService(allowed_hosts=["example.com"])
+    with pytest.raises(ForbiddenCallbackException, match="not allowed"):
+        await service.resolve("https://example.com.evil.test/hook")
+    with pytest.raises(ForbiddenCallbackException, match="not allowed"):
+        await service.resolve("https://8.8.8.8/hook")
+
+
+@pytest.mark.anyio
+async def test_resolve_accepts_public_addresses_and_allowed_private_networks():
+    assert await CallbackService().resolve("https://8.8.8.8/hook") == "8.8.8.8"
+    service = CallbackService(allowed_hosts=["localhost"], allow_private_networks=True)
+    assert await service.resolve("http://localhost:8000/hook") in ("127.0.0.1", "::1")
+
+
+@pytest.mark.anyio
+async def test_notify_skips_forbidden_callbacks():
+    with CallbackReceiver() as receiver:
+        service = CallbackService()
+        await service.notify({f"http://127.0.0.1:{receiver.port}/hook"}, {"cnpj": "1"})
+        await service.close()
+
+    assert receiver.requests == []
+
+
+@pytest.mark.anyio
+async def test_notify_posts_to_the_resolved_address_without_following_redirects():
+    with CallbackReceiver() as receiver:
+        service = CallbackService(allow_private_networks=True)
+        await service.notify(
+            {
+                f"http://localhost:{receiver.port}/hook",
+                f"http://127.0.0.1:{receiver.port}/redirect",
+            },
+            {"cnpj": "1"},
+        )
+        await service.close()
+
+    assert sorted(receiver.requests) == [
+        ("/hook", f"localhost:{receiver.port}", orjson.dumps({"cnpj": "1"})),
+        ("/redirect", f"127.0.0.1:{receiver.port}", orjson.dumps({"cnpj": "1"})),
+    ]
@@ -0,0 +1,86 @@
+import pytest
+
+from webscraper.helpers.cnpj import (
+    has_valid_check_digits,
+    normalize_cnpj,
+    sanitize_cnpj,
+)
+
+VALID = ["11222333000181", "11444777000161", "60701190000104", "00000000000191"]
+
+
+def check_digits(base):
+    """
+    Reference implementation of the module 11 check digits.
+
+    :param str base: The first 12 digits of a CNPJ
+    :return: The 14 digits of the CNPJ
+    :rtype: str
+    """
+    for weights in (
+        (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2),
+        (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2),
+    ):
+        remainder = (
+            sum(int(digit) * weight for digit, weight in zip(base, weights)) % 11
+        )
+        base += str(0 if remainder < 2 else 11 - remainder)
+    return base
+
+
+@pytest.mark.parametrize("cnpj", VALID)
+def test_valid_check_digits(cnpj):
+    assert has_valid_check_digits(cnpj)
+
+
+def test_matches_the_reference_implementation():
+    for number in range(0, 10**12, 7919 * 10**6 + 1):
+        base = f"{number:012d}"
+        cnpj = check_digits(base)
+        assert has_valid_check_digits(cnpj) == (cnpj != cnpj[0] * 14)
+        for wrong in range(10):
+            if str(wrong) != cnpj[-1]:
+                assert not has_valid_check_digits(cnpj[:-1] + str(wrong))
+
+
+@pytest.mark.parametrize(
+    "cnpj",
+    [
+        "11222333000182",
+        "11222333000191",
+        "00000000000000",
+        "11111111111111",
+        "1122233300018",
+        "112223330001811",
+        "1122233300018a",
+        "١١٢٢٢٣٣٣٠٠٠١٨١",
+    ],
+)
+def test_invalid_check_digits(cnpj):
+    assert not has_valid_check_digits(cnpj)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("11222333000181", "11222333000181"),
+        ("11.222.333/0001-81", "11222333000181"),
+        (" 11 222 333 0001 81 ", "11222333000181"),
+        ("1122233300018", None),
+        ("", None),
+    ],
+)
+def test_sanitize(value, expected):
+    assert sanitize_cnpj(value) == expected
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("11.222.333/0001-81", "11222333000181"),
+        ("11.222.333/0001-82", None),
+        ("not a CNPJ", None),
+    ],
+)
+def test_normalize(value, expected):
+    assert normalize_cnpj(value) == expected
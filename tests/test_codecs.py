@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from webscraper.exceptions import CodecException, InvalidParameterException
+from webscraper.helpers.codecs import Codec
+
+VALUE = {
+    "status": "COMPLETED",
+    "data": {
+        "CNPJ:": "11.222.333/0001-81",
+        "Situação:": "ATIVA",
+        "fields": [1, 2.5, None],
+    },
+}
+LARGE_VALUE = {"data": {f"field_{i}": f"value {i}" for i in range(200)}}
+CODECS = [
+    ("json", None),
+    ("orjson", None),
+    ("msgpack", None),
+    ("orjson", "zstd"),
+    ("msgpack", "zstd"),
+]
+
+
+@pytest.mark.parametrize("name, compression", CODECS)
+@pytest.mark.parametrize("value", [VALUE, LARGE_VALUE])
+def test_round_trip(name, compression, value):
+    codec = Codec(name, compression)
+
+    assert codec.loads(codec.dumps(value)) == value
+
+
+@pytest.mark.parametrize("name, compression", CODECS)
+def test_reads_the_entries_of_every_codec(name, compression):
+    data = Codec(name, compression).dumps(LARGE_VALUE)
+
+    for reader in CODECS:
+        assert Codec(*reader).loads(data) == LARGE_VALUE
+
+
+def test_json_has_no_header():
+    data = Codec("json").dumps(VALUE)
+
+    assert not data.startswith(Codec.MAGIC)
+    assert json.loads(data) == VALUE
+
+
+@pytest.mark.parametrize("name", ["orjson", "msgpack"])
+def test_header(name):
+    data = Codec(name).dumps(VALUE)
+
+    assert data[: Codec.HEADER_SIZE] == Codec.MAGIC + bytes(
+        (Codec.VERSION, Codec.FORMATS[name], 0)
+    )
+
+
+def test_compresses_only_large_payloads():
+    codec = Codec("orjson", "zstd", compress_min_size=1024)
+
+    small = codec.dumps(VALUE)
+    large = codec.dumps(LARGE_VALUE)
+
+    assert small[Codec.HEADER_SIZE - 1] == 0
+    assert large[Codec.HEADER_SIZE - 1] == Codec.FLAG_ZSTD
+    assert len(large) < len(Codec("orjson").dumps(LARGE_VALUE))
+
+
+@pytest.mark.parametrize("data", [json.dumps(VALUE), json.dumps(VALUE).encode()])
+def test_reads_legacy_plain_json(data):
+    assert Codec("msgpack", "zstd").loads(data) == VALUE
+
+
+def test_unsupported_version():
+    data = bytearray(Codec("orjson").dumps(VALUE))
+    data[len(Codec.MAGIC)] = Codec.VERSION + 1
+
+    with pytest.raises(CodecException, match="version"):
+        Codec().loads(bytes(data))
+
+
+def test_unknown_format():
+    data = Codec.MAGIC + bytes((Codec.VERSION, 9, 0)) + b"{}"
+
+    with pytest.raises(CodecException, match="format"):
+        Codec().loads(data)
+
+
+@pytest.mark.parametrize("data", [b"not json", Codec.MAGIC + b"\x01\x02\x01corrupted"])
+def test_invalid_data(data):
+    with pytest.raises(CodecException):
+        Codec().loads(data)
+
+
+def test_value_that_can_not_be_serialized():
+    with pytest.raises(CodecException):
+        Codec("orjson").dumps({"value": object()})
+
+
+@pytest.mark.parametrize(
+    "name, compression", [("yaml", None), ("orjson", "gzip"), ("json", "zstd")]
+)
+def test_invalid_parameters(name, compression):
+    with pytest.raises(InvalidParameterException):
+        Codec(name, compression)
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import orjson
+import pytest
+
+from webscraper.clients.result_store import SQLiteResultStore
+
+CNPJS = ["11222333000181", "11444777000161"]
+
+
+@pytest.fixture
+def result_store_path(tmp_path):
+    path = str(tmp_path / "results.db")
+
+    async def seed():
+        store = SQLiteResultStore(path)
+        for cnpj in CNPJS:
+            await store.save(cnpj, {"Nome:": f"Empresa {cnpj}"}, scraped_at=1000)
+        await store.close()
+
+    asyncio.run(seed())
+    return path
+
+
+def export(result_store_path, *args):
+    """
+    Runs the export command in its own process.
+
+    :return: The finished process, with its standard output and error
+    :rtype: subprocess.CompletedProcess
+    """
+    env = dict(
+        os.environ,
+        SCRAPE_URL="http://localhost",
+        RABBITMQ_URL="amqp://localhost",
+        RABBITMQ_QUEUE="test",
+        REDIS_URL="redis://localhost",
+        RESULT_STORE="sqlite",
+        RESULT_STORE_PATH=result_store_path,
+    )
+    return subprocess.run(
+        [sys.executable, "-m", "webscraper.scripts.export_results", *args],
+        capture_output=True,
+        env=env,
+        timeout=60,
+    )
+
+
+def test_export_to_the_standard_output(result_store_path):
+    process = export(result_store_path, "--source", "store")
+
+    assert process.returncode == 0, process.stderr.decode()
+    records = [orjson.loads(line) for line in process.stdout.splitlines()]
+    assert [record["cnpj"] for record in records] == CNPJS
+    assert records[0]["data"] == {"Nome:": f"Empresa {CNPJS[0]}"}
+    # The logs go to the standard error, so they do not corrupt the export
+    assert b"Exported" in process.stderr
+
+
+def test_export_csv_to_the_standard_output(result_store_path):
+    process = export(
+        result_store_path, "--source", "store", "--format", "csv", "--fields", "Nome:"
+    )
+
+    assert process.returncode == 0, process.stderr.decode()
+    lines = process.stdout.decode().splitlines()
+    assert lines[0] == "cnpj,status,updated_at,Nome:"
+    assert len(lines) == 1 + len(CNPJS)
+
+
+def test_export_to_a_file(result_store_path, tmp_path):
+    output = tmp_path / "results.ndjson"
+
+    process = export(result_store_path, "--source", "store", "--output", str(output))
+
+    assert process.returncode == 0, process.stderr.decode()
+    assert len(output.read_bytes().splitlines()) == len(CNPJS)
+    assert b"Exported" in process.stdout
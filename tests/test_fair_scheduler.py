@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from webscraper.exceptions import InvalidParameterException
+from webscraper.helpers.fair_scheduler import FairScheduler
+
+
+def drain(scheduler, count):
+    """
+    :return: The next 'count' jobs, taken without waiting since they are all pending
+    :rtype: list
+    """
+    return [asyncio.run(scheduler.get()) for _ in range(count)]
+
+
+def test_lanes_are_served_by_weight():
+    scheduler = FairScheduler({"interactive": 8, "bulk": 1})
+    for index in range(100):
+        scheduler.put("interactive", None, ("interactive", index))
+        scheduler.put("bulk", None, ("bulk", index))
+
+    lanes = [lane for lane, _ in drain(scheduler, 90)]
+
+    assert lanes.count("interactive") == 80
+    assert lanes.count("bulk") == 10
+
+
+def test_weighted_order_is_smooth():
+    scheduler = FairScheduler({"interactive": 2, "bulk": 1})
+    for _ in range(6):
+        scheduler.put("interactive", None, "interactive")
+        scheduler.put("bulk", None, "bulk")
+
+    assert drain(scheduler, 6) == ["interactive", "bulk", "interactive"] * 2
+
+
+def test_idle_lane_does_not_hold_back_the_others():
+    scheduler = FairScheduler({"interactive": 8, "bulk": 1})
+    for index in range(5):
+        scheduler.put("bulk", None, index)
+
+    assert drain(scheduler, 5) == [0, 1, 2, 3, 4]
+
+
+def test_tenants_of_a_lane_are_served_round_robin():
+    scheduler = FairScheduler({"bulk": 1})
+    for index in range(4):
+        scheduler.put("bulk", "backfill", f"backfill-{index}")
+    scheduler.put("bulk", "small", "small-0")
+    scheduler.put("bulk", None, "anonymous-0")
+
+    assert drain(scheduler, 6) == [
+        "backfill-0",
+        "small-0",
+        "anonymous-0",
+        "backfill-1",
+        "backfill-2",
+        "backfill-3",
+    ]
+
+
+def test_pending_and_len():
+    scheduler = FairScheduler({"interactive": 1, "bulk": 1})
+    scheduler.put("bulk", "a", 1)
+    scheduler.put("bulk", "b", 2)
+    scheduler.put("interactive", "a", 3)
+
+    assert len(scheduler) == 3
+    assert scheduler.pending("bulk") == 2
+    assert scheduler.pending("interactive") == 1
+
+
+def test_get_waits_for_a_job():
+    async def scenario():
+        scheduler = FairScheduler({"bulk": 1})
+        waiting = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        scheduler.put("bulk", None, "job")
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(scenario()) == "job"
+
+
+def test_clear_drops_the_pending_jobs():
+    scheduler = FairScheduler({"interactive": 1, "bulk": 1})
+    scheduler.put("bulk", "a", 1)
+    scheduler.put("interactive", "b", 2)
+
+    assert sorted(scheduler.clear()) == [1, 2]
+    assert len(scheduler) == 0
+    assert scheduler.pending("bulk") == 0
+
+
+def test_unknown_lane():
+    scheduler = FairScheduler({"bulk": 1})
+
+    with pytest.raises(InvalidParameterException):
+        scheduler.put("interactive", None, "job")
+
+
+@pytest.mark.parametrize("weights", [{}, {"bulk": 0}, {"interactive": 1, "bulk": -1}])
+def test_invalid_weights(weights):
+    with pytest.raises(InvalidParameterException):
+        FairScheduler(weights)
+
+
+def test_paused_lane_is_skipped_until_resumed():
+    scheduler = FairScheduler({"interactive": 1, "bulk": 8})
+    scheduler.put("bulk", None, "bulk")
+    scheduler.put("interactive", None, "interactive")
+
+    scheduler.pause("bulk")
+    assert drain(scheduler, 1) == ["interactive"]
+
+    scheduler.resume("bulk")
+    assert drain(scheduler, 1) == ["bulk"]
+
+
+def test_get_waits_while_the_lanes_with_jobs_are_paused():
+    async def scenario():
+        scheduler = FairScheduler({"bulk": 1})
+        scheduler.put("bulk", None, "job")
+        scheduler.pause("bulk")
+        waiting = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        scheduler.resume("bulk")
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(scenario()) == "job"
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from webscraper.clients.browser_pool import BrowserPool, PooledBrowser
+from webscraper.services.scrape import ScrapeService
+
+
+class FakeStats(object):
+    async def report(self):
+        pass
+
+
+class FakePage(object):
+    async def go_back(self, **kwargs):
+        await asyncio.sleep(0)
+
+
+class FakeContext(object):
+    def __init__(self, browser):
+        self.browser = browser
+
+    async def new_page(self):
+        return FakePage()
+
+    async def close(self):
+        self.browser.closed_contexts += 1
+
+
+class FakeBrowser(object):
+    def __init__(self):
+        self.contexts = 0
+        self.closed_contexts = 0
+
+    def is_connected(self):
+        return True
+
+    async def new_context(self, **kwargs):
+        self.contexts += 1
+        await asyncio.sleep(0)
+        return FakeContext(self)
+
+    async def close(self):
+        pass
+
+
+class FakeScrapeService(ScrapeService):
+    """
+    Scrape service whose jobs take a few milliseconds on any page, without Playwright.
+    """
+
+    def __init__(self, browser_pool, reuse_max_jobs=50, failing=()):
+        super().__init__(
+            "http://fixture/",
+            browser_pool=browser_pool,
+            reuse_form_page=True,
+            reuse_max_jobs=reuse_max_jobs,
+        )
+        self.failing = set(failing)
+
+    async def _prepare_page(self, page):
+        return FakeStats()
+
+    async def _scrape_page(self, page, cnpj, reuse=False):
+        await asyncio.sleep(0.005)
+        if cnpj in self.failing:
+            raise RuntimeError(f"Scrape of {cnpj} failed")
+        return {"CNPJ:": cnpj}
+
+
+@pytest.fixture
+def browser():
+    return FakeBrowser()
+
+
+@pytest.fixture
+def browser_pool(browser):
+    pool = BrowserPool(max_pages=2)
+    pool._playwright = object()
+    pool._browsers = [PooledBrowser(browser)]
+    return pool
+
+
+@pytest.mark.anyio
+async def test_jobs_above_max_pages_reuse_the_released_pages(browser_pool, browser):
+    service = FakeScrapeService(browser_pool)
+
+    cnpjs = [str(index) for index in range(20)]
+    results = await asyncio.wait_for(
+        asyncio.gather(*(service.scrape(cnpj) for cnpj in cnpjs)), timeout=5
+    )
+
+    assert results == [{"CNPJ:": cnpj} for cnpj in cnpjs]
+    assert browser.contexts == 2
+    assert len(service._idle_pages) == 2
+    assert not service._page_waiters
+
+
+@pytest.mark.anyio
+async def test_closed_pages_let_the_waiting_jobs_lease_new_ones(browser_pool, browser):
+    service = FakeScrapeService(browser_pool, reuse_max_jobs=2, failing={"3", "7"})
+
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            *(service.scrape(str(index)) for index in range(12)),
+            return_exceptions=True,
+        ),
+        timeout=5,
+    )
+
+    assert [isinstance(result, RuntimeError) for result in results] == [
+        index in (3, 7) for index in range(12)
+    ]
+    assert browser.contexts - browser.closed_contexts == len(service._idle_pages)
+    assert browser_pool.open_pages == len(service._idle_pages) <= 2
+    await service.close()
+    assert browser_pool.open_pages == 0
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiters_hand_their_page_to_the_next_job(browser_pool, browser):
+    service = FakeScrapeService(browser_pool)
+
+    tasks = [asyncio.create_task(service.scrape(str(index))) for index in range(6)]
+    await asyncio.sleep(0)
+    tasks[3].cancel()
+    done = await asyncio.wait_for(
+        asyncio.gather(*tasks, return_exceptions=True), timeout=5
+    )
+
+    assert isinstance(done[3], asyncio.CancelledError)
+    assert [result for index, result in enumerate(done) if index != 3] == [
+        {"CNPJ:": str(index)} for index in (0, 1, 2, 4, 5)
+    ]
+    assert browser.contexts == 2
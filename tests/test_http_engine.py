@@ -0,0 +1,67 @@
+import pytest
+
+from benchmarks.fixture_server import FixtureServer
+
+from webscraper.exceptions import ScrapeEngineException
+from webscraper.services.http_engine import HttpScrapeEngine
+
+CNPJ = "11222333000181"
+
+
+@pytest.fixture
+def fixture_server():
+    server = FixtureServer(fields=5)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+async def engine(fixture_server):
+    engine = HttpScrapeEngine(fixture_server.url, timeout=5)
+    yield engine
+    await engine.close()
+
+
+@pytest.mark.anyio
+async def test_scrape_extracts_the_result_document(engine):
+    data = await engine.scrape(CNPJ)
+
+    assert data == {
+        "CNPJ:": CNPJ,
+        "Campo 1:": "Valor 1",
+        "Campo 2:": "Valor 2",
+        "Campo 3:": "Valor 3",
+        "Campo 4:": "Valor 4",
+    }
+
+
+@pytest.mark.anyio
+async def test_scrape_reuses_the_pooled_client(engine):
+    await engine.scrape(CNPJ)
+    client = engine._client
+
+    assert await engine.scrape("11444777000161")
+    assert engine._client is client
+
+
+def test_build_form_fills_the_fields_a_browser_would_send(fixture_server):
+    method, action, fields = HttpScrapeEngine.build_form(
+        fixture_server.form_page(), fixture_server.url, CNPJ
+    )
+
+    assert method == "POST"
+    assert action == fixture_server.url.replace("default.html", "consultar")
+    assert fields == {
+        "session": "fixture",
+        "rTipoDoc": "2",
+        "tCNPJ": CNPJ,
+        "btCGC": "Consultar",
+    }
+
+
+def test_build_form_without_the_cnpj_form():
+    html = '<html><body><form><input name="q"></form></body></html>'
+
+    with pytest.raises(ScrapeEngineException):
+        HttpScrapeEngine.build_form(html, "http://localhost/", CNPJ)
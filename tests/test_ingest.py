@@ -0,0 +1,150 @@
+import gzip
+import os
+
+import pytest
+
+from benchmarks.standins import InMemoryRabbitMQClient
+
+from webscraper.exceptions import InvalidParameterException
+from webscraper.helpers.bloom_filter import BloomFilter
+from webscraper.models.cache_dto import CacheMessageDTO
+from webscraper.services.ingest import CNPJIngestor
+from webscraper.services.scrape import ScrapeService
+
+pytestmark = pytest.mark.anyio
+
+CNPJS = ["11222333000181", "11444777000161", "60701190000104", "00000000000191"]
+
+
+class PartiallyFailingRabbitMQClient(InMemoryRabbitMQClient):
+    """
+    Publishes every message but the first one of the batches after 'failing_after',
+    as if the broker nacked it.
+    """
+
+    def __init__(self, failing_after=0):
+        super().__init__()
+        self.failing_after = failing_after
+        self.batches = 0
+
+    async def publish_many(self, bodies):
+        self.batches += 1
+        if self.batches <= self.failing_after:
+            return await super().publish_many(bodies)
+        await super().publish_many(bodies[1:])
+        return [ConnectionError("nack")] + [None] * (len(bodies) - 1)
+
+
+@pytest.fixture
+def service(redis_client):
+    return ScrapeService("http://localhost", redis_client)
+
+
+def ingestor(service, rabbitmq_client=None, **parameters):
+    return CNPJIngestor(
+        service,
+        rabbitmq_client or InMemoryRabbitMQClient(),
+        BloomFilter(1000),
+        **parameters,
+    )
+
+
+async def claims(redis_client):
+    return sorted(
+        key.decode().rsplit(":", 1)[1]
+        for key in await redis_client._redis.keys("scrape_claim:*")
+    )
+
+
+async def test_ingest_lines(service, tmp_path):
+    path = tmp_path / "cnpjs.txt"
+    path.write_text(
+        "\n".join(
+            ["11.222.333/0001-81", CNPJS[1], "", "not a CNPJ", CNPJS[1], CNPJS[2]]
+        )
+    )
+    await service.set_cache(CNPJS[2], CacheMessageDTO(status="COMPLETED", data={}))
+
+    stats = await ingestor(service, batch_size=2).ingest(str(path))
+
+    assert stats == {
+        "rows": 6,
+        "invalid": 1,
+        "duplicated": 1,
+        "cached": 1,
+        "in_flight": 0,
+        "published": 2,
+    }
+
+
+async def test_ingest_gzip_csv_by_column_name(service, tmp_path):
+    path = tmp_path / "cnpjs.csv.gz"
+    with gzip.open(path, "wt") as file:
+        file.write("name,cnpj\n" + "".join(f"company,{cnpj}\n" for cnpj in CNPJS))
+    rabbitmq_client = InMemoryRabbitMQClient()
+
+    stats = await ingestor(service, rabbitmq_client).ingest(str(path), column="cnpj")
+
+    assert stats["rows"] == 4
+    assert stats["published"] == 4
+    assert rabbitmq_client._scheduler.pending("bulk") == 4
+
+
+async def test_jobs_in_flight_are_not_published_again(service, tmp_path):
+    path = tmp_path / "cnpjs.txt"
+    path.write_text("\n".join(CNPJS))
+    await service.claim_jobs(CNPJS[:1], 600)
+
+    stats = await ingestor(service).ingest(str(path))
+
+    assert stats["in_flight"] == 1
+    assert stats["published"] == 3
+
+
+async def test_resumes_from_the_checkpoint(service, tmp_path):
+    path = tmp_path / "cnpjs.txt"
+    path.write_text("\n".join(CNPJS))
+    checkpoint_path = str(tmp_path / "cnpjs.checkpoint")
+    rabbitmq_client = PartiallyFailingRabbitMQClient(failing_after=1)
+
+    with pytest.raises(ConnectionError):
+        await ingestor(service, rabbitmq_client, batch_size=2, concurrency=1).ingest(
+            str(path), checkpoint_path=checkpoint_path
+        )
+    assert os.path.exists(checkpoint_path)
+
+    stats = await ingestor(service, batch_size=2).ingest(
+        str(path), checkpoint_path=checkpoint_path
+    )
+
+    # The published job of the failed batch is still claimed, the other one is published
+    assert stats["in_flight"] == 1
+    assert stats["published"] == 3
+    assert not os.path.exists(checkpoint_path)
+
+
+async def test_releases_only_the_jobs_that_failed_to_publish(service, redis_client):
+    batch_ingestor = ingestor(service, PartiallyFailingRabbitMQClient())
+
+    with pytest.raises(ConnectionError):
+        await batch_ingestor._publish(CNPJS[:3])
+
+    assert await claims(redis_client) == sorted(CNPJS[1:3])
+    assert batch_ingestor.stats["published"] == 2
+
+
+async def test_releases_the_batch_when_nothing_was_published(service, redis_client):
+    class DisconnectedRabbitMQClient(InMemoryRabbitMQClient):
+        async def publish_many(self, bodies):
+            raise ConnectionError("connection lost")
+
+    with pytest.raises(ConnectionError):
+        await ingestor(service, DisconnectedRabbitMQClient())._publish(CNPJS[:3])
+
+    assert await claims(redis_client) == []
+
+
+@pytest.mark.parametrize("parameters", [{"batch_size": 0}, {"concurrency": 0}])
+def test_invalid_parameters(parameters):
+    with pytest.raises(InvalidParameterException):
+        CNPJIngestor(None, None, None, **parameters)
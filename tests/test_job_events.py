@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from webscraper.services.job_events import JobEventsListener
+from webscraper.services.scrape import ScrapeService
+
+CNPJ = "11222333000181"
+
+
+@pytest.fixture
+async def listener(redis_client):
+    listener = JobEventsListener(redis_client)
+    yield listener
+    await listener.stop()
+
+
+async def publish(redis_client, cnpj, status):
+    await redis_client.set_with_status(
+        f"{ScrapeService.SCRAPE_JOB_REDIS_PREFIX}{cnpj}",
+        status,
+        {"cnpj": cnpj},
+        channel=f"{ScrapeService.SCRAPE_EVENTS_REDIS_PREFIX}{cnpj}",
+    )
+
+
+@pytest.mark.anyio
+async def test_subscribers_receive_the_published_events(listener, redis_client):
+    subscribed = asyncio.Event()
+    listener.add_reset_handler(subscribed.set)
+    listener.start()
+    await asyncio.wait_for(subscribed.wait(), 1)
+
+    with listener.subscribe(CNPJ) as events:
+        await publish(redis_client, CNPJ, "COMPLETED")
+        event = await asyncio.wait_for(events.get(), 1)
+
+    assert event == {"cnpj": CNPJ, "status": "COMPLETED"}
+
+
+@pytest.mark.anyio
+async def test_results_published_before_the_subscription_are_sent_once_confirmed(
+    listener, redis_client
+):
+    resets = []
+    listener.add_reset_handler(lambda: resets.append(len(listener._subscribers)))
+
+    with listener.subscribe(CNPJ) as events:
+        # Published after the subscriber read Redis but before the listener subscribed
+        await publish(redis_client, CNPJ, "COMPLETED")
+        listener.start()
+        event = await asyncio.wait_for(events.get(), 1)
+
+    assert event == {"cnpj": CNPJ, "status": "COMPLETED"}
+    assert resets == [1]
+
+
+@pytest.mark.anyio
+async def test_reset_handlers_run_after_the_subscription_is_confirmed(
+    listener, redis_client
+):
+    received = []
+    listener.add_handler(lambda cnpj, event: received.append(cnpj))
+
+    async def publish_on_reset():
+        await publish(redis_client, CNPJ, "COMPLETED")
+
+    tasks = []
+    listener.add_reset_handler(
+        lambda: tasks.append(asyncio.create_task(publish_on_reset()))
+    )
+    listener.start()
+
+    async with asyncio.timeout(1):
+        while not received:
+            await asyncio.sleep(0.01)
+    await asyncio.gather(*tasks)
+
+    assert received == [CNPJ]
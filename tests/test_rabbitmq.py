@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from webscraper.clients.rabbitmq import AsyncRabbitMQClient
+from webscraper.helpers.fair_scheduler import FairScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeMessage(object):
+    """
+    Stand-in for an incoming aio_pika message, acked when processed.
+    """
+
+    def __init__(self):
+        self.acked = False
+
+    @contextlib.asynccontextmanager
+    async def process(self, requeue=True):
+        yield
+        self.acked = True
+
+
+async def dispatch(scheduler, concurrency, gate, duration=0.2):
+    """
+    Runs the dispatcher of the client for 'duration' seconds.
+
+    :return: The names of the processed messages, in order
+    :rtype: list[str]
+    """
+    client = AsyncRabbitMQClient("amqp://localhost", "test")
+    processed = []
+
+    async def callback(body):
+        processed.append(body["name"])
+
+    dispatcher = asyncio.create_task(
+        client._dispatch_forever(
+            scheduler, asyncio.Semaphore(concurrency), set(), set(), callback, gate
+        )
+    )
+    await asyncio.sleep(duration)
+    dispatcher.cancel()
+    return processed
+
+
+def put(scheduler, lane, name):
+    scheduler.put(lane, None, (lane, FakeMessage(), {"name": name}))
+
+
+async def test_messages_are_processed_in_the_fair_order():
+    scheduler = FairScheduler({"interactive": 2, "bulk": 1})
+    for index in range(2):
+        put(scheduler, "bulk", f"bulk-{index}")
+        put(scheduler, "interactive", f"interactive-{index}")
+
+    assert await dispatch(scheduler, 1, None) == [
+        "interactive-0",
+        "bulk-0",
+        "interactive-1",
+        "bulk-1",
+    ]
+
+
+async def test_a_lane_waiting_for_the_gate_does_not_hold_back_the_others():
+    scheduler = FairScheduler({"interactive": 1, "bulk": 1})
+    put(scheduler, "bulk", "bulk")
+    calls = []
+
+    async def gate():
+        calls.append(None)
+        # Only the first message, of the bulk lane, is throttled
+        if len(calls) == 1:
+            await asyncio.sleep(0.1)
+
+    dispatcher = asyncio.create_task(dispatch(scheduler, 1, gate))
+    await asyncio.sleep(0.01)
+    put(scheduler, "interactive", "interactive")
+
+    assert await dispatcher == ["interactive", "bulk"]
+
+
+async def test_a_failing_gate_lets_the_message_through():
+    scheduler = FairScheduler({"bulk": 1})
+    put(scheduler, "bulk", "bulk")
+
+    async def gate():
+        raise ConnectionError("Redis is down")
+
+    assert await dispatch(scheduler, 1, gate) == ["bulk"]
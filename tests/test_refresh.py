@@ -0,0 +1,186 @@
+import time
+
+import pytest
+
+from benchmarks.standins import InMemoryRabbitMQClient
+
+from webscraper.services.refresh import RefreshScheduler
+from webscraper.services.scrape import ScrapeService
+
+CNPJS = ["11222333000181", "11444777000161", "60701190000104"]
+DAY = 86400
+
+
+class PartiallyFailingRabbitMQClient(InMemoryRabbitMQClient):
+    """
+    Publishes every message but the first one, as if the broker nacked it.
+    """
+
+    async def publish_many(self, bodies):
+        await super().publish_many(bodies[1:])
+        return [ConnectionError("nack")] + [None] * (len(bodies) - 1)
+
+
+@pytest.fixture
+def scheduler(redis_client):
+    return RefreshScheduler(
+        redis_client,
+        scrape_service=ScrapeService("http://localhost", redis_client),
+        rabbitmq_client=InMemoryRabbitMQClient(),
+        default_interval=7 * DAY,
+        min_interval=DAY,
+        max_interval=30 * DAY,
+        ignored_fields=["Consultado em:"],
+        claim_ttl=600,
+    )
+
+
+async def due_at(scheduler, cnpj):
+    return await scheduler.redis_client._redis.zscore(scheduler.WATCHLIST_KEY, cnpj)
+
+
+def test_diff_of_the_changed_fields():
+    previous = {"Nome:": "ACME", "Situação:": "ATIVA", "Fax:": "1234"}
+    current = {"Nome:": "ACME", "Situação:": "BAIXADA", "Email:": "a@acme.com"}
+
+    assert RefreshScheduler.diff(previous, current) == {
+        "Email:": [None, "a@acme.com"],
+        "Fax:": ["1234", None],
+        "Situação:": ["ATIVA", "BAIXADA"],
+    }
+    assert RefreshScheduler.diff(current, dict(current)) == {}
+
+
+def test_normalize_drops_the_ignored_fields_and_extra_whitespace():
+    scheduler = RefreshScheduler(None, ignored_fields=["Consultado em:"])
+    data = {"Nome:": "  ACME \n LTDA ", "Consultado em:": "01/01/2026", "Número:": 10}
+
+    assert scheduler.normalize(data) == {"Nome:": "ACME LTDA", "Número:": "10"}
+
+
+@pytest.mark.anyio
+async def test_watch_keeps_the_schedule_of_watched_cnpjs(scheduler):
+    assert await scheduler.watch(CNPJS[:2], due_at=100) == 2
+    assert await scheduler.watch(CNPJS, due_at=200) == 1
+
+    assert await due_at(scheduler, CNPJS[0]) == 100
+    assert await due_at(scheduler, CNPJS[2]) == 200
+
+
+@pytest.mark.anyio
+async def test_watch_and_unwatch_in_chunks(scheduler, monkeypatch):
+    monkeypatch.setattr(RefreshScheduler, "SCRIPT_CHUNK_SIZE", 2)
+
+    assert await scheduler.watch(CNPJS) == 3
+    assert await scheduler.unwatch(CNPJS) == 3
+    assert await scheduler.summary() == {"watched": 0, "due": 0}
+
+
+@pytest.mark.anyio
+async def test_unwatch_drops_the_statistics(scheduler):
+    await scheduler.watch(CNPJS[:1])
+    await scheduler.record_result(CNPJS[0], {"Nome:": "ACME"})
+
+    assert await scheduler.unwatch(CNPJS[:1]) == 1
+    assert not await scheduler.redis_client._redis.exists(
+        f"{scheduler.STATS_REDIS_PREFIX}{CNPJS[0]}"
+    )
+
+
+@pytest.mark.anyio
+async def test_summary_counts_the_due_cnpjs(scheduler):
+    await scheduler.watch(CNPJS[:2], due_at=0)
+    await scheduler.watch(CNPJS[2:], due_at=time.time() + DAY)
+
+    assert await scheduler.summary() == {"watched": 3, "due": 2}
+
+
+@pytest.mark.anyio
+async def test_record_result_of_an_unwatched_cnpj(scheduler):
+    assert await scheduler.record_result(CNPJS[0], {"Nome:": "ACME"}) is None
+
+
+@pytest.mark.anyio
+async def test_first_result_is_refreshed_after_the_default_interval(scheduler):
+    await scheduler.watch(CNPJS[:1], due_at=0)
+
+    assert await scheduler.record_result(CNPJS[0], {"Nome:": "ACME"}) == "first"
+    assert await due_at(scheduler, CNPJS[0]) == pytest.approx(
+        time.time() + 7 * DAY, abs=60
+    )
+
+
+@pytest.mark.anyio
+async def test_unchanged_results_ignore_the_layout_and_ignored_fields(scheduler):
+    await scheduler.watch(CNPJS[:1])
+    await scheduler.record_result(
+        CNPJS[0], {"Nome:": "ACME", "Consultado em:": "01/01/2026"}
+    )
+
+    result = await scheduler.record_result(
+        CNPJS[0], {"Nome:": " ACME ", "Consultado em:": "02/01/2026"}
+    )
+
+    assert result == "unchanged"
+    assert await scheduler.changes() == []
+
+
+@pytest.mark.anyio
+async def test_changes_are_reported_with_their_diff(scheduler):
+    await scheduler.watch(CNPJS[:1])
+    previous = {"Nome:": "ACME", "Situação:": "ATIVA"}
+    await scheduler.record_result(CNPJS[0], previous)
+
+    result = await scheduler.record_result(
+        CNPJS[0], {"Nome:": "ACME", "Situação:": "BAIXADA"}, previous=previous
+    )
+
+    assert result == "changed"
+    [change] = await scheduler.changes()
+    assert change["cnpj"] == CNPJS[0]
+    assert change["diff"] == {"Situação:": ["ATIVA", "BAIXADA"]}
+
+
+@pytest.mark.anyio
+async def test_frequent_changes_shorten_the_interval(scheduler):
+    await scheduler.watch(CNPJS[:1])
+    for index in range(5):
+        await scheduler.record_result(CNPJS[0], {"Situação:": f"Situação {index}"})
+
+    # 4 changes plus the prior one in almost no observed time: a fifth of the default interval
+    assert await due_at(scheduler, CNPJS[0]) == pytest.approx(
+        time.time() + 7 * DAY / 5, abs=60
+    )
+
+
+@pytest.mark.anyio
+async def test_feed_claims_the_due_cnpjs_until_their_claim_expires(scheduler):
+    await scheduler.watch(CNPJS[:2], due_at=0)
+    await scheduler.watch(CNPJS[2:], due_at=time.time() + DAY)
+
+    assert await scheduler.feed(10) == 2
+    assert await scheduler.feed(10) == 0
+    assert await due_at(scheduler, CNPJS[0]) == pytest.approx(
+        time.time() + scheduler.claim_ttl, abs=60
+    )
+    assert scheduler.rabbitmq_client._scheduler.pending("bulk") == 2
+
+
+@pytest.mark.anyio
+async def test_feed_takes_at_most_limit_cnpjs(scheduler):
+    await scheduler.watch(CNPJS, due_at=0)
+
+    assert await scheduler.feed(2) == 2
+    assert await scheduler.feed(2) == 1
+
+
+@pytest.mark.anyio
+async def test_feed_releases_the_jobs_that_failed_to_publish(scheduler, redis_client):
+    scheduler.rabbitmq_client = PartiallyFailingRabbitMQClient()
+    await scheduler.watch(CNPJS[:2], due_at=0)
+
+    assert await scheduler.feed(10) == 2
+
+    claims = await redis_client._redis.keys("scrape_claim:*")
+    assert len(claims) == 1
+    assert scheduler.rabbitmq_client._scheduler.pending("bulk") == 1
@@ -0,0 +1,72 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from webscraper.clients.result_store import SQLiteResultStore
+
+CNPJ = "11222333000181"
+
+
+class FlakyResultStore(SQLiteResultStore):
+    """
+    Result store whose writes are slow and fail while the database is 'locked'.
+    """
+
+    def __init__(self, path, failures=0, **kwargs):
+        super().__init__(path, **kwargs)
+        self.failures = failures
+        self.writing = asyncio.Event()
+        self._loop = None
+
+    def _write(self, connection, rows):
+        self._loop.call_soon_threadsafe(self.writing.set)
+        time.sleep(0.05)
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return SQLiteResultStore._write(connection, rows)
+
+    async def save(self, cnpj, data, scraped_at=None):
+        self._loop = asyncio.get_running_loop()
+        await super().save(cnpj, data, scraped_at)
+
+
+async def latest(path):
+    store = SQLiteResultStore(path)
+    try:
+        return await store.latest(CNPJ)
+    finally:
+        await store.close()
+
+
+@pytest.mark.anyio
+async def test_close_waits_for_the_running_flush(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = FlakyResultStore(path, failures=1, flush_interval=0.01)
+    await store.save(CNPJ, {"Nome:": "Empresa"}, scraped_at=1000)
+    await store.writing.wait()
+
+    await store.close()
+
+    snapshot = await latest(path)
+    assert snapshot.data == {"Nome:": "Empresa"}
+    assert store._pending == []
+
+
+@pytest.mark.anyio
+async def test_close_gives_up_after_the_timeout(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = FlakyResultStore(
+        path, failures=1000, flush_interval=0.01, close_timeout=0.2
+    )
+    await store.save(CNPJ, {"Nome:": "Empresa"}, scraped_at=1000)
+    await store.writing.wait()
+
+    started = time.monotonic()
+    await store.close()
+
+    assert time.monotonic() - started < 1
+    assert store._pending == []
+    assert await latest(path) is None
@@ -0,0 +1,162 @@
+import pytest
+
+from webscraper.exceptions import InvalidParameterException
+from webscraper.services.throttle import CircuitBreaker, RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+async def take_token(limiter):
+    """
+    Runs the bucket script once, without sleeping.
+
+    :return: Seconds to wait for a token, 0 if one was taken
+    :rtype: float
+    """
+    return float(
+        await limiter.redis_client.run_script(
+            limiter.BUCKET_SCRIPT,
+            keys=[limiter.key],
+            args=[limiter.initial_rate, limiter.burst, limiter.state_ttl],
+        )
+    )
+
+
+async def test_bucket_allows_a_burst_then_waits(redis_client):
+    limiter = RateLimiter(redis_client, initial_rate=1, burst=3)
+
+    assert [await take_token(limiter) for _ in range(3)] == [0, 0, 0]
+    assert 0.9 < await take_token(limiter) <= 1
+
+
+async def test_acquire_waits_for_a_token(redis_client):
+    limiter = RateLimiter(redis_client, initial_rate=20, burst=1)
+
+    assert await limiter.acquire() == 0
+    assert await limiter.acquire() > 0
+
+
+async def test_bucket_is_shared_by_the_limiters_of_a_key(redis_client):
+    first = RateLimiter(redis_client, initial_rate=1, burst=1)
+    second = RateLimiter(redis_client, initial_rate=1, burst=1)
+    other = RateLimiter(redis_client, key="other_rate_limit", initial_rate=1, burst=1)
+
+    assert await take_token(first) == 0
+    assert await take_token(second) > 0
+    assert await take_token(other) == 0
+
+
+async def test_rate_increases_additively_up_to_the_maximum(redis_client):
+    limiter = RateLimiter(redis_client, initial_rate=5, max_rate=5.15, increase=0.5)
+
+    assert await limiter.record_success() == pytest.approx(5.1)
+    assert await limiter.record_success() == pytest.approx(5.15)
+
+
+async def test_rate_decreases_once_per_cooldown(redis_client):
+    limiter = RateLimiter(redis_client, initial_rate=4, decrease=0.5, cooldown=60)
+
+    assert await limiter.record_failure() == 2
+    assert await limiter.record_failure() == 2
+
+
+async def test_rate_does_not_decrease_below_the_minimum(redis_client):
+    limiter = RateLimiter(
+        redis_client, initial_rate=1, min_rate=0.8, decrease=0.5, cooldown=0
+    )
+
+    assert await limiter.record_failure() == pytest.approx(0.8)
+
+
+async def test_adapted_rate_refills_the_bucket(redis_client):
+    limiter = RateLimiter(redis_client, initial_rate=1, burst=1, cooldown=0)
+    await limiter.record_failure()
+
+    assert await take_token(limiter) == 0
+    assert 1.9 < await take_token(limiter) <= 2
+
+
+@pytest.mark.parametrize(
+    "parameters",
+    [
+        {"initial_rate": 0},
+        {"burst": 0},
+        {"min_rate": 10, "max_rate": 5},
+        {"decrease": 1},
+    ],
+)
+def test_invalid_rate_limiter(parameters):
+    with pytest.raises(InvalidParameterException):
+        RateLimiter(None, **parameters)
+
+
+async def expire_open_period(breaker):
+    await breaker.redis_client._redis.hset(breaker.key, "opened_until", 0)
+
+
+async def test_circuit_opens_after_the_threshold(redis_client):
+    breaker = CircuitBreaker(redis_client, failure_threshold=3, open_seconds=30)
+
+    for _ in range(2):
+        await breaker.record_failure()
+        assert await breaker.check() == 0
+
+    await breaker.record_failure()
+    assert 29 < await breaker.check() <= 30
+
+
+async def test_success_resets_the_failures(redis_client):
+    breaker = CircuitBreaker(redis_client, failure_threshold=2)
+
+    await breaker.record_failure()
+    await breaker.record_success()
+    await breaker.record_failure()
+
+    assert await breaker.check() == 0
+
+
+async def test_failures_while_open_are_ignored(redis_client):
+    breaker = CircuitBreaker(redis_client, failure_threshold=1, open_seconds=30)
+    await breaker.record_failure()
+    remaining = await breaker.check()
+
+    assert await breaker._record("failure") == 0
+    assert await breaker.check() <= remaining
+
+
+async def test_a_single_probe_goes_through_after_the_open_period(redis_client):
+    breaker = CircuitBreaker(redis_client, failure_threshold=1, open_seconds=30)
+    await breaker.record_failure()
+    await expire_open_period(breaker)
+
+    assert await breaker.check() == 0
+    assert await breaker.check() > 0
+
+
+async def test_successful_probe_closes_the_circuit(redis_client):
+    breaker = CircuitBreaker(redis_client, failure_threshold=1, open_seconds=30)
+    await breaker.record_failure()
+    await expire_open_period(breaker)
+    await breaker.check()
+
+    await breaker.record_success()
+
+    assert await breaker.check() == 0
+    assert await breaker.check() == 0
+
+
+async def test_failed_probe_opens_the_circuit_again(redis_client):
+    breaker = CircuitBreaker(redis_client, failure_threshold=5, open_seconds=30)
+    for _ in range(5):
+        await breaker.record_failure()
+    await expire_open_period(breaker)
+    await breaker.check()
+
+    assert await breaker._record("failure") == 30
+    assert 29 < await breaker.check() <= 30
+
+
+@pytest.mark.parametrize("parameters", [{"failure_threshold": 0}, {"open_seconds": 0}])
+def test_invalid_circuit_breaker(parameters):
+    with pytest.raises(InvalidParameterException):
+        CircuitBreaker(None, **parameters)
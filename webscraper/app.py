@@ -1,22 +1,55 @@
+from contextlib import asynccontextmanager
+from functools import partial
+
 from fastapi import FastAPI
 from webscraper.views.scrape import router as scrape_router
 from webscraper.views.results import router as results_router
+from webscraper.views.metrics import router as metrics_router
+from webscraper.views.admin import router as admin_router
 
 from webscraper.config import Settings
 
 from webscraper.clients.rabbitmq import AsyncRabbitMQClient
 from webscraper.clients.redis import AsyncRedisClient
+from webscraper.clients.result_store import ResultStore
+
+from webscraper.services.scrape import ScrapeService
+from webscraper.services.job_events import JobEventsListener
+from webscraper.services.cache_policy import CacheTTLPolicy
+from webscraper.services.refresh import RefreshScheduler
 
 from webscraper.helpers.log import Log
+from webscraper.helpers.lru_cache import TTLCache
+from webscraper.helpers.views_helper import OrjsonResponse
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Starts the background listeners of the application and closes its clients on shutdown.
+    """
+    app.state.job_events.start()
+    yield
+    await app.state.job_events.stop()
+    await app.state.rabbitmq_client.close()
+    await app.state.redis_client.close()
+    if app.state.result_store:
+        await app.state.result_store.close()
 
 
 def create_app():
 
-    app = FastAPI(title="Web Scrapping API")
+    app = FastAPI(
+        title="Web Scrapping API",
+        lifespan=lifespan,
+        default_response_class=OrjsonResponse,
+    )
 
     # Routing
     app.include_router(scrape_router)
     app.include_router(results_router)
+    app.include_router(metrics_router)
+    app.include_router(admin_router)
 
     # Configuration
     app.state.settings = Settings()
@@ -26,11 +59,40 @@ def create_app():
 
     # Clients
     rabbitmq_client = AsyncRabbitMQClient(
-        app.state.settings.rabbitmq_url, app.state.settings.rabbitmq_queue
+        app.state.settings.rabbitmq_url,
+        app.state.settings.rabbitmq_queue,
+        publisher_confirms=app.state.settings.rabbitmq_publisher_confirms,
     )
     app.state.rabbitmq_client = rabbitmq_client
 
-    redis_client = AsyncRedisClient(app.state.settings.redis_url)
+    redis_client = AsyncRedisClient.from_settings(app.state.settings)
     app.state.redis_client = redis_client
 
+    # Durable store of the results, read after a cache miss
+    app.state.result_store = ResultStore.from_settings(app.state.settings)
+
+    # Expiration of the cached jobs
+    app.state.cache_policy = CacheTTLPolicy.from_settings(app.state.settings)
+
+    # Watchlist of the CNPJs kept fresh by the refresh scheduler
+    app.state.refresh_scheduler = RefreshScheduler.from_settings(
+        redis_client, app.state.settings
+    )
+
+    # Job events from the workers
+    app.state.job_events = JobEventsListener(redis_client)
+
+    # In-process cache of terminal results, kept coherent by the job events
+    app.state.results_cache = None
+    if app.state.settings.results_local_cache_size:
+        results_cache = TTLCache(
+            app.state.settings.results_local_cache_size,
+            app.state.settings.results_local_cache_ttl,
+        )
+        app.state.job_events.add_handler(
+            partial(ScrapeService.update_local_cache, results_cache)
+        )
+        app.state.job_events.add_reset_handler(results_cache.clear)
+        app.state.results_cache = results_cache
+
     return app
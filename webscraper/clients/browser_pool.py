@@ -0,0 +1,291 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from webscraper.exceptions import InvalidParameterException
+
+from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
+
+
+class PooledBrowser(object):
+    """
+    A single Chromium instance managed by the BrowserPool.
+    Keeps track of how many jobs it served and how many contexts are open on it.
+    """
+
+    def __init__(self, browser):
+        """
+        :param playwright.async_api.Browser browser: The launched browser instance
+        :rtype: None
+        """
+        self.browser = browser
+        self.jobs = 0
+        self.active_contexts = 0
+        self.retired = False
+
+    @property
+    def healthy(self):
+        """
+        :return: True if the browser is still connected and was not retired
+        :rtype: bool
+        """
+        return not self.retired and self.browser.is_connected()
+
+
+class LeasedPage(object):
+    """
+    A page kept open across jobs, along with the pool context that hosts it.
+    The context is only given back to the pool when the page is closed.
+    """
+
+    def __init__(self, stack, page):
+        """
+        :param contextlib.AsyncExitStack stack: Stack holding the pool context open
+        :param playwright.async_api.Page page: The leased page
+        :rtype: None
+        """
+        self.page = page
+        self.jobs = 0
+        self.stats = None
+        self._stack = stack
+
+    async def close(self):
+        """
+        Closes the page context and gives it back to the pool.
+
+        :rtype: None
+        """
+        await self._stack.aclose()
+
+
+class BrowserPool(object):
+    """
+    Long-lived pool of Chromium browsers shared by the scraping jobs of a worker.
+
+    Browsers are launched once and hand out an isolated BrowserContext per job.
+    A browser is recycled after serving 'max_jobs_per_browser' jobs and restarted
+    if it crashes. The number of pages open at once is capped by 'max_pages'.
+    """
+
+    def __init__(self, size=1, max_pages=10, max_jobs_per_browser=100, headless=True):
+        """
+        :param int size: Number of browsers kept alive in the pool
+        :param int max_pages: Maximum number of contexts (pages) open at once across the pool
+        :param int max_jobs_per_browser: Number of jobs after which a browser is recycled
+        :param bool headless: Launch browsers in headless mode
+        :raises webscraper.exceptions.InvalidParameterException: If any of the limits is lower than 1
+        :rtype: None
+        """
+        if size < 1 or max_pages < 1 or max_jobs_per_browser < 1:
+            raise InvalidParameterException(
+                "'size', 'max_pages' and 'max_jobs_per_browser' must be greater than 0"
+            )
+
+        self.size = size
+        self.max_pages = max_pages
+        self.max_jobs_per_browser = max_jobs_per_browser
+        self.headless = headless
+
+        self._playwright = None
+        self._browsers = []
+        self._pages = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self.logger = Log.get_logger(__name__)
+
+    @property
+    def started(self):
+        """
+        :return: True if the pool was started and not closed yet
+        :rtype: bool
+        """
+        return self._playwright is not None
+
+    @property
+    def open_pages(self):
+        """
+        :return: Number of contexts currently handed out by the pool
+        :rtype: int
+        """
+        return sum(pooled.active_contexts for pooled in self._browsers)
+
+    @property
+    def exhausted(self):
+        """
+        :return: True if the pool already has 'max_pages' contexts open, so a new one has to wait
+        :rtype: bool
+        """
+        return self._pages.locked()
+
+    async def start(self):
+        """
+        Starts Playwright and launches the browsers of the pool, if not already started.
+
+        :rtype: None
+        """
+        async with self._lock:
+            if self.started:
+                return
+
+            self._playwright = await async_playwright().start()
+            for _ in range(self.size):
+                self._browsers.append(await self._launch())
+
+            self.logger.info(f"Browser pool started with {self.size} browser(s)")
+
+    async def _launch(self):
+        """
+        Launches a new Chromium browser.
+
+        :return: The new browser wrapped for the pool
+        :rtype: PooledBrowser
+        """
+        browser = await self._playwright.chromium.launch(headless=self.headless)
+        Metrics.BROWSER_POOL_SIZE.inc()
+        return PooledBrowser(browser)
+
+    async def _acquire_browser(self):
+        """
+        Picks the least loaded healthy browser, replacing crashed or retired ones.
+
+        :return: The browser that will host the next context
+        :rtype: PooledBrowser
+        """
+        async with self._lock:
+            for index, pooled in enumerate(self._browsers):
+                if not pooled.healthy and pooled.active_contexts == 0:
+                    self.logger.warning("Restarting unhealthy or retired browser")
+                    await self._close_browser(pooled)
+                    self._browsers[index] = await self._launch()
+
+            candidates = [pooled for pooled in self._browsers if pooled.healthy]
+            if not candidates:
+                # Every browser is retired but still busy, launch an extra one
+                pooled = await self._launch()
+                self._browsers.append(pooled)
+                return pooled
+
+            return min(candidates, key=lambda pooled: pooled.active_contexts)
+
+    async def _release_browser(self, pooled):
+        """
+        Accounts a finished job on the browser and recycles it when it reached its job limit.
+
+        :param PooledBrowser pooled: The browser that hosted the finished context
+        :rtype: None
+        """
+        async with self._lock:
+            pooled.active_contexts -= 1
+            pooled.jobs += 1
+            Metrics.BROWSER_POOL_OPEN_PAGES.dec()
+
+            if pooled.jobs >= self.max_jobs_per_browser:
+                pooled.retired = True
+
+            if pooled.retired and pooled.active_contexts == 0:
+                await self._close_browser(pooled)
+                if pooled in self._browsers:
+                    self._browsers.remove(pooled)
+                if len(self._browsers) < self.size:
+                    self._browsers.append(await self._launch())
+
+    async def _close_browser(self, pooled):
+        """
+        Closes a browser ignoring errors from already crashed instances.
+
+        :param PooledBrowser pooled: The browser to close
+        :rtype: None
+        """
+        Metrics.BROWSER_POOL_SIZE.dec()
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            self.logger.warning(f"Error while closing browser: {e}")
+
+    @asynccontextmanager
+    async def context(self, **kwargs):
+        """
+        Hands out an isolated browser context, closing it when the job is done.
+        Waits while the pool already has 'max_pages' contexts open.
+
+        :param kwargs: Options passed to playwright.async_api.Browser.new_context
+        :return: The new browser context
+        :rtype: playwright.async_api.BrowserContext
+        """
+        if not self.started:
+            await self.start()
+
+        # No await before taking a slot once started, so a free slot seen by the caller is still free
+        async with self._pages:
+            pooled = await self._acquire_browser()
+            pooled.active_contexts += 1
+            Metrics.BROWSER_POOL_OPEN_PAGES.inc()
+
+            try:
+                context = await pooled.browser.new_context(**kwargs)
+            except Exception:
+                pooled.retired = pooled.retired or not pooled.browser.is_connected()
+                await self._release_browser(pooled)
+                raise
+
+            try:
+                yield context
+            finally:
+                try:
+                    await context.close()
+                except Exception as e:
+                    self.logger.warning(f"Error while closing browser context: {e}")
+                await self._release_browser(pooled)
+
+    async def lease_page(self, **kwargs):
+        """
+        Opens a page in a new context that stays open until the lease is closed,
+        so a page can be reused by many jobs. Counts against 'max_pages' while open.
+
+        :param kwargs: Options passed to playwright.async_api.Browser.new_context
+        :return: The leased page
+        :rtype: LeasedPage
+        """
+        stack = AsyncExitStack()
+        context = await stack.enter_async_context(self.context(**kwargs))
+        try:
+            page = await context.new_page()
+        except Exception:
+            await stack.aclose()
+            raise
+        return LeasedPage(stack, page)
+
+    async def health_check(self):
+        """
+        Checks that every browser of the pool is connected, restarting idle ones that are not.
+
+        :return: True if the pool is started and all its browsers are healthy
+        :rtype: bool
+        """
+        if not self.started:
+            return False
+
+        async with self._lock:
+            for index, pooled in enumerate(self._browsers):
+                if not pooled.browser.is_connected() and pooled.active_contexts == 0:
+                    self.logger.warning("Browser crashed, restarting it")
+                    await self._close_browser(pooled)
+                    self._browsers[index] = await self._launch()
+
+            return all(pooled.healthy for pooled in self._browsers)
+
+    async def close(self):
+        """
+        Closes all the browsers of the pool and stops Playwright.
+
+        :rtype: None
+        """
+        async with self._lock:
+            for pooled in self._browsers:
+                await self._close_browser(pooled)
+            self._browsers = []
+
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
@@ -1,46 +1,115 @@
 import aio_pika
 import asyncio
 import json
-
+import orjson
+from functools import partial
 
 from webscraper.exceptions import InvalidParameterException
 
 from webscraper.models.message_dto import QueueMessageDTO
 
+from webscraper.helpers.fair_scheduler import FairScheduler
 from webscraper.helpers.log import Log
 
 
 class AsyncRabbitMQClient(object):
     """
-    Asynchronous RabbitMQ client for publishing messages to a single queue.
+    Asynchronous RabbitMQ client for publishing messages to the queues of the priority lanes.
+
+    Each lane has its own durable queue: the default lane uses 'queue_name' itself and the
+    others '<queue_name>.<lane>', so a backlog in one lane never blocks the messages of another.
+
+    Delayed retries wait in '<lane queue>.retry.<attempt>' queues, whose expired messages are
+    dead-lettered back into the lane queue, and messages out of retries go to the
+    '<queue_name>.dead' queue.
     """
 
-    def __init__(self, url, queue_name):
+    LANES = ("interactive", "bulk")
+    DEFAULT_LANE = "interactive"
+
+    def __init__(self, url, queue_name, publisher_confirms=True):
         """
         :param str url: RabbitMQ connection URL
-        :param str queue_name: Name of the queue for publishing/consuming messages
+        :param str queue_name: Name of the queue of the default lane, the other lanes are suffixed
+        :param bool publisher_confirms: Waits for the broker to confirm each published message.
+        Defaults to True
         :rtype: None
         """
         self.url = url
         self.queue_name = queue_name
+        self.publisher_confirms = publisher_confirms
         self._connection = None
+        self._channel = None
+        self._declared = set()
+        self._stopping = asyncio.Event()
+        self._lock = asyncio.Lock()
         self.logger = Log.get_logger(__name__)
 
+    @property
+    def dead_letter_queue(self):
+        """
+        :return: Name of the queue of the messages that ran out of retries
+        :rtype: str
+        """
+        return f"{self.queue_name}.dead"
+
     async def connect(self):
         """
         Connects to RabbitMQ instance asynchronously, if it's not already connected.
-        Declares a new durable queue if it does not exist.
+        Opens the long-lived publishing channel and declares the durable queues of the lanes
+        on it if they do not exist.
 
         :rtype: None
         """
-        if not self._connection or self._connection.is_closed:
-            self._connection = await aio_pika.connect_robust(self.url)
-            async with self._connection.channel() as channel:
-                await channel.declare_queue(self.queue_name, durable=True)
+        async with self._lock:
+            if not self._connection or self._connection.is_closed:
+                self._connection = await aio_pika.connect_robust(self.url)
+                self._channel = None
+
+            if not self._channel or self._channel.is_closed:
+                # Robust channels are reopened by aio_pika after a reconnect
+                self._channel = await self._connection.channel(
+                    publisher_confirms=self.publisher_confirms
+                )
+                for lane in self.LANES:
+                    await self._channel.declare_queue(
+                        self.queue_for(lane), durable=True
+                    )
+                await self._channel.declare_queue(self.dead_letter_queue, durable=True)
+                self._declared = set()
+
+    def queue_for(self, lane):
+        """
+        :param str lane: Name of the lane
+        :return: Name of the queue of the lane
+        :rtype: str
+        :raises webscraper.exceptions.InvalidParameterException: If the lane is unknown
+        """
+        if lane not in self.LANES:
+            raise InvalidParameterException(f"Unknown lane '{lane}'")
+        if lane == self.DEFAULT_LANE:
+            return self.queue_name
+        return f"{self.queue_name}.{lane}"
+
+    async def _get_channel(self):
+        """
+        Returns the long-lived publishing channel, connecting first if needed.
+
+        :return: The publishing channel
+        :rtype: aio_pika.abc.AbstractRobustChannel
+        """
+        if (
+            not self._connection
+            or self._connection.is_closed
+            or not self._channel
+            or self._channel.is_closed
+        ):
+            await self.connect()
+        return self._channel
 
     async def publish(self, body):
         """
-        Publishes a message to the queue asynchronously.
+        Publishes a message to the queue of its priority lane asynchronously.
 
         :param webscraper.models.message_dto.QueueMessageDTO body: The message body to publish
 
@@ -56,15 +125,14 @@ class AsyncRabbitMQClient(object):
             )
 
         try:
-            await self.connect()
-            message = aio_pika.Message(body.json().encode())
+            channel = await self._get_channel()
+            message = aio_pika.Message(body.model_dump_json().encode())
 
-            async with self._connection.channel() as channel:
-                await channel.default_exchange.publish(
-                    message, routing_key=self.queue_name
-                )
+            await channel.default_exchange.publish(
+                message, routing_key=self.queue_for(body.priority)
+            )
 
-            self.logger.info(f"Sent message: {body.model_dump()}")
+            self.logger.debug("Sent message: %s", body)
 
         except aio_pika.exceptions.AMQPConnectionError as e:
             self.logger.error(f"Failed to connect to RabbitMQ: {e}")
@@ -73,33 +141,269 @@ class AsyncRabbitMQClient(object):
             self.logger.error(f"Error while publishing message: {e}")
             raise
 
-    async def consume_forever(self, callback):
+    async def publish_many(self, bodies):
         """
-        Listens and consumes the messages from the queue forever.
+        Publishes many messages to the queues of their lanes over the publishing channel.
+        All the messages are sent before waiting for the broker confirmations at once.
+
+        :param list[webscraper.models.message_dto.QueueMessageDTO] bodies: The message bodies to publish
+
+        :raises aio_pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        :raises webscraper.exceptions.InvalidParameterException: If any body is not in the correct format.
+        :return: One item per body, None if it was confirmed or the exception raised while publishing it
+        :rtype: list[Exception | None]
+        """
+
+        if not all(isinstance(body, QueueMessageDTO) for body in bodies):
+            raise InvalidParameterException(
+                "'bodies' must be a list of QueueMessageDTO instances"
+            )
+
+        if not bodies:
+            return []
+
+        try:
+            channel = await self._get_channel()
+
+            results = await asyncio.gather(
+                *(
+                    channel.default_exchange.publish(
+                        aio_pika.Message(body.model_dump_json().encode()),
+                        routing_key=self.queue_for(body.priority),
+                    )
+                    for body in bodies
+                ),
+                return_exceptions=True,
+            )
+
+        except aio_pika.exceptions.AMQPConnectionError as e:
+            self.logger.error(f"Failed to connect to RabbitMQ: {e}")
+            raise
+
+        errors = [
+            result if isinstance(result, BaseException) else None for result in results
+        ]
+        self.logger.debug(
+            "Sent %s of %s message(s) in batch", errors.count(None), len(bodies)
+        )
+        return errors
+
+    def retry_queue_for(self, lane, attempt):
+        """
+        :param str lane: Name of the lane
+        :param int attempt: Number of the retry
+        :return: Name of the delay queue of the retry
+        :rtype: str
+        """
+        return f"{self.queue_for(lane)}.retry.{attempt}"
+
+    async def publish_delayed(self, body, delay, attempt):
+        """
+        Publishes a message back to the queue of its lane after a delay, through a delay queue
+        per lane and attempt. The message expires in the delay queue and RabbitMQ dead-letters
+        it into the lane queue, so no worker holds it while it waits.
+
+        :param webscraper.models.message_dto.QueueMessageDTO body: The message body to publish
+        :param float delay: Seconds to wait before the message is delivered again
+        :param int attempt: Number of the retry, each one has its own delay queue so that
+        messages with similar delays share a queue
+        :raises aio_pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        :rtype: None
+        """
+        channel = await self._get_channel()
+        queue_name = self.retry_queue_for(body.priority, attempt)
+
+        if queue_name not in self._declared:
+            await channel.declare_queue(
+                queue_name,
+                durable=True,
+                arguments={
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.queue_for(body.priority),
+                },
+            )
+            self._declared.add(queue_name)
+
+        await channel.default_exchange.publish(
+            aio_pika.Message(
+                body.model_dump_json().encode(),
+                expiration=max(delay, 0.001),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=queue_name,
+        )
+        self.logger.info(f"Scheduled retry {attempt} of message in {delay:.1f}s")
+
+    async def publish_dead(self, body):
+        """
+        Publishes a message that ran out of retries to the dead-letter queue.
+
+        :param webscraper.models.message_dto.QueueMessageDTO body: The message body to publish
+        :raises aio_pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        :rtype: None
+        """
+        channel = await self._get_channel()
+        await channel.default_exchange.publish(
+            aio_pika.Message(
+                body.model_dump_json().encode(),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=self.dead_letter_queue,
+        )
+        self.logger.warning(
+            f"Sent message to the dead-letter queue: {body.model_dump()}"
+        )
+
+    async def get_dead(self, limit=100):
+        """
+        Reads messages of the dead-letter queue without removing them.
+
+        :param int limit: Maximum number of messages to read. Defaults to 100
+        :return: The bodies of the messages, oldest first
+        :rtype: list[dict]
+        """
+        await self.connect()
+        channel = await self._connection.channel()
+        bodies = []
+
+        try:
+            queue = await channel.get_queue(self.dead_letter_queue)
+            while len(bodies) < limit:
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                bodies.append(json.loads(message.body.decode()))
+        finally:
+            # Closing the channel requeues the unacked messages in their original order
+            await channel.close()
+
+        return bodies
+
+    async def replay_dead(self, limit=100):
+        """
+        Moves messages of the dead-letter queue back into the queues of their lanes,
+        with their attempts reset.
+
+        :param int limit: Maximum number of messages to replay. Defaults to 100
+        :return: The bodies of the replayed messages
+        :rtype: list[dict]
+        """
+        await self.connect()
+        channel = await self._connection.channel(publisher_confirms=True)
+        bodies = []
+
+        try:
+            queue = await channel.get_queue(self.dead_letter_queue)
+            while len(bodies) < limit:
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+
+                body = json.loads(message.body.decode())
+                body.update(attempts=0, last_error=None)
+                await channel.default_exchange.publish(
+                    aio_pika.Message(
+                        json.dumps(body).encode(),
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    ),
+                    routing_key=self.queue_for(body.get("priority", self.DEFAULT_LANE)),
+                )
+                await message.ack()
+                bodies.append(body)
+        finally:
+            await channel.close()
+
+        self.logger.info(f"Replayed {len(bodies)} dead-lettered message(s)")
+        return bodies
+
+    async def consume_forever(
+        self,
+        callback,
+        concurrency=1,
+        weights=None,
+        prefetch=None,
+        gate=None,
+        drain_timeout=None,
+    ):
+        """
+        Listens and consumes the messages from the queues of the lanes until stop() is called.
         Tries to reconnect automatically on connection errors.
 
+        Every lane is consumed with up to 'prefetch' unacked messages, which are buffered in a
+        FairScheduler. Whenever one of the 'concurrency' slots is free, the next message is
+        picked by lane weight and then round-robin across the tenants of the lane, and
+        processed in its own task. Messages are acked as soon as their callback finishes.
+
+        The tenants are only balanced among the buffered messages, so the prefetch of a lane is
+        its fairness window: a tenant whose messages are queued behind more than 'prefetch'
+        messages of another tenant waits for them.
+
+        On stop, the consumers are cancelled and the in-flight messages are drained for up to
+        'drain_timeout' seconds before the connection is closed. Messages still running after
+        the deadline are cancelled and requeued, as well as the buffered ones.
+
         :param callable(dict) callback: Async function to process each message.
                                          Needs to accept a dict (message body) as parameter.
+        :param int concurrency: Maximum number of messages processed at the same time. Defaults to 1
+        :param dict[str, int] weights: Weight of each lane, only the lanes listed are consumed.
+        Defaults to the same weight for all the lanes
+        :param int | dict[str, int] prefetch: Unacked messages buffered per lane, the same for all
+        the lanes or by lane. Defaults to 'concurrency'
+        :param callable() gate: Optional async function awaited before each message is processed.
+        While it waits, only the lane of the message is paused and the other lanes are still served
+        :param float drain_timeout: Seconds to wait for the in-flight messages when stopping or
+        reconnecting. Defaults to None (no deadline)
+        :raises webscraper.exceptions.InvalidParameterException: If concurrency is lower than 1
         :rtype: None
         """
-        while True:
+        if concurrency < 1:
+            raise InvalidParameterException("'concurrency' must be greater than 0")
+
+        weights = weights or {lane: 1 for lane in self.LANES}
+
+        while not self._stopping.is_set():
 
             await self.connect()
             channel = await self._connection.channel()
-            queue = await channel.get_queue(self.queue_name)
+
+            scheduler = FairScheduler(weights)
+            slots = asyncio.Semaphore(concurrency)
+            tasks = set()
+            gated = set()
+            consumers = []
+            dispatcher = None
 
             try:
-                async with queue.iterator() as queue_iter:
-                    async for message in queue_iter:
-                        async with message.process():
-                            body = json.loads(message.body.decode())
-                            self.logger.info(f"Received message: {body}")
-                            try:
-                                await callback(body)
-                            except Exception as e:
-                                self.logger.error(
-                                    f"Error processing message {body}: {e}"
-                                )
+                for lane in weights:
+                    # The limit applies to the consumers started after it, so each lane has its own
+                    await channel.set_qos(
+                        prefetch_count=self._lane_prefetch(prefetch, lane, concurrency)
+                    )
+                    queue = await channel.get_queue(self.queue_for(lane))
+                    consumer_tag = await queue.consume(
+                        partial(self._schedule_message, scheduler, lane)
+                    )
+                    consumers.append((queue, consumer_tag))
+
+                dispatcher = asyncio.create_task(
+                    self._dispatch_forever(
+                        scheduler, slots, tasks, gated, callback, gate
+                    )
+                )
+                stopping = asyncio.create_task(self._stopping.wait())
+                try:
+                    await asyncio.wait(
+                        {dispatcher, stopping}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    stopping.cancel()
+
+                if dispatcher.done():
+                    dispatcher.result()
+                else:
+                    self.logger.info("Stopping the consumers")
+                    for queue, consumer_tag in consumers:
+                        await queue.cancel(consumer_tag)
 
             except aio_pika.exceptions.AMQPConnectionError:
                 self.logger.warning(
@@ -111,8 +415,200 @@ class AsyncRabbitMQClient(object):
                     f"Unexpected error occurred while consuming a message: {e}"
                 )
             finally:
+                if dispatcher and not dispatcher.done():
+                    dispatcher.cancel()
+                    await asyncio.gather(dispatcher, return_exceptions=True)
+                # Messages still waiting for the gate were not started, they are redelivered
+                for task in gated:
+                    task.cancel()
+                await asyncio.gather(*gated, return_exceptions=True)
+                await self._drain(tasks, drain_timeout)
+                # Unacked buffered messages are redelivered once the channel is closed
+                scheduler.clear()
                 await self.close()
 
+    @staticmethod
+    def _lane_prefetch(prefetch, lane, concurrency):
+        """
+        :param int | dict[str, int] prefetch: Unacked messages buffered per lane, or by lane
+        :param str lane: Name of the lane
+        :param int concurrency: Maximum number of messages processed at the same time
+        :return: Unacked messages buffered for the lane, at least 'concurrency'
+        :rtype: int
+        """
+        if isinstance(prefetch, dict):
+            prefetch = prefetch.get(lane)
+        return max(prefetch or concurrency, concurrency)
+
+    def stop(self):
+        """
+        Makes consume_forever stop consuming, drain the in-flight messages and return.
+
+        :rtype: None
+        """
+        self._stopping.set()
+
+    async def _dispatch_forever(self, scheduler, slots, tasks, gated, callback, gate):
+        """
+        Hands the buffered messages to their callback in the fair order, while there are free slots.
+
+        :param webscraper.helpers.fair_scheduler.FairScheduler scheduler: The consumer scheduler
+        :param asyncio.Semaphore slots: Semaphore of the free processing slots
+        :param set[asyncio.Task] tasks: Set where the in-flight tasks are kept
+        :param set[asyncio.Task] gated: Set where the tasks waiting for the gate are kept
+        :param callable(dict) callback: Async function to process each message
+        :param callable() gate: Optional async function awaited before each message is processed
+        :rtype: None
+        """
+        while True:
+            # Waits for a free slot without taking it, so a message done with the gate can take it
+            await slots.acquire()
+            slots.release()
+            lane, message, body = await scheduler.get()
+            if not gate:
+                await slots.acquire()
+                self._start_message(message, body, callback, slots, tasks)
+                continue
+
+            # Only the lane of the message waits for the gate, the other lanes are still served
+            scheduler.pause(lane)
+            task = asyncio.create_task(
+                self._pass_gate(
+                    scheduler, lane, message, body, slots, tasks, callback, gate
+                )
+            )
+            gated.add(task)
+            task.add_done_callback(gated.discard)
+
+    async def _pass_gate(
+        self, scheduler, lane, message, body, slots, tasks, callback, gate
+    ):
+        """
+        Waits for the gate and a free slot, then processes the message and resumes its lane.
+
+        :param webscraper.helpers.fair_scheduler.FairScheduler scheduler: The consumer scheduler
+        :param str lane: Lane of the message, paused until the gate lets it through
+        :param aio_pika.abc.AbstractIncomingMessage message: The message received from the queue
+        :param dict body: The decoded message body
+        :param asyncio.Semaphore slots: Semaphore of the free processing slots
+        :param set[asyncio.Task] tasks: Set where the in-flight tasks are kept
+        :param callable(dict) callback: Async function to process the message body
+        :param callable() gate: Async function awaited before the message is processed
+        :rtype: None
+        """
+        try:
+            try:
+                await gate()
+            except Exception as e:
+                # Fails open, the message is processed rather than left unacked
+                self.logger.error(f"Error while waiting for the gate: {e}")
+            await slots.acquire()
+        finally:
+            scheduler.resume(lane)
+        self._start_message(message, body, callback, slots, tasks)
+
+    def _start_message(self, message, body, callback, slots, tasks):
+        """
+        Processes a message in its own task, holding one of the slots.
+
+        :param aio_pika.abc.AbstractIncomingMessage message: The message received from the queue
+        :param dict body: The decoded message body
+        :param callable(dict) callback: Async function to process the message body
+        :param asyncio.Semaphore slots: Semaphore released when the message is done
+        :param set[asyncio.Task] tasks: Set where the in-flight tasks are kept
+        :rtype: None
+        """
+        task = asyncio.create_task(
+            self._process_message(message, body, callback, slots)
+        )
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def _drain(self, tasks, timeout):
+        """
+        Waits for the in-flight messages, cancelling the ones still running after the timeout.
+
+        :param set[asyncio.Task] tasks: The in-flight tasks
+        :param float timeout: Seconds to wait, None to wait for all of them
+        :rtype: None
+        """
+        if not tasks:
+            return
+
+        self.logger.info(f"Draining {len(tasks)} in-flight message(s)")
+        _, pending = await asyncio.wait(set(tasks), timeout=timeout)
+        if pending:
+            self.logger.warning(
+                f"Cancelling {len(pending)} message(s) still running after {timeout} seconds, "
+                "they will be redelivered"
+            )
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def queue_depths(self):
+        """
+        Reads the number of ready messages of the lane and dead-letter queues.
+
+        :return: Dictionary of queue names to their number of ready messages,
+        empty once the client is stopping
+        :rtype: dict[str, int]
+        """
+        if self._stopping.is_set():
+            return {}
+
+        channel = await self._get_channel()
+        depths = {}
+        for name in [self.queue_for(lane) for lane in self.LANES] + [
+            self.dead_letter_queue
+        ]:
+            queue = await channel.declare_queue(name, passive=True, robust=False)
+            depths[name] = queue.declaration_result.message_count
+        return depths
+
+    async def _schedule_message(self, scheduler, lane, message):
+        """
+        Buffers a message received from the queue of a lane in the scheduler.
+
+        :param webscraper.helpers.fair_scheduler.FairScheduler scheduler: The consumer scheduler
+        :param str lane: Lane of the queue the message was received from
+        :param aio_pika.abc.AbstractIncomingMessage message: The message received from the queue
+        :rtype: None
+        """
+        try:
+            body = orjson.loads(message.body)
+        except ValueError as e:
+            self.logger.error(f"Rejecting message that is not valid JSON: {e}")
+            await message.reject()
+            return
+
+        scheduler.put(lane, body.get("tenant"), (lane, message, body))
+
+    async def _process_message(self, message, body, callback, slots):
+        """
+        Processes a single message, acking it when the callback finishes.
+        If the task is cancelled (e.g. after the drain deadline) the message is requeued.
+
+        :param aio_pika.abc.AbstractIncomingMessage message: The message received from the queue
+        :param dict body: The decoded message body
+        :param callable(dict) callback: Async function to process the message body
+        :param asyncio.Semaphore slots: Semaphore released when the message is done
+        :rtype: None
+        """
+        try:
+            async with message.process(requeue=True):
+                self.logger.debug("Received message: %s", body)
+                try:
+                    await callback(body)
+                except Exception as e:
+                    self.logger.error(f"Error processing message {body}: {e}")
+        except Exception as e:
+            self.logger.error(
+                f"Unexpected error occurred while consuming a message: {e}"
+            )
+        finally:
+            slots.release()
+
     async def close(self):
         """
         Closes the RabbitMQ connection asynchronously.
@@ -121,4 +617,5 @@ class AsyncRabbitMQClient(object):
         """
         if self._connection and not self._connection.is_closed:
             await self._connection.close()
-            self._connection = None
+        self._connection = None
+        self._channel = None
@@ -1,46 +1,113 @@
-import json
 import redis.asyncio as redis
+from webscraper.exceptions import CodecException
+from webscraper.helpers.codecs import Codec
 from webscraper.helpers.log import Log
 
 
 class AsyncRedisClient:
     """
     Asynchronous Redis client for storing and retrieving JSON-serializable objects.
+    Objects are serialized with a pluggable codec, plain JSON by default.
     """
 
-    def __init__(self, url):
+    def __init__(
+        self,
+        url,
+        max_connections=50,
+        pool_timeout=5,
+        socket_timeout=None,
+        socket_connect_timeout=5,
+        socket_keepalive=True,
+        health_check_interval=30,
+        codec=None,
+    ):
         """
         Initialize the Redis client.
 
         :param str url: Redis connection URL
+        :param int max_connections: Maximum number of connections in the pool. Defaults to 50
+        :param float pool_timeout: Seconds to wait for a free connection when the pool is exhausted,
+        instead of opening a new one. Defaults to 5
+        :param float socket_timeout: Seconds to wait for a command reply. Defaults to None (no timeout)
+        :param float socket_connect_timeout: Seconds to wait while connecting. Defaults to 5
+        :param bool socket_keepalive: Enables TCP keepalive on the connections. Defaults to True
+        :param int health_check_interval: Seconds after which an idle connection is checked before
+        being used. Defaults to 30
+        :param webscraper.helpers.codecs.Codec codec: Codec of the stored objects. Defaults to plain JSON
         :rtype: None
         """
         self.url = url
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout
+        self.socket_keepalive = socket_keepalive
+        self.health_check_interval = health_check_interval
+        self.codec = codec or Codec()
         self._redis = None
+        self._scripts = {}
         self.logger = Log.get_logger(__name__)
 
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Creates a Redis client configured by the application settings.
+
+        :param webscraper.config.Settings settings: Application settings
+        :return: The Redis client
+        :rtype: AsyncRedisClient
+        """
+        return cls(
+            settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            pool_timeout=settings.redis_pool_timeout,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_socket_connect_timeout,
+            socket_keepalive=settings.redis_socket_keepalive,
+            health_check_interval=settings.redis_health_check_interval,
+            codec=Codec(
+                settings.redis_codec,
+                compression=settings.redis_compression,
+                compress_min_size=settings.redis_compress_min_size,
+            ),
+        )
+
     async def connect(self):
         """
         Connects to the Redis server asynchronously if not already connected.
+        Bursts beyond 'max_connections' wait for a free connection of the pool.
 
         :rtype: None
         """
         if not self._redis:
-            self._redis = await redis.from_url(self.url)
+            pool = redis.BlockingConnectionPool.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                timeout=self.pool_timeout,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_connect_timeout,
+                socket_keepalive=self.socket_keepalive,
+                health_check_interval=self.health_check_interval,
+            )
+            self._redis = redis.Redis(connection_pool=pool)
 
-    async def set_value(self, key, value, ttl=None):
+    async def set_value(self, key, value, ttl=None, nx=False):
         """
         Stores a JSON-serializable object in Redis with an optional expiration time.
 
         :param str key: Redis key
         :param dict value: Python dictionary (or JSON-serializable object) to store
         :param int ttl: Expiration time in seconds. Defaults to None (no expiration).
-        :rtype: None
+        :param bool nx: Only stores the value if the key does not exist yet. Defaults to False
+        :return: True if the value was stored, False if 'nx' is set and the key already exists
+        :rtype: bool
         """
         await self.connect()
-        data = json.dumps(value)
-        await self._redis.set(key, data, ex=ttl)
-        self.logger.info(f"Stored key '{key}' in Redis data '{data}'")
+        data = self.codec.dumps(value)
+        stored = await self._redis.set(key, data, ex=ttl, nx=nx)
+        if stored:
+            self.logger.debug("Stored key '%s' in Redis data '%s'", key, data)
+        return bool(stored)
 
     async def get_value(self, key):
         """
@@ -54,12 +121,202 @@ class AsyncRedisClient:
         data = await self._redis.get(key)
         if data:
             try:
-                return json.loads(data)
-            except json.JSONDecodeError:
-                self.logger.error(f"Failed to decode JSON for key '{key}'")
+                return self.codec.loads(data)
+            except CodecException:
+                self.logger.error(f"Failed to decode value for key '{key}'")
                 return None
         return None
 
+    async def set_many(self, mapping, ttl=None, nx=False):
+        """
+        Stores many JSON-serializable objects in Redis in a single pipelined round trip.
+
+        :param dict mapping: Dictionary of Redis keys to the objects to store
+        :param int ttl: Expiration time in seconds. Defaults to None (no expiration).
+        :param bool nx: Only stores each value if its key does not exist yet. Defaults to False
+        :return: Dictionary of Redis keys to True if the value was stored, False otherwise
+        :rtype: dict
+        """
+        if not mapping:
+            return {}
+
+        await self.connect()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, self.codec.dumps(value), ex=ttl, nx=nx)
+            results = await pipe.execute()
+
+        self.logger.debug("Stored %s key(s) in Redis", sum(map(bool, results)))
+        return {key: bool(stored) for key, stored in zip(mapping, results)}
+
+    async def get_many(self, keys):
+        """
+        Retrieves many JSON objects from Redis with a single MGET.
+
+        :param list[str] keys: Redis keys
+        :return: Dictionary of Redis keys to their Python dictionary, or None if missing or invalid
+        :rtype: dict
+        """
+        if not keys:
+            return {}
+
+        await self.connect()
+        values = await self._redis.mget(keys)
+
+        result = {}
+        for key, data in zip(keys, values):
+            result[key] = None
+            if data:
+                try:
+                    result[key] = self.codec.loads(data)
+                except CodecException:
+                    self.logger.error(f"Failed to decode value for key '{key}'")
+        return result
+
+    async def scan_many(self, pattern, count=1000):
+        """
+        Iterates over the JSON objects whose keys match a pattern with SCAN, one MGET per batch,
+        so the keyspace is never loaded at once. Keys written during the scan may be missed
+        or returned twice, as SCAN guarantees.
+
+        :param str pattern: Glob-style pattern of the keys (e.g. 'scrape_job:*')
+        :param int count: Keys fetched per batch. Defaults to 1000
+        :return: Async iterator of dictionaries of Redis keys to their Python dictionary,
+        without the keys that expired or could not be decoded
+        :rtype: collections.abc.AsyncIterator[dict]
+        """
+        await self.connect()
+        cursor = 0
+        while True:
+            cursor, keys = await self._redis.scan(cursor, match=pattern, count=count)
+            if keys:
+                values = await self.get_many([key.decode() for key in keys])
+                yield {key: value for key, value in values.items() if value}
+            if not cursor:
+                return
+
+    async def set_with_status(
+        self, key, status, value, ttl=None, delete_keys=None, channel=None
+    ):
+        """
+        Stores a status object and deletes related keys (e.g. a job claim) in a single
+        MULTI/EXEC transaction, so readers never see one write without the other.
+
+        :param str key: Redis key
+        :param str status: Status stored in the 'status' field of the object
+        :param dict value: Python dictionary to store
+        :param int ttl: Expiration time in seconds. Defaults to None (no expiration).
+        :param list[str] delete_keys: Keys deleted in the same transaction. Defaults to None
+        :param str channel: Pub/sub channel where the stored object is also published. Defaults to None
+        :rtype: None
+        """
+        await self.connect()
+        data = self.codec.dumps({**value, "status": status})
+
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, data, ex=ttl)
+            if delete_keys:
+                pipe.delete(*delete_keys)
+            if channel:
+                pipe.publish(channel, data)
+            await pipe.execute()
+
+        self.logger.debug("Stored key '%s' with status '%s' in Redis", key, status)
+
+    async def add_members(self, key, *members, ttl=None):
+        """
+        Adds members to a Redis set, refreshing its expiration time.
+
+        :param str key: Redis key of the set
+        :param str members: Members to add
+        :param int ttl: Expiration time of the set in seconds. Defaults to None (no expiration).
+        :rtype: None
+        """
+        if not members:
+            return
+
+        await self.connect()
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(key, *members)
+            if ttl:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def pop_members(self, key):
+        """
+        Retrieves all the members of a Redis set and deletes it atomically.
+
+        :param str key: Redis key of the set
+        :return: The members of the set
+        :rtype: set[str]
+        """
+        await self.connect()
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.smembers(key)
+            pipe.delete(key)
+            members, _ = await pipe.execute()
+
+        return {member.decode() for member in members}
+
+    async def listen(self, pattern, on_subscribe=None):
+        """
+        Subscribes to the pub/sub channels matching a pattern and yields their decoded messages.
+        Uses a single dedicated connection for as long as the generator is consumed.
+
+        :param str pattern: Glob-style pattern of the channels (e.g. 'events:*')
+        :param callable() on_subscribe: An optional coroutine function awaited once Redis
+        confirms the subscription, from when on no message is missed
+        :return: Async generator of (channel, message) tuples
+        :rtype: AsyncIterator[tuple[str, dict]]
+        """
+        await self.connect()
+        pubsub = self._redis.pubsub()
+        await pubsub.psubscribe(pattern)
+
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "psubscribe" and on_subscribe:
+                    await on_subscribe()
+                if message["type"] != "pmessage":
+                    continue
+                try:
+                    data = self.codec.loads(message["data"])
+                except CodecException:
+                    self.logger.error(
+                        f"Failed to decode message from '{message['channel']}'"
+                    )
+                    continue
+                yield message["channel"].decode(), data
+        finally:
+            await pubsub.aclose()
+
+    async def delete_value(self, *keys):
+        """
+        Deletes one or more keys from Redis.
+
+        :param str keys: Redis keys
+        :rtype: None
+        """
+        if not keys:
+            return
+
+        await self.connect()
+        await self._redis.delete(*keys)
+
+    async def run_script(self, script, keys=(), args=()):
+        """
+        Runs a Lua script atomically, sending it only once and then by its SHA1.
+
+        :param str script: Source of the Lua script
+        :param list[str] keys: Redis keys used by the script (KEYS)
+        :param list args: Other arguments of the script (ARGV)
+        :return: The reply of the script
+        """
+        await self.connect()
+        if script not in self._scripts:
+            self._scripts[script] = self._redis.register_script(script)
+        return await self._scripts[script](keys=list(keys), args=list(args))
+
     async def close(self):
         """
         Closes the Redis connection.
@@ -67,5 +324,7 @@ class AsyncRedisClient:
         :rtype: None
         """
         if self._redis:
-            await self._redis.close()
+            await self._redis.aclose()
+            await self._redis.connection_pool.disconnect()
             self._redis = None
+            self._scripts = {}
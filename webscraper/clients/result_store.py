@@ -0,0 +1,488 @@
+import abc
+import asyncio
+import hashlib
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+from webscraper.models.snapshot_dto import SnapshotDTO
+
+from webscraper.exceptions import InvalidParameterException
+
+from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
+
+
+class ResultStore(abc.ABC):
+    """
+    Durable store of the COMPLETED scrape results, keeping a version of each result
+    every time its content changes.
+    """
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Creates the result store configured by the application settings.
+
+        :param webscraper.config.Settings settings: Application settings
+        :return: The result store, None if it is disabled
+        :rtype: ResultStore | None
+        """
+        if settings.result_store == "sqlite":
+            return SQLiteResultStore(
+                settings.result_store_path,
+                batch_size=settings.result_store_batch_size,
+                flush_interval=settings.result_store_flush_interval,
+                max_pending=settings.result_store_max_pending,
+            )
+        return None
+
+    @staticmethod
+    def content_hash(data):
+        """
+        :param dict data: The scraped data
+        :return: SHA-256 of the canonical JSON of the data
+        :rtype: str
+        """
+        return hashlib.sha256(
+            orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+
+    @abc.abstractmethod
+    async def save(self, cnpj, data, scraped_at=None):
+        """
+        Stores a result. It may be written later, in a batch.
+
+        :param str cnpj: The CNPJ number
+        :param dict data: The scraped data
+        :param float scraped_at: Unix timestamp of the scrape. Defaults to now
+        :rtype: None
+        """
+
+    @abc.abstractmethod
+    async def latest(self, cnpj):
+        """
+        :param str cnpj: The CNPJ number
+        :return: The last version of the result of the CNPJ, None if it was never stored
+        :rtype: webscraper.models.snapshot_dto.SnapshotDTO | None
+        """
+
+    @abc.abstractmethod
+    async def latest_many(self, cnpjs):
+        """
+        :param list[str] cnpjs: The CNPJ numbers
+        :return: Dictionary of CNPJ to the last version of its result, without the CNPJs never stored
+        :rtype: dict[str, webscraper.models.snapshot_dto.SnapshotDTO]
+        """
+
+    @abc.abstractmethod
+    async def history(self, cnpj, since=None, limit=100):
+        """
+        :param str cnpj: The CNPJ number
+        :param float since: Only the versions seen at or after this Unix timestamp. Defaults to all
+        :param int limit: Maximum number of versions, the most recent first. Defaults to 100
+        :return: The versions of the result of the CNPJ
+        :rtype: list[webscraper.models.snapshot_dto.SnapshotDTO]
+        """
+
+    @abc.abstractmethod
+    def iter_latest(self, prefix="", since=None, until=None, batch_size=1000):
+        """
+        Iterates over the last version of every stored result, by CNPJ, a page at a time.
+
+        :param str prefix: Only the CNPJs starting with it. Defaults to all
+        :param float since: Only the results last seen at or after this Unix timestamp
+        :param float until: Only the results last seen before this Unix timestamp
+        :param int batch_size: Results read per page. Defaults to 1000
+        :return: Async iterator of the pages of results
+        :rtype: collections.abc.AsyncIterator[list[webscraper.models.snapshot_dto.SnapshotDTO]]
+        """
+
+    @abc.abstractmethod
+    async def close(self):
+        """
+        Writes the pending results and releases the store.
+
+        :rtype: None
+        """
+
+
+class SQLiteResultStore(ResultStore):
+    """
+    Result store backed by a SQLite database in WAL mode, shared by the processes of a host.
+
+    Results are buffered and written by a background task in a single transaction per batch.
+    A result whose content hash is the same as the last version of its CNPJ only moves the
+    'last_seen' of that version, so unchanged results take no extra space. SQLite calls run
+    in a dedicated thread to keep the event loop free.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS result_snapshots (
+            cnpj TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (cnpj, version)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS result_snapshots_last_seen
+        ON result_snapshots (last_seen)
+        """,
+    )
+    SELECT_COLUMNS = "cnpj, version, content_hash, first_seen, last_seen, data"
+    # Keeps the IN lists below the SQLite limit of bound parameters
+    MAX_QUERY_PARAMS = 500
+
+    def __init__(
+        self,
+        path,
+        batch_size=100,
+        flush_interval=1,
+        busy_timeout=5,
+        max_pending=10000,
+        close_timeout=10,
+    ):
+        """
+        :param str path: Path of the database file, created if it does not exist
+        :param int batch_size: Results written in a single transaction. Defaults to 100
+        :param float flush_interval: Maximum seconds a result waits to be written. Defaults to 1
+        :param float busy_timeout: Seconds to wait for the lock of another process. Defaults to 5
+        :param int max_pending: Results kept in memory while the writes fail, the oldest ones
+        are dropped beyond it. Defaults to 10000
+        :param float close_timeout: Maximum seconds closing the store waits for the pending results
+        to be written. Defaults to 10
+        :raises webscraper.exceptions.InvalidParameterException: If batch_size, flush_interval or
+        max_pending are not positive
+        :rtype: None
+        """
+        if batch_size < 1 or flush_interval <= 0 or max_pending < 1:
+            raise InvalidParameterException(
+                "'batch_size', 'flush_interval' and 'max_pending' must be greater than 0"
+            )
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.busy_timeout = busy_timeout
+        self.max_pending = max_pending
+        self.close_timeout = close_timeout
+
+        self._connection = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="result-store"
+        )
+        self._pending = []
+        self._full = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._flush_task = None
+        self.logger = Log.get_logger(__name__)
+
+    async def _run(self, function, *args):
+        """
+        Runs a blocking function in the thread of the store, connecting first if needed.
+
+        :param callable function: Function receiving the connection and 'args'
+        :return: The result of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, function, args)
+
+    def _call(self, function, args):
+        """
+        :param callable function: Function receiving the connection and 'args'
+        :param tuple args: Other arguments of the function
+        :return: The result of the function
+        """
+        if self._connection is None:
+            self._connection = self._connect()
+        return function(self._connection, *args)
+
+    def _connect(self):
+        """
+        :return: A connection to the database, with the schema created
+        :rtype: sqlite3.Connection
+        """
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+        self.logger.info(f"Result store opened at {self.path}")
+        return connection
+
+    async def save(self, cnpj, data, scraped_at=None):
+        self._pending.append((cnpj, data, scraped_at or time.time()))
+        if self._closing.is_set():
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_forever())
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def _flush_forever(self):
+        """
+        Writes the pending results every 'flush_interval' seconds, or as soon as a batch is full.
+        Returns once the store is closing and all the pending results were written.
+
+        :rtype: None
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if await self.flush():
+                if self._closing.is_set():
+                    return
+            else:
+                # Backs off instead of retrying on every save while the writes fail
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        """
+        Writes the pending results, one transaction per batch.
+        A batch that can not be written is put back to be retried on the next flush, while no
+        more than 'max_pending' results are pending. The oldest ones are dropped beyond it.
+
+        :return: True if all the pending results were written
+        :rtype: bool
+        """
+        self._full.clear()
+        while self._pending:
+            batch = self._pending[: self.batch_size]
+            del self._pending[: len(batch)]
+            rows = [
+                (cnpj, self.content_hash(data), orjson.dumps(data), scraped_at)
+                for cnpj, data, scraped_at in batch
+            ]
+            try:
+                with Metrics.RESULT_STORE_FLUSH_SECONDS.time():
+                    inserted = await self._run(self._write, rows)
+            except asyncio.CancelledError:
+                # Kept pending so a flush cancelled by close is accounted as not written
+                self._pending[:0] = batch
+                raise
+            except Exception as e:
+                Metrics.RESULT_STORE_WRITES_TOTAL.labels(outcome="error").inc(len(rows))
+                self.logger.error(
+                    f"Failed to write {len(rows)} result(s), retrying: {e}"
+                )
+                self._pending[:0] = batch
+                self._drop_overflow()
+                return False
+            Metrics.RESULT_STORE_WRITES_TOTAL.labels(outcome="new_version").inc(
+                inserted
+            )
+            Metrics.RESULT_STORE_WRITES_TOTAL.labels(outcome="unchanged").inc(
+                len(rows) - inserted
+            )
+        return True
+
+    def _drop_overflow(self):
+        """
+        Drops the oldest pending results beyond 'max_pending'.
+
+        :rtype: None
+        """
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            Metrics.RESULT_STORE_WRITES_TOTAL.labels(outcome="dropped").inc(overflow)
+            self.logger.error(
+                f"Dropped {overflow} result(s) that could not be written to the store"
+            )
+
+    @staticmethod
+    def _write(connection, rows):
+        """
+        :param sqlite3.Connection connection: Connection to the database
+        :param list[tuple] rows: (cnpj, content_hash, data, scraped_at) of each result
+        :return: Number of new versions written
+        :rtype: int
+        """
+        inserted = 0
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for cnpj, content_hash, data, scraped_at in rows:
+                last = connection.execute(
+                    "SELECT version, content_hash FROM result_snapshots "
+                    "WHERE cnpj = ? ORDER BY version DESC LIMIT 1",
+                    (cnpj,),
+                ).fetchone()
+                if last and last[1] == content_hash:
+                    connection.execute(
+                        "UPDATE result_snapshots SET last_seen = max(last_seen, ?) "
+                        "WHERE cnpj = ? AND version = ?",
+                        (scraped_at, cnpj, last[0]),
+                    )
+                    continue
+                connection.execute(
+                    "INSERT INTO result_snapshots "
+                    "(cnpj, version, content_hash, first_seen, last_seen, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        cnpj,
+                        last[0] + 1 if last else 1,
+                        content_hash,
+                        scraped_at,
+                        scraped_at,
+                        data,
+                    ),
+                )
+                inserted += 1
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return inserted
+
+    @classmethod
+    def _to_snapshot(cls, row):
+        """
+        :param tuple row: Row selected with SELECT_COLUMNS
+        :rtype: webscraper.models.snapshot_dto.SnapshotDTO
+        """
+        cnpj, version, content_hash, first_seen, last_seen, data = row
+        return SnapshotDTO(
+            cnpj=cnpj,
+            version=version,
+            content_hash=content_hash,
+            first_seen=first_seen,
+            last_seen=last_seen,
+            data=orjson.loads(data),
+        )
+
+    async def latest(self, cnpj):
+        return (await self.latest_many([cnpj])).get(cnpj)
+
+    async def latest_many(self, cnpjs):
+        result = {}
+        cnpjs = list(cnpjs)
+        for start in range(0, len(cnpjs), self.MAX_QUERY_PARAMS):
+            end = start + self.MAX_QUERY_PARAMS
+            chunk = cnpjs[start:end]
+            rows = await self._run(self._select_latest, chunk)
+            result.update((row[0], self._to_snapshot(row)) for row in rows)
+        return result
+
+    @classmethod
+    def _select_latest(cls, connection, cnpjs):
+        """
+        :param sqlite3.Connection connection: Connection to the database
+        :param list[str] cnpjs: The CNPJ numbers
+        :return: The rows of the last version of each CNPJ
+        :rtype: list[tuple]
+        """
+        placeholders = ", ".join("?" * len(cnpjs))
+        return connection.execute(
+            f"SELECT {cls.SELECT_COLUMNS} FROM result_snapshots AS snapshot "
+            f"WHERE cnpj IN ({placeholders}) AND version = ("
+            "SELECT MAX(version) FROM result_snapshots WHERE cnpj = snapshot.cnpj)",
+            cnpjs,
+        ).fetchall()
+
+    async def history(self, cnpj, since=None, limit=100):
+        rows = await self._run(self._select_history, cnpj, since or 0, limit)
+        return [self._to_snapshot(row) for row in rows]
+
+    @classmethod
+    def _select_history(cls, connection, cnpj, since, limit):
+        """
+        :param sqlite3.Connection connection: Connection to the database
+        :param str cnpj: The CNPJ number
+        :param float since: Minimum 'last_seen' of the versions
+        :param int limit: Maximum number of versions
+        :return: The rows of the versions, the most recent first
+        :rtype: list[tuple]
+        """
+        return connection.execute(
+            f"SELECT {cls.SELECT_COLUMNS} FROM result_snapshots "
+            "WHERE cnpj = ? AND last_seen >= ? ORDER BY version DESC LIMIT ?",
+            (cnpj, since, limit),
+        ).fetchall()
+
+    async def iter_latest(self, prefix="", since=None, until=None, batch_size=1000):
+        after = ""
+        while True:
+            rows = await self._run(
+                self._select_latest_page, after, prefix, since, until, batch_size
+            )
+            if not rows:
+                return
+            yield [self._to_snapshot(row) for row in rows]
+            after = rows[-1][0]
+
+    @classmethod
+    def _select_latest_page(cls, connection, after, prefix, since, until, limit):
+        """
+        :param sqlite3.Connection connection: Connection to the database
+        :param str after: Only the CNPJs after this one, for keyset pagination
+        :param str prefix: Only the CNPJs starting with it
+        :param float since: Minimum 'last_seen' of the results, None for no minimum
+        :param float until: Maximum 'last_seen' of the results (excluded), None for no maximum
+        :param int limit: Maximum number of rows
+        :return: The rows of the last version of each CNPJ, ordered by CNPJ
+        :rtype: list[tuple]
+        """
+        # CNPJs only have digits, which sort before '~'
+        return connection.execute(
+            f"SELECT {cls.SELECT_COLUMNS} FROM result_snapshots AS snapshot "
+            "WHERE cnpj > ? AND cnpj >= ? AND cnpj < ? "
+            "AND version = (SELECT MAX(version) FROM result_snapshots WHERE cnpj = snapshot.cnpj) "
+            "AND last_seen >= ? AND last_seen < ? ORDER BY cnpj LIMIT ?",
+            (
+                after,
+                prefix,
+                f"{prefix}~",
+                since if since is not None else float("-inf"),
+                until if until is not None else float("inf"),
+                limit,
+            ),
+        ).fetchall()
+
+    async def close(self):
+        """
+        Waits up to 'close_timeout' seconds for the flush task to write the pending results,
+        including a flush already running, then closes the database.
+
+        :rtype: None
+        """
+        self._closing.set()
+        if self._pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_forever())
+        if self._flush_task:
+            self._full.set()
+            try:
+                await asyncio.wait_for(self._flush_task, self.close_timeout)
+            except asyncio.TimeoutError:
+                self.logger.error(
+                    f"Result store not flushed after {self.close_timeout} seconds"
+                )
+            except Exception as e:
+                self.logger.error(f"Failed to flush the result store: {e}")
+            self._flush_task = None
+        if self._pending:
+            Metrics.RESULT_STORE_WRITES_TOTAL.labels(outcome="dropped").inc(
+                len(self._pending)
+            )
+            self.logger.error(
+                f"Dropped {len(self._pending)} result(s) not written before closing the store"
+            )
+            self._pending.clear()
+
+        if self._connection is not None:
+            await self._run(lambda connection: connection.close())
+            self._connection = None
+        self._executor.shutdown(wait=False)
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -7,21 +9,251 @@ class Settings(BaseSettings):
     It is created by getting all env variables declared in a .env file.
 
     :param scrape_url: URL of the page to be scraped
+    :param scrape_engine: Engine used to scrape, "playwright" or "http". Defaults to "playwright"
+    :param scrape_http_fallback: Falls back to Playwright when the "http" engine fails. Defaults to True
+    :param scrape_http_timeout: Timeout in seconds of each request of the "http" engine. Defaults to 30
+    :param scrape_http_max_connections: Size of the "http" engine connection pool. Defaults to 20
+    :param scrape_claim_ttl: Seconds a queued job blocks duplicated jobs for the same CNPJ. Defaults to 600
+    :param cache_ttl_in_progress: Seconds an IN_PROGRESS job is kept in the cache. Defaults to 600
+    :param cache_ttl_failed: Seconds a FAILED job is kept in the cache, blocking new jobs for the
+    same CNPJ. Defaults to 300
+    :param cache_ttl_completed: Seconds a COMPLETED job is fresh. Defaults to 3600
+    :param cache_stale_ttl: Seconds a COMPLETED job is still served after it is no longer fresh,
+    while it is refreshed in the background. Defaults to 86400
+    :param result_store: Durable store of the COMPLETED results, "sqlite" or "none". Defaults to "none"
+    :param result_store_path: Path of the SQLite database of the result store, on a volume shared by the
+    API and the workers of the host. Defaults to "results.db"
+    :param result_store_batch_size: Results written to the store in a single transaction. Defaults to 100
+    :param result_store_flush_interval: Maximum seconds a result waits to be written to the store.
+    Defaults to 1
+    :param result_store_max_pending: Results kept in memory to be retried while the writes to the store
+    fail. The oldest ones are dropped beyond it. Defaults to 10000
     :param rabbitmq_url: URL of the RabbitMQ server
     :param rabbitmq_queue: Name of the RabbitMQ queue for publishing/consuming messages
+    :param rabbitmq_publisher_confirms: Waits for RabbitMQ to confirm published messages. Defaults to True
+    :param batch_max_size: Maximum number of CNPJs in a single batch request. Defaults to 5000
+    :param results_max_wait: Maximum seconds a GET /results long-poll waits for the job. Defaults to 30
+    :param results_stream_keepalive: Seconds between keepalive comments of the results stream.
+    Defaults to 15
+    :param results_local_cache_size: Maximum number of terminal results cached in each API process,
+    0 disables the cache. Defaults to 10000
+    :param results_local_cache_ttl: Seconds a result is kept in the API process cache. Defaults to 60
+    :param export_batch_size: Results read and written per chunk by the bulk exports. Defaults to 1000
+    :param worker_concurrency: Number of scrape jobs processed at the same time by a worker. Defaults to 1
+    :param worker_prefetch_multiplier: Messages buffered per lane by a worker, as a multiple of its
+    concurrency. A larger buffer spreads the jobs across more tenants. Defaults to 2
+    :param worker_bulk_prefetch: Minimum number of messages of the "bulk" lane buffered by a worker.
+    Tenants are only balanced among the buffered messages, so this is the window in which a
+    backfill of one tenant can not hold back the jobs of the others. Defaults to 200
+    :param worker_interactive_weight: Share of the worker slots given to the "interactive" lane when
+    both lanes have jobs waiting. Defaults to 8
+    :param worker_bulk_weight: Share of the worker slots given to the "bulk" lane when both lanes
+    have jobs waiting. Defaults to 1
+    :param worker_drain_timeout: Seconds a stopping worker waits for its in-flight jobs before
+    cancelling and requeueing them. Keep it below the stop grace period of the container. Defaults to 60
+    :param worker_stats_interval: Seconds between two refreshes of the queue depth and worker
+    utilization metrics. Defaults to 15
+    :param callback_timeout: Timeout in seconds of the result callback requests. Defaults to 10
+    :param callback_allowed_hosts: Hosts, and their subdomains, the result callbacks may be sent to,
+    as a JSON list. Defaults to any host
+    :param callback_allow_private_networks: Allows the result callbacks to loopback, private, link-local
+    and reserved addresses, which are refused by default so the API clients can not reach the
+    internal services. Defaults to False
+    :param supervisor_processes: Worker processes started by run_supervisor, 0 uses the number of
+    CPUs. Defaults to 0
+    :param supervisor_restart_base_delay: Seconds before restarting a crashed worker process, doubled
+    on each crash in a row. Defaults to 1
+    :param supervisor_restart_max_delay: Upper bound of the restart delay. A process that ran for
+    longer than it resets the backoff. Defaults to 60
+    :param supervisor_heartbeat_timeout: Seconds without a heartbeat after which a worker process is
+    considered stuck, killed and restarted. Defaults to 120
+    :param retry_max_attempts: Attempts of a job failed by the target site before it is
+    dead-lettered, 1 disables retries. Defaults to 3
+    :param retry_base_delay: Seconds before the first retry, doubled on each retry. Defaults to 5
+    :param retry_max_delay: Upper bound of the retry delay in seconds. Defaults to 300
+    :param upstream_rate_limit: Enables the rate limiter and circuit breaker shared by all the workers
+    toward the target site. Defaults to False
+    :param upstream_rate_initial: Requests/s allowed toward the target site before any adaptation.
+    Defaults to 5
+    :param upstream_rate_min: Lower bound of the adaptive rate in requests/s. Defaults to 0.2
+    :param upstream_rate_max: Upper bound of the adaptive rate in requests/s. Defaults to 50
+    :param upstream_rate_burst: Requests allowed at once after an idle period. Defaults to 5
+    :param upstream_rate_increase: Requests/s added to the rate every second while scrapes succeed.
+    Defaults to 0.5
+    :param upstream_rate_decrease: Factor applied to the rate on timeouts and upstream errors.
+    Defaults to 0.5
+    :param upstream_circuit_threshold: Upstream failures in a row that stop the workers from consuming.
+    Defaults to 5
+    :param upstream_circuit_open_seconds: Seconds the workers stop consuming before a probe job.
+    Defaults to 30
     :param redis_url: URL of the Redis server
+    :param redis_max_connections: Maximum number of connections in the Redis pool. Defaults to 50
+    :param redis_pool_timeout: Seconds to wait for a free Redis connection. Defaults to 5
+    :param redis_socket_timeout: Seconds to wait for a Redis reply. Defaults to None (no timeout)
+    :param redis_socket_connect_timeout: Seconds to wait while connecting to Redis. Defaults to 5
+    :param redis_socket_keepalive: Enables TCP keepalive on Redis connections. Defaults to True
+    :param redis_health_check_interval: Seconds before an idle Redis connection is checked. Defaults to 30
+    :param redis_codec: Serialization of the Redis values, "json", "orjson" or "msgpack". Defaults to "json"
+    :param redis_compression: Compression of large Redis values, None or "zstd". Defaults to None
+    :param redis_compress_min_size: Values smaller than this many bytes are not compressed. Defaults to 1024
+    :param browser_pool_size: Number of long-lived browsers kept by each worker. Defaults to 1
+    :param browser_max_pages: Maximum number of pages open at once in a worker. Defaults to 10
+    :param browser_max_jobs: Number of jobs after which a browser is recycled. Defaults to 100
+    :param browser_headless: Launch browsers in headless mode. Defaults to True
+    :param browser_health_check_interval: Seconds between browser pool health checks. Defaults to 30
+    :param browser_block_resources: Resource types aborted by the browser pages, as a JSON list.
+    Defaults to ["image", "media", "font", "stylesheet"]
+    :param browser_block_third_party: Aborts the requests to domains other than the target site.
+    Defaults to True
+    :param browser_allowed_domains: Other domains allowed when blocking third parties, as a JSON list.
+    Defaults to []
+    :param browser_wait_until: Event page.goto waits for, "commit", "domcontentloaded", "load" or
+    "networkidle". Defaults to "domcontentloaded"
+    :param browser_reuse_form_page: Keeps the form page open and goes back to it after each job,
+    instead of opening a new context per job. Defaults to False
+    :param browser_reuse_max_jobs: Number of jobs after which a reused page is closed. Defaults to 50
+    :param refresh_enabled: Makes the workers track the changes of the watched CNPJs. Defaults to False
+    :param refresh_rate: Jobs/s fed to the "bulk" lane by the refresh scheduler. Defaults to 10
+    :param refresh_default_interval: Seconds between two refreshes of a CNPJ without change statistics
+    yet. Defaults to 604800 (7 days)
+    :param refresh_min_interval: Lower bound of the refresh interval of a CNPJ. Defaults to 86400 (1 day)
+    :param refresh_max_interval: Upper bound of the refresh interval of a CNPJ. Defaults to 7776000 (90 days)
+    :param refresh_change_probability: A CNPJ is refreshed when the estimated probability that it changed
+    since its last scrape reaches this value. Defaults to 0.5
+    :param refresh_max_queue_depth: The refresh scheduler pauses while the "bulk" queue has this many
+    ready messages, 0 disables the check. Defaults to 10000
+    :param refresh_ignored_fields: Fields left out of the change detection, such as the date of the
+    query. Defaults to []
+    :param refresh_changes_max_len: Approximate number of change reports kept. Defaults to 100000
+    :param ingest_batch_size: CNPJs checked and published per batch by the bulk ingestion. Defaults to 1000
+    :param ingest_concurrency: Batches published at the same time by the bulk ingestion. Defaults to 4
+    :param ingest_bloom_capacity: Unique CNPJs the Bloom filter of the bulk ingestion is sized for.
+    Defaults to 10000000
+    :param ingest_bloom_error_rate: Share of new CNPJs wrongly dropped as repeated by the Bloom filter
+    at full capacity. Defaults to 0.00001
+    :param admin_token: Token expected in the X-Admin-Token header of the /admin endpoints,
+    which are disabled while it is not set. Defaults to None
+    :param metrics_port: Port of the worker Prometheus metrics server, 0 disables it. Defaults to 9100
     :param log_level: Logging level for the application. Defaults to "INFO"
     """
 
     # Scrape URL
     scrape_url: str
+    scrape_engine: Literal["playwright", "http"] = "playwright"
+    scrape_http_fallback: bool = True
+    scrape_http_timeout: float = 30
+    scrape_http_max_connections: int = 20
+    scrape_claim_ttl: int = 600
+
+    # Cache
+    cache_ttl_in_progress: int = 600
+    cache_ttl_failed: int = 300
+    cache_ttl_completed: int = 3600
+    cache_stale_ttl: int = 86400
+
+    # Result store
+    result_store: Literal["none", "sqlite"] = "none"
+    result_store_path: str = "results.db"
+    result_store_batch_size: int = 100
+    result_store_flush_interval: float = 1
+    result_store_max_pending: int = 10000
 
     # RabbitMQ
     rabbitmq_url: str
     rabbitmq_queue: str
+    rabbitmq_publisher_confirms: bool = True
+
+    # API
+    batch_max_size: int = 5000
+    results_max_wait: float = 30
+    results_stream_keepalive: float = 15
+    results_local_cache_size: int = 10000
+    results_local_cache_ttl: float = 60
+    export_batch_size: int = 1000
+
+    # Worker
+    worker_concurrency: int = 1
+    worker_prefetch_multiplier: int = 2
+    worker_bulk_prefetch: int = 200
+    worker_interactive_weight: int = 8
+    worker_bulk_weight: int = 1
+    worker_drain_timeout: float = 60
+    worker_stats_interval: float = 15
+    callback_timeout: float = 10
+    callback_allowed_hosts: list[str] = []
+    callback_allow_private_networks: bool = False
+
+    # Supervisor
+    supervisor_processes: int = 0
+    supervisor_restart_base_delay: float = 1
+    supervisor_restart_max_delay: float = 60
+    supervisor_heartbeat_timeout: float = 120
+
+    # Retries
+    retry_max_attempts: int = 3
+    retry_base_delay: float = 5
+    retry_max_delay: float = 300
+
+    # Upstream rate limit and circuit breaker
+    upstream_rate_limit: bool = False
+    upstream_rate_initial: float = 5
+    upstream_rate_min: float = 0.2
+    upstream_rate_max: float = 50
+    upstream_rate_burst: int = 5
+    upstream_rate_increase: float = 0.5
+    upstream_rate_decrease: float = 0.5
+    upstream_circuit_threshold: int = 5
+    upstream_circuit_open_seconds: float = 30
 
     # Redis
     redis_url: str
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 5
+    redis_socket_timeout: Optional[float] = None
+    redis_socket_connect_timeout: float = 5
+    redis_socket_keepalive: bool = True
+    redis_health_check_interval: int = 30
+    redis_codec: Literal["json", "orjson", "msgpack"] = "json"
+    redis_compression: Optional[Literal["zstd"]] = None
+    redis_compress_min_size: int = 1024
+
+    # Browser pool
+    browser_pool_size: int = 1
+    browser_max_pages: int = 10
+    browser_max_jobs: int = 100
+    browser_headless: bool = True
+    browser_health_check_interval: int = 30
+    browser_block_resources: list[str] = ["image", "media", "font", "stylesheet"]
+    browser_block_third_party: bool = True
+    browser_allowed_domains: list[str] = []
+    browser_wait_until: Literal["commit", "domcontentloaded", "load", "networkidle"] = (
+        "domcontentloaded"
+    )
+    browser_reuse_form_page: bool = False
+    browser_reuse_max_jobs: int = 50
+
+    # Refresh scheduler
+    refresh_enabled: bool = False
+    refresh_rate: float = 10
+    refresh_default_interval: float = 604800
+    refresh_min_interval: float = 86400
+    refresh_max_interval: float = 7776000
+    refresh_change_probability: float = 0.5
+    refresh_max_queue_depth: int = 10000
+    refresh_ignored_fields: list[str] = []
+    refresh_changes_max_len: int = 100000
+
+    # Bulk ingestion
+    ingest_batch_size: int = 1000
+    ingest_concurrency: int = 4
+    ingest_bloom_capacity: int = 10000000
+    ingest_bloom_error_rate: float = 0.00001
+
+    # Admin
+    admin_token: Optional[str] = None
+
+    # Metrics
+    metrics_port: int = 9100
 
     # Logging
     log_level: str = "INFO"
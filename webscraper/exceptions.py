@@ -4,3 +4,15 @@ class InvalidParameterException(Exception):
 
 class InvalidRabbitMQMessageException(Exception):
     """Exception raised for invalid messages in RabbitMQ operations."""
+
+
+class ScrapeEngineException(Exception):
+    """Exception raised when a scrape engine can not extract the result document."""
+
+
+class CodecException(Exception):
+    """Exception raised when stored data can not be encoded or decoded."""
+
+
+class ForbiddenCallbackException(Exception):
+    """Exception raised when a callback URL points to a host the callbacks may not be sent to."""
@@ -0,0 +1,97 @@
+import hashlib
+import math
+
+from webscraper.exceptions import InvalidParameterException
+
+
+class BloomFilter(object):
+    """
+    Compact, probabilistic set of strings. An item that was added is always found, an item
+    that was not is wrongly found with a probability of about 'error_rate' while the filter
+    holds at most 'capacity' items.
+
+    The filter is blocked: all the bits of an item are in the same 512 bits block, picked and
+    filled from a single hash, so an item costs one hash and one block read instead of a memory
+    access per bit. In exchange the false positive rate is somewhat higher than in a classic
+    filter of the same size, about 3 times 'error_rate' at 1e-4.
+    """
+
+    BLOCK_BITS = 512
+    BLOCK_BYTES = BLOCK_BITS // 8
+    # A 256 bits digest picks the block with 64 bits and each bit in it with 9 bits of the rest
+    MAX_HASHES = (256 - 64) // 9
+
+    def __init__(self, capacity, error_rate=1e-5):
+        """
+        :param int capacity: Number of items the filter is sized for
+        :param float error_rate: False positive rate at full capacity. Defaults to 1e-5
+        :raises webscraper.exceptions.InvalidParameterException: If capacity is lower than 1
+        or error_rate is not between 0 and 1
+        :rtype: None
+        """
+        if capacity < 1:
+            raise InvalidParameterException("'capacity' must be greater than 0")
+        if not 0 < error_rate < 1:
+            raise InvalidParameterException("'error_rate' must be between 0 and 1")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        size = -capacity * math.log(error_rate) / math.log(2) ** 2
+        self.blocks = math.ceil(size / self.BLOCK_BITS)
+        self.hashes = min(max(1, round(size / capacity * math.log(2))), self.MAX_HASHES)
+        self._bits = bytearray(self.blocks * self.BLOCK_BYTES)
+        self._hash_range = range(self.hashes)
+        self._count = 0
+
+    def __len__(self):
+        """
+        :return: Number of items added, not counting the ones that were already found
+        :rtype: int
+        """
+        return self._count
+
+    def __contains__(self, item):
+        start, mask = self._locate(item)
+        end = start + self.BLOCK_BYTES
+        return int.from_bytes(self._bits[start:end], "little") & mask == mask
+
+    @property
+    def nbytes(self):
+        """
+        :return: Memory used by the bits of the filter
+        :rtype: int
+        """
+        return len(self._bits)
+
+    def add(self, item):
+        """
+        Adds an item to the filter.
+
+        :param str item: The item
+        :return: True if the item was not in the filter yet, False if it was probably added before
+        :rtype: bool
+        """
+        start, mask = self._locate(item)
+        end = start + self.BLOCK_BYTES
+        block = int.from_bytes(self._bits[start:end], "little")
+        if block & mask == mask:
+            return False
+        self._bits[start:end] = (block | mask).to_bytes(self.BLOCK_BYTES, "little")
+        self._count += 1
+        return True
+
+    def _locate(self, item):
+        """
+        :param str item: The item
+        :return: Offset of the block of the item and the mask of its bits in the block
+        :rtype: tuple[int, int]
+        """
+        digest = hashlib.blake2b(item.encode(), digest_size=32).digest()
+        value = int.from_bytes(digest, "little")
+        start = (value & 0xFFFFFFFFFFFFFFFF) % self.blocks * self.BLOCK_BYTES
+        value >>= 64
+        mask = 0
+        for _ in self._hash_range:
+            mask |= 1 << (value & 511)
+            value >>= 9
+        return start, mask
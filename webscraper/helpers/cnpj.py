@@ -0,0 +1,67 @@
+import re
+
+CNPJ_LENGTH = 14
+
+_NON_DIGITS = re.compile(r"\D")
+# Sum of the weights of each check digit times the ASCII code of "0"
+_FIRST_OFFSET = 48 * sum((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+_SECOND_OFFSET = 48 * sum((6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+
+
+def sanitize_cnpj(value):
+    """
+    Removes all non-digit characters from a CNPJ, the same rule used by ScrapeJobMessageDTO.
+
+    :param str value: The CNPJ, formatted or not
+    :return: The 14 digits of the CNPJ, or None if it does not have 14 digits
+    :rtype: str | None
+    """
+    # Unformatted and usually formatted CNPJs do not go through the regex
+    if len(value) != CNPJ_LENGTH or not value.isdecimal():
+        value = value.replace(".", "").replace("/", "").replace("-", "")
+        if len(value) != CNPJ_LENGTH or not value.isdecimal():
+            value = _NON_DIGITS.sub("", value)
+    return value if len(value) == CNPJ_LENGTH else None
+
+
+def has_valid_check_digits(cnpj):
+    """
+    :param str cnpj: The 14 digits of a CNPJ
+    :return: True if the two last digits are the check digits of the first twelve. CNPJs made
+    of a single repeated digit are rejected, even though their check digits match
+    :rtype: bool
+    """
+    if (
+        len(cnpj) != CNPJ_LENGTH
+        or not (cnpj.isascii() and cnpj.isdigit())
+        or cnpj == cnpj[0] * CNPJ_LENGTH
+    ):
+        return False
+
+    # Module 11 over the ASCII codes, unrolled since it runs for every request and message
+    d0, d1, d2, d3, d4, d5, d6, d7, d8, d9, d10, d11, d12, d13 = cnpj.encode()
+    first = (
+        5 * d0 + 4 * d1 + 3 * d2 + 2 * d3 + 9 * d4 + 8 * d5
+        + 7 * d6 + 6 * d7 + 5 * d8 + 4 * d9 + 3 * d10 + 2 * d11
+        - _FIRST_OFFSET
+    ) % 11  # fmt: skip
+    second = (
+        6 * d0 + 5 * d1 + 4 * d2 + 3 * d3 + 2 * d4 + 9 * d5 + 8 * d6
+        + 7 * d7 + 6 * d8 + 5 * d9 + 4 * d10 + 3 * d11 + 2 * d12
+        - _SECOND_OFFSET
+    ) % 11  # fmt: skip
+    return d12 == (48 if first < 2 else 59 - first) and d13 == (
+        48 if second < 2 else 59 - second
+    )
+
+
+def normalize_cnpj(value):
+    """
+    Sanitizes a CNPJ and validates its check digits.
+
+    :param str value: The CNPJ, formatted or not
+    :return: The 14 digits of the CNPJ, or None if it is not valid
+    :rtype: str | None
+    """
+    cnpj = sanitize_cnpj(value)
+    return cnpj if cnpj and has_valid_check_digits(cnpj) else None
@@ -0,0 +1,119 @@
+import json
+
+import msgpack
+import orjson
+import zstandard
+
+from webscraper.exceptions import CodecException, InvalidParameterException
+
+
+class Codec(object):
+    """
+    Serializes the objects stored in Redis.
+
+    Entries are written with a small header holding a format version, the serialization
+    format and whether the payload is zstd compressed. Entries without the header are
+    read as plain JSON, so data written before the header was introduced stays readable.
+    The 'json' format writes plain JSON without a header.
+    """
+
+    # 0xff never starts a valid UTF-8 JSON document
+    MAGIC = b"\xffWS"
+    HEADER_SIZE = len(MAGIC) + 3
+    VERSION = 1
+    FORMATS = {"json": 0, "orjson": 1, "msgpack": 2}
+    COMPRESSIONS = (None, "zstd")
+    FLAG_ZSTD = 1
+
+    def __init__(self, name="json", compression=None, compress_min_size=1024):
+        """
+        :param str name: Serialization format, 'json', 'orjson' or 'msgpack'. Defaults to 'json'
+        :param str compression: Compression of large payloads, None or 'zstd'. Defaults to None
+        :param int compress_min_size: Payloads smaller than this many bytes are not compressed.
+        Defaults to 1024
+        :raises webscraper.exceptions.InvalidParameterException: If the format or compression is unknown
+        :rtype: None
+        """
+        if name not in self.FORMATS:
+            raise InvalidParameterException(f"Unknown codec '{name}'")
+        if compression not in self.COMPRESSIONS:
+            raise InvalidParameterException(f"Unknown compression '{compression}'")
+        if name == "json" and compression:
+            raise InvalidParameterException("The 'json' codec can not be compressed")
+
+        self.name = name
+        self.compression = compression
+        self.compress_min_size = compress_min_size
+        self._compressor = zstandard.ZstdCompressor() if compression else None
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    @staticmethod
+    def _serialize(format_id, value):
+        if format_id == Codec.FORMATS["orjson"]:
+            return orjson.dumps(value)
+        if format_id == Codec.FORMATS["msgpack"]:
+            return msgpack.packb(value)
+        return json.dumps(value).encode()
+
+    @staticmethod
+    def _deserialize(format_id, payload):
+        if format_id == Codec.FORMATS["orjson"]:
+            return orjson.loads(payload)
+        if format_id == Codec.FORMATS["msgpack"]:
+            return msgpack.unpackb(payload)
+        if format_id == Codec.FORMATS["json"]:
+            return json.loads(payload)
+        raise CodecException(f"Unknown codec format {format_id}")
+
+    def dumps(self, value):
+        """
+        :param value: JSON-serializable object
+        :return: The encoded object
+        :rtype: bytes
+        :raises webscraper.exceptions.CodecException: If the object can not be serialized
+        """
+        try:
+            payload = self._serialize(self.FORMATS[self.name], value)
+        except (TypeError, ValueError) as e:
+            raise CodecException(f"Failed to encode value: {e}")
+
+        if self.name == "json":
+            return payload
+
+        flags = 0
+        if self._compressor and len(payload) >= self.compress_min_size:
+            payload = self._compressor.compress(payload)
+            flags |= self.FLAG_ZSTD
+
+        header = self.MAGIC + bytes((self.VERSION, self.FORMATS[self.name], flags))
+        return header + payload
+
+    def loads(self, data):
+        """
+        Decodes an entry written by any codec, or a legacy plain JSON entry.
+
+        :param bytes data: The encoded object
+        :return: The decoded object
+        :raises webscraper.exceptions.CodecException: If the data can not be decoded
+        """
+        if isinstance(data, str):
+            data = data.encode()
+
+        try:
+            if not data.startswith(self.MAGIC):
+                return json.loads(data)
+
+            size = self.HEADER_SIZE
+            header, payload = data[:size], data[size:]
+            version, format_id, flags = header[-3:]
+            if version != self.VERSION:
+                raise CodecException(f"Unsupported codec version {version}")
+
+            if flags & self.FLAG_ZSTD:
+                payload = self._decompressor.decompress(payload)
+
+            return self._deserialize(format_id, payload)
+        except CodecException:
+            raise
+        except Exception as e:
+            raise CodecException(f"Failed to decode value: {e}")
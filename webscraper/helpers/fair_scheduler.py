@@ -0,0 +1,149 @@
+import asyncio
+from collections import OrderedDict, deque
+
+from webscraper.exceptions import InvalidParameterException
+
+
+class FairScheduler(object):
+    """
+    In-process scheduler of pending jobs across weighted lanes and tenants.
+
+    Lanes are picked with smooth weighted round-robin among the lanes that have pending
+    jobs, so an idle lane never holds back the others, and the tenants of a lane are
+    served round-robin. A paused lane keeps its jobs but is skipped until it is resumed.
+    Not thread-safe, meant to be used from a single event loop.
+    """
+
+    def __init__(self, weights):
+        """
+        :param dict[str, int] weights: Weight of each lane, e.g. {"interactive": 8, "bulk": 1}
+        :raises webscraper.exceptions.InvalidParameterException: If there are no lanes or a weight
+        is lower than 1
+        :rtype: None
+        """
+        if not weights or any(weight < 1 for weight in weights.values()):
+            raise InvalidParameterException(
+                "'weights' must have at least one lane and every weight must be greater than 0"
+            )
+
+        self.weights = dict(weights)
+        self._lanes = {lane: OrderedDict() for lane in self.weights}
+        self._current = {lane: 0 for lane in self.weights}
+        self._size = 0
+        self._paused = set()
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return self._size
+
+    def pending(self, lane):
+        """
+        :param str lane: Name of the lane
+        :return: Number of jobs waiting in the lane
+        :rtype: int
+        """
+        return sum(len(jobs) for jobs in self._lanes[lane].values())
+
+    def put(self, lane, tenant, item):
+        """
+        Adds a job to the end of the queue of its tenant in a lane.
+
+        :param str lane: Name of the lane
+        :param str tenant: Tenant that sent the job, None for anonymous jobs
+        :param item: The job
+        :raises webscraper.exceptions.InvalidParameterException: If the lane is unknown
+        :rtype: None
+        """
+        if lane not in self._lanes:
+            raise InvalidParameterException(f"Unknown lane '{lane}'")
+
+        self._lanes[lane].setdefault(tenant, deque()).append(item)
+        self._size += 1
+        self._ready.set()
+
+    async def get(self):
+        """
+        Waits for a job and removes the next one in the fair order.
+
+        :return: The next job
+        """
+        while not self._has_ready_lane():
+            self._ready.clear()
+            await self._ready.wait()
+
+        tenants = self._lanes[self._next_lane()]
+        tenant, jobs = tenants.popitem(last=False)
+        item = jobs.popleft()
+        if jobs:
+            tenants[tenant] = jobs
+
+        self._size -= 1
+        return item
+
+    def pause(self, lane):
+        """
+        Stops serving the jobs of a lane until resume() is called.
+
+        :param str lane: Name of the lane
+        :rtype: None
+        """
+        self._paused.add(lane)
+
+    def resume(self, lane):
+        """
+        :param str lane: Name of the lane
+        :rtype: None
+        """
+        self._paused.discard(lane)
+        self._ready.set()
+
+    def _has_ready_lane(self):
+        """
+        :return: True if a lane that is not paused has pending jobs
+        :rtype: bool
+        """
+        return any(
+            tenants for lane, tenants in self._lanes.items() if lane not in self._paused
+        )
+
+    def _next_lane(self):
+        """
+        Smooth weighted round-robin among the lanes with pending jobs that are not paused.
+
+        :return: Name of the lane to serve next
+        :rtype: str
+        """
+        ready = [
+            lane
+            for lane, tenants in self._lanes.items()
+            if tenants and lane not in self._paused
+        ]
+        total = 0
+        best = None
+        for lane in ready:
+            self._current[lane] += self.weights[lane]
+            total += self.weights[lane]
+            if best is None or self._current[lane] > self._current[best]:
+                best = lane
+
+        self._current[best] -= total
+        return best
+
+    def clear(self):
+        """
+        Drops all the pending jobs.
+
+        :return: The dropped jobs
+        :rtype: list
+        """
+        dropped = [
+            item
+            for tenants in self._lanes.values()
+            for jobs in tenants.values()
+            for item in jobs
+        ]
+        for tenants in self._lanes.values():
+            tenants.clear()
+        self._size = 0
+        self._paused.clear()
+        return dropped
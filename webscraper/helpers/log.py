@@ -15,17 +15,17 @@ class Log(object):
         Sets up the logger with the specified level and output options.
 
         :param logger_level: Logging level (e.g., logging.INFO, logging.DEBUG)
-        :param stdout_log: If True, logs will be printed to standard output
+        :param stdout_log: If True, logs will be printed to standard output, otherwise to the
+        standard error, e.g. when the standard output carries the data written by a script
         """
 
         root_logger = logging.getLogger()
         root_logger.setLevel(logger_level)
 
         if not root_logger.hasHandlers():
-            if stdout_log:
-                handler = logging.StreamHandler(sys.stdout)
-                handler.setLevel(logger_level)
-                handler.setFormatter(logging.Formatter(Log.LOG_FORMATTER))
+            handler = logging.StreamHandler(sys.stdout if stdout_log else sys.stderr)
+            handler.setLevel(logger_level)
+            handler.setFormatter(logging.Formatter(Log.LOG_FORMATTER))
             # TODO: Add file handler here if needed
 
             root_logger.addHandler(handler)
@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+
+from webscraper.exceptions import InvalidParameterException
+
+
+class TTLCache(object):
+    """
+    In-process, size-bounded LRU cache whose entries expire after a TTL.
+    Not thread-safe, meant to be used from a single event loop.
+    """
+
+    def __init__(self, max_size, ttl):
+        """
+        :param int max_size: Maximum number of entries, the least recently used is evicted first
+        :param float ttl: Seconds an entry is kept after being stored
+        :raises webscraper.exceptions.InvalidParameterException: If max_size or ttl are lower than 1
+        :rtype: None
+        """
+        if max_size < 1 or ttl <= 0:
+            raise InvalidParameterException(
+                "'max_size' and 'ttl' must be greater than 0"
+            )
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        """
+        :return: Ratio of lookups served from the cache, 0 if there were no lookups
+        :rtype: float
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        """
+        :param key: Key of the entry
+        :return: The cached value, or None if missing or expired
+        """
+        entry = self._entries.get(key)
+
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        """
+        :param key: Key of the entry
+        :param value: Value to cache
+        :rtype: None
+        """
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        :param key: Key of the entry to remove
+        :rtype: None
+        """
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes all the entries.
+
+        :rtype: None
+        """
+        self._entries.clear()
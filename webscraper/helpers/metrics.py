@@ -0,0 +1,193 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+
+class Metrics(object):
+    """
+    Prometheus metrics of the API and the workers.
+
+    The gauges declare how they are aggregated across the worker processes of the supervisor,
+    which runs prometheus_client in multiprocess mode. Outside of it the modes are ignored.
+    """
+
+    STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    QUEUE_WAIT_SECONDS = Histogram(
+        "webscraper_queue_wait_seconds",
+        "Time a scrape job waited in the queue before being processed, by lane",
+        ["lane"],
+        buckets=STAGE_BUCKETS + (120, 300, 600),
+    )
+    JOB_SECONDS = Histogram(
+        "webscraper_job_seconds",
+        "Time to process a scrape job in the worker, by final status",
+        ["status"],
+        buckets=STAGE_BUCKETS,
+    )
+    JOB_RETRIES_TOTAL = Counter(
+        "webscraper_job_retries_total",
+        "Scrape jobs scheduled for a delayed retry, by lane",
+        ["lane"],
+    )
+    DEAD_LETTERS_TOTAL = Counter(
+        "webscraper_dead_letters_total",
+        "Scrape jobs sent to the dead-letter queue after running out of retries, by lane",
+        ["lane"],
+    )
+    SCRAPE_STAGE_SECONDS = Histogram(
+        "webscraper_scrape_stage_seconds",
+        "Time spent in each stage of a scrape",
+        ["stage"],
+        buckets=STAGE_BUCKETS,
+    )
+    PAGE_BYTES = Histogram(
+        "webscraper_page_bytes",
+        "Bytes downloaded by the browser in a scrape job",
+        buckets=(1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7),
+    )
+    PAGE_REQUESTS_TOTAL = Counter(
+        "webscraper_page_requests_total",
+        "Requests made by the browser pages, by outcome (loaded or blocked)",
+        ["outcome"],
+    )
+    FORM_PAGE_REUSES_TOTAL = Counter(
+        "webscraper_form_page_reuses_total",
+        "Scrape jobs run on a reused form page or on a new one, by result",
+        ["result"],
+    )
+    REDIS_SECONDS = Histogram(
+        "webscraper_redis_seconds",
+        "Time spent in Redis operations of the scrape service",
+        ["operation"],
+        buckets=STAGE_BUCKETS,
+    )
+    CACHE_LOOKUPS_TOTAL = Counter(
+        "webscraper_cache_lookups_total",
+        "Scrape result cache lookups, by result",
+        ["result"],
+    )
+    LOCAL_CACHE_LOOKUPS_TOTAL = Counter(
+        "webscraper_local_cache_lookups_total",
+        "Scrape result lookups in the in-process cache of the API, by result",
+        ["result"],
+    )
+    RESULT_STORE_LOOKUPS_TOTAL = Counter(
+        "webscraper_result_store_lookups_total",
+        "Lookups in the durable result store after a cache miss, by result",
+        ["result"],
+    )
+    RESULT_STORE_WRITES_TOTAL = Counter(
+        "webscraper_result_store_writes_total",
+        "Results written to the durable result store, by outcome",
+        ["outcome"],
+    )
+    RESULT_STORE_FLUSH_SECONDS = Histogram(
+        "webscraper_result_store_flush_seconds",
+        "Time to write a batch of results to the durable result store",
+        buckets=STAGE_BUCKETS,
+    )
+    EXPORTED_RESULTS_TOTAL = Counter(
+        "webscraper_exported_results_total",
+        "Scrape results written by the bulk exports, by format",
+        ["format"],
+    )
+    REFRESH_JOBS_TOTAL = Counter(
+        "webscraper_refresh_jobs_total",
+        "Refresh jobs of watched CNPJs published by the refresh scheduler",
+    )
+    REFRESH_CHECKS_TOTAL = Counter(
+        "webscraper_refresh_checks_total",
+        "COMPLETED results of watched CNPJs, by change detection result",
+        ["result"],
+    )
+    REFRESH_PAUSED = Gauge(
+        "webscraper_refresh_paused",
+        "1 while the refresh scheduler waits for the bulk queue to drain",
+        multiprocess_mode="livemostrecent",
+    )
+    JOBS_IN_FLIGHT = Gauge(
+        "webscraper_jobs_in_flight",
+        "Scrape jobs being processed by the worker",
+        multiprocess_mode="livesum",
+    )
+    WORKER_CONCURRENCY = Gauge(
+        "webscraper_worker_concurrency",
+        "Scrape jobs the worker may process at the same time",
+        multiprocess_mode="livesum",
+    )
+    WORKER_UTILIZATION = Gauge(
+        "webscraper_worker_utilization",
+        "Share of the worker slots busy with a scrape job, from 0 to 1",
+        multiprocess_mode="liveall",
+    )
+    WORKER_DRAINING = Gauge(
+        "webscraper_worker_draining",
+        "1 while the worker is draining its in-flight jobs before shutting down",
+        multiprocess_mode="livemax",
+    )
+    QUEUE_DEPTH = Gauge(
+        "webscraper_queue_depth",
+        "Messages ready in a RabbitMQ queue, by queue",
+        ["queue"],
+        multiprocess_mode="livemostrecent",
+    )
+    QUEUE_LAG_SECONDS = Gauge(
+        "webscraper_queue_lag_seconds",
+        "Age of the last scrape job picked by the worker when it was picked, by lane",
+        ["lane"],
+        multiprocess_mode="livemax",
+    )
+    WORKER_PROCESSES = Gauge(
+        "webscraper_worker_processes",
+        "Worker processes of the supervisor that are alive and sending heartbeats",
+        multiprocess_mode="livemax",
+    )
+    WORKER_RESTARTS_TOTAL = Counter(
+        "webscraper_worker_restarts_total",
+        "Worker processes restarted by the supervisor, by reason",
+        ["reason"],
+    )
+    BROWSER_POOL_SIZE = Gauge(
+        "webscraper_browser_pool_size",
+        "Browsers alive in the browser pool",
+        multiprocess_mode="livesum",
+    )
+    RATE_LIMIT_WAIT_SECONDS = Histogram(
+        "webscraper_rate_limit_wait_seconds",
+        "Time a scrape job waited for a token of the upstream rate limiter",
+        buckets=STAGE_BUCKETS,
+    )
+    UPSTREAM_RATE_LIMIT = Gauge(
+        "webscraper_upstream_rate_limit",
+        "Requests/s currently allowed toward the target site by the adaptive rate limiter",
+        multiprocess_mode="livemostrecent",
+    )
+    CIRCUIT_BREAKER_OPEN = Gauge(
+        "webscraper_circuit_breaker_open",
+        "1 while the circuit breaker toward the target site is open",
+        multiprocess_mode="livemostrecent",
+    )
+    BROWSER_POOL_OPEN_PAGES = Gauge(
+        "webscraper_browser_pool_open_pages",
+        "Browser contexts currently handed out by the browser pool",
+        multiprocess_mode="livesum",
+    )
+
+    @staticmethod
+    def time_stage(stage):
+        """
+        Times a stage of a scrape.
+
+        :param str stage: Name of the stage (e.g., 'goto', 'extraction')
+        :return: Context manager that observes the elapsed time on exit
+        """
+        return Metrics.SCRAPE_STAGE_SECONDS.labels(stage=stage).time()
+
+    @staticmethod
+    def time_redis(operation):
+        """
+        Times a Redis operation.
+
+        :param str operation: Name of the operation (e.g., 'set_cache')
+        :return: Context manager that observes the elapsed time on exit
+        """
+        return Metrics.REDIS_SECONDS.labels(operation=operation).time()
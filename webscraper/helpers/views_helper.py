@@ -1,6 +1,37 @@
-from fastapi.responses import JSONResponse
+import orjson
+import pydantic
+from fastapi.responses import Response
 
-from webscraper.models.response_dto import BaseResponse
+from webscraper.models.message_dto import ScrapeJobMessageDTO
+from webscraper.services.scrape import ScrapeService
+
+
+def _orjson_default(value):
+    """
+    Serializes the objects orjson does not know, called by orjson only when it meets one.
+    Pydantic models are written from their field values, without going through model_dump,
+    so field serializers and aliases are not applied. The models of the API have none.
+
+    :param any value: The object to serialize
+    :raises TypeError: If the object is not a pydantic model
+    :return: The field values of the model
+    :rtype: dict
+    """
+    if isinstance(value, pydantic.BaseModel):
+        return value.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class OrjsonResponse(Response):
+    """
+    JSON response serialized straight by orjson, pydantic models included, without validating
+    the content against a response model first.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content, default=_orjson_default)
 
 
 class ViewsHelper(object):
@@ -8,19 +39,74 @@ class ViewsHelper(object):
     Helper class for API views.
     """
 
+    JSON_MEDIA_TYPE = "application/json"
+
     @staticmethod
     def make_response(data=None, message=None, status="success", http_code=200):
         """
-        Create a standardized JSON response.
+        Create a standardized JSON response, with the same shape of
+        webscraper.models.response_dto.BaseResponse.
 
         :param any data: The data to include in the response
         :param str message: Optional message to include in the response
         :param str status: Status of the response (default is "success")
         :param int http_code: HTTP status code for the response (default is 200)
         """
-        return JSONResponse(
-            content=BaseResponse(
-                status=status, message=message, data=data
-            ).model_dump(),
+        return OrjsonResponse(
+            {"status": status, "message": message, "data": data},
             status_code=http_code,
         )
+
+    @staticmethod
+    def make_raw_response(raw_data, message=None, status="success", http_code=200):
+        """
+        Create a standardized JSON response whose data is already serialized,
+        writing it out as is.
+
+        :param bytes raw_data: The JSON representation of the data to include in the response
+        :param str message: Optional message to include in the response
+        :param str status: Status of the response (default is "success")
+        :param int http_code: HTTP status code for the response (default is 200)
+        """
+        head = orjson.dumps({"status": status, "message": message})
+        return Response(
+            content=head[:-1] + b',"data":' + raw_data + b"}",
+            status_code=http_code,
+            media_type=ViewsHelper.JSON_MEDIA_TYPE,
+        )
+
+    @staticmethod
+    def scrape_service(request):
+        """
+        Creates the scrape service of a request, configured by the application state.
+
+        :param fastapi.Request request: The request being handled
+        :return: The scrape service
+        :rtype: webscraper.services.scrape.ScrapeService
+        """
+        state = request.app.state
+        return ScrapeService(
+            state.settings.scrape_url,
+            state.redis_client,
+            local_cache=state.results_cache,
+            ttl_policy=state.cache_policy,
+            result_store=state.result_store,
+        )
+
+    @staticmethod
+    def validate_cnpjs(cnpjs, **fields):
+        """
+        Validates a list of CNPJs as scrape job messages.
+
+        :param list[str] cnpjs: CNPJs as sent in the request, formatted or not
+        :param fields: Other fields of the messages, such as the priority and the tenant
+        :return: One (cnpj, message) pair per CNPJ, with message set to None if the CNPJ is invalid
+        :rtype: list[tuple[str, webscraper.models.message_dto.ScrapeJobMessageDTO | None]]
+        """
+        validated = []
+        for cnpj in cnpjs:
+            try:
+                validated.append((cnpj, ScrapeJobMessageDTO(cnpj=cnpj, **fields)))
+            except pydantic.ValidationError:
+                validated.append((cnpj, None))
+        return validated
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+
+
+class BatchRequestDTO(BaseModel):
+    """
+    DTO for batch requests over many CNPJs.
+
+    :param cnpjs: List of CNPJs, formatted or not
+    :param priority: Lane of the jobs created by the batch. Defaults to "bulk"
+    """
+
+    cnpjs: list[str]
+    priority: Literal["interactive", "bulk"] = "bulk"
+
+
+class BatchItemDTO(BaseModel):
+    """
+    DTO for the status of a single CNPJ in a batch response.
+
+    :param cnpj: The CNPJ as sent in the request
+    :param status: Status of the item (e.g., 'QUEUED', 'IN_PROGRESS', 'COMPLETED', 'INVALID')
+    :param message: Optional message providing additional information
+    :param data: Optional data of the item, such as the cached scrape result
+    """
+
+    cnpj: str
+    status: str
+    message: Optional[str] = None
+    data: Optional[dict] = None
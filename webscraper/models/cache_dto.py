@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+import time
+
+import orjson
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Optional
 
 
 class CacheMessageDTO(BaseModel):
@@ -7,7 +11,23 @@ class CacheMessageDTO(BaseModel):
 
     :param status: Status of the operation
     :param data: Data associated with the cache operation
+    :param updated_at: Unix timestamp of when the status was set
     """
 
     status: str
     data: dict = {}
+    updated_at: float = Field(default_factory=time.time)
+
+    _json: Optional[bytes] = PrivateAttr(default=None)
+
+    def json_bytes(self):
+        """
+        Serializes the message to JSON once, so cached instances are not serialized on every read.
+        The message must not be changed after this is called.
+
+        :return: The JSON representation of the message
+        :rtype: bytes
+        """
+        if self._json is None:
+            self._json = orjson.dumps(self.model_dump())
+        return self._json
@@ -1,5 +1,9 @@
 import re
+import time
 import pydantic
+from typing import Literal, Optional
+
+from webscraper.helpers.cnpj import normalize_cnpj
 
 
 class QueueMessageDTO(pydantic.BaseModel):
@@ -8,10 +12,16 @@ class QueueMessageDTO(pydantic.BaseModel):
 
     :param job: The type of job (e.g., 'SCRAPE')
     :param status: Status of the job (e.g., 'QUEUED', 'PROCESSING', 'DONE')
+    :param created_at: Unix timestamp of when the message was created
+    :param priority: Lane of the job, "interactive" for single lookups or "bulk" for backfills
+    :param tenant: Optional client that sent the job, jobs are scheduled fairly across tenants
     """
 
     job: str
     status: str
+    created_at: float = pydantic.Field(default_factory=time.time)
+    priority: Literal["interactive", "bulk"] = "interactive"
+    tenant: Optional[str] = None
 
 
 class ScrapeJobMessageDTO(QueueMessageDTO):
@@ -19,19 +29,35 @@ class ScrapeJobMessageDTO(QueueMessageDTO):
     DTO for a scraping job message. Extends QueueMessageDTO.
 
     :param cnpj: CNPJ of the company to scrape
+    :param callback_url: Optional URL the result is POSTed to when the job finishes
+    :param attempts: Number of failed attempts of the job so far
+    :param last_error: Error of the last failed attempt, if any
     """
 
     job: str = "SCRAPE"
     status: str = "QUEUED"
     cnpj: str
+    callback_url: Optional[str] = None
+    attempts: int = 0
+    last_error: Optional[str] = None
 
     @pydantic.field_validator("cnpj", mode="before")
     def sanitize_cnpj(cls, v):
         """
-        Remove all non-digit characters from the CNPJ and validate its length.
+        Remove all non-digit characters from the CNPJ and validate its length and check digits.
         :raises: ValueError if invalid.
         """
-        cnpj_digits = re.sub(r"\D", "", v)
-        if len(cnpj_digits) != 14:
+        cnpj_digits = normalize_cnpj(v) if isinstance(v, str) else None
+        if cnpj_digits is None:
             raise ValueError(f"Invalid CNPJ: {v}")
         return cnpj_digits
+
+    @pydantic.field_validator("callback_url")
+    def validate_callback_url(cls, v):
+        """
+        Only accept absolute HTTP(S) URLs as callbacks.
+        :raises: ValueError if invalid.
+        """
+        if v is not None and not re.match(r"^https?://[^/\s]+", v):
+            raise ValueError(f"Invalid callback URL: {v}")
+        return v
@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+
+
+class SnapshotDTO(BaseModel):
+    """
+    DTO for a version of the result of a CNPJ kept by the result store.
+
+    :param cnpj: The CNPJ number
+    :param version: Version of the result, starting at 1
+    :param content_hash: SHA-256 of the result data
+    :param first_seen: Unix timestamp of the first scrape that returned this version
+    :param last_seen: Unix timestamp of the last scrape that returned this version
+    :param data: The scraped data
+    """
+
+    cnpj: str
+    version: int
+    content_hash: str
+    first_seen: float
+    last_seen: float
+    data: dict = {}
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+from webscraper.config import Settings
+
+from webscraper.clients.redis import AsyncRedisClient
+from webscraper.clients.result_store import ResultStore
+
+from webscraper.services.export import ResultExporter
+
+from webscraper.helpers.log import Log
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Streams the scrape results of the cache or of the result store to a file"
+    )
+    parser.add_argument(
+        "--format", choices=sorted(ResultExporter.MEDIA_TYPES), default="ndjson"
+    )
+    parser.add_argument("--source", choices=ResultExporter.SOURCES, default="cache")
+    parser.add_argument(
+        "--status", nargs="+", help="Only the results with one of these statuses"
+    )
+    parser.add_argument("--prefix", default="", help="Only the CNPJs starting with it")
+    parser.add_argument(
+        "--since",
+        type=float,
+        help="Only the results updated at or after this Unix timestamp",
+    )
+    parser.add_argument(
+        "--until",
+        type=float,
+        help="Only the results updated before this Unix timestamp",
+    )
+    parser.add_argument(
+        "--fields", nargs="+", help="Data fields written as columns in CSV and Parquet"
+    )
+    parser.add_argument("--output", help="Output file. Defaults to the standard output")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    settings = Settings()
+    Log.setup(logging.INFO, stdout_log=args.output is not None)
+    logger = Log.get_logger(__name__)
+
+    redis_client = AsyncRedisClient.from_settings(settings)
+    result_store = ResultStore.from_settings(settings)
+    exporter = ResultExporter(redis_client, result_store, settings.export_batch_size)
+    exporter.validate(args.format, args.source, args.prefix)
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        batches = exporter.records(
+            args.source, args.status, args.prefix, args.since, args.until
+        )
+        async for chunk in exporter.stream(args.format, batches, args.fields):
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            output.close()
+        await redis_client.close()
+        if result_store:
+            await result_store.close()
+
+    logger.info(f"Exported {written} bytes of results")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import logging
+
+from webscraper.config import Settings
+
+from webscraper.clients.rabbitmq import AsyncRabbitMQClient
+from webscraper.clients.redis import AsyncRedisClient
+
+from webscraper.services.cache_policy import CacheTTLPolicy
+from webscraper.services.ingest import CNPJIngestor
+from webscraper.services.scrape import ScrapeService
+
+from webscraper.helpers.bloom_filter import BloomFilter
+from webscraper.helpers.log import Log
+
+
+def parse_args(settings):
+    parser = argparse.ArgumentParser(
+        description="Loads a file of CNPJs (plain lines or CSV, optionally gzip compressed) as scrape jobs"
+    )
+    parser.add_argument("path", help="Input file, decompressed if it ends with .gz")
+    parser.add_argument(
+        "--format",
+        choices=CNPJIngestor.FORMATS,
+        help="Defaults to csv for .csv and .csv.gz files, lines otherwise",
+    )
+    parser.add_argument(
+        "--column",
+        default="0",
+        help="Index or header name of the CSV column with the CNPJs. Defaults to 0",
+    )
+    parser.add_argument("--priority", choices=("interactive", "bulk"), default="bulk")
+    parser.add_argument("--tenant", default="ingest")
+    parser.add_argument(
+        "--checkpoint",
+        help="File where the progress is kept. Defaults to the input path with .checkpoint appended",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Starts from the first row even if there is a checkpoint",
+    )
+    parser.add_argument(
+        "--expected",
+        type=int,
+        default=settings.ingest_bloom_capacity,
+        help="Unique CNPJs the Bloom filter is sized for",
+    )
+    return parser.parse_args()
+
+
+async def main():
+    settings = Settings()
+    args = parse_args(settings)
+    Log.setup(logging.INFO)
+    logger = Log.get_logger(__name__)
+
+    seen = BloomFilter(args.expected, settings.ingest_bloom_error_rate)
+    logger.info(
+        f"Bloom filter of {seen.nbytes / 2**20:.1f} MiB for {args.expected} CNPJs"
+    )
+
+    redis_client = AsyncRedisClient.from_settings(settings)
+    rabbitmq_client = AsyncRabbitMQClient(
+        settings.rabbitmq_url,
+        settings.rabbitmq_queue,
+        publisher_confirms=settings.rabbitmq_publisher_confirms,
+    )
+    scrape_service = ScrapeService(
+        settings.scrape_url,
+        redis_client,
+        ttl_policy=CacheTTLPolicy.from_settings(settings),
+    )
+    ingestor = CNPJIngestor(
+        scrape_service,
+        rabbitmq_client,
+        seen,
+        claim_ttl=settings.scrape_claim_ttl,
+        batch_size=settings.ingest_batch_size,
+        concurrency=settings.ingest_concurrency,
+        priority=args.priority,
+        tenant=args.tenant,
+    )
+
+    try:
+        stats = await ingestor.ingest(
+            args.path,
+            input_format=args.format,
+            column=args.column,
+            checkpoint_path=args.checkpoint or f"{args.path}.checkpoint",
+            resume=not args.no_resume,
+        )
+    finally:
+        await rabbitmq_client.close()
+        await redis_client.close()
+
+    if len(seen) > args.expected:
+        logger.warning(
+            f"Read {len(seen)} unique CNPJs, more than the {args.expected} expected, "
+            "some new CNPJs may have been dropped as repeated. Use a larger --expected"
+        )
+    logger.info(f"Ingestion done: {stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
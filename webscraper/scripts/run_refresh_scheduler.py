@@ -0,0 +1,47 @@
+import asyncio
+import logging
+import signal
+
+from webscraper.config import Settings
+
+from webscraper.clients.rabbitmq import AsyncRabbitMQClient
+from webscraper.clients.redis import AsyncRedisClient
+
+from webscraper.services.refresh import RefreshScheduler
+from webscraper.services.scrape import ScrapeService
+
+from webscraper.helpers.log import Log
+
+
+async def main():
+    settings = Settings()
+    Log.setup(logging.INFO)
+    logger = Log.get_logger(__name__)
+
+    redis_client = AsyncRedisClient.from_settings(settings)
+    rabbitmq_client = AsyncRabbitMQClient(
+        settings.rabbitmq_url,
+        settings.rabbitmq_queue,
+        publisher_confirms=settings.rabbitmq_publisher_confirms,
+    )
+    scheduler = RefreshScheduler.from_settings(
+        redis_client,
+        settings,
+        scrape_service=ScrapeService(settings.scrape_url, redis_client),
+        rabbitmq_client=rabbitmq_client,
+    )
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, scheduler.stop)
+
+    logger.info(f"Starting Refresh Scheduler at {settings.refresh_rate} jobs/s...")
+    try:
+        await scheduler.run_forever()
+    finally:
+        await rabbitmq_client.close()
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
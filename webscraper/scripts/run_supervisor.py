@@ -0,0 +1,51 @@
+import glob
+import logging
+import os
+import tempfile
+
+from webscraper.config import Settings
+
+from webscraper.helpers.log import Log
+
+
+def setup_multiprocess_metrics():
+    """
+    Points prometheus_client to a clean directory shared by the worker processes.
+    Must run before prometheus_client is imported, which is why the supervisor is imported late.
+
+    :return: Path of the directory
+    :rtype: str
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, "*.db")):
+            os.remove(stale)
+    else:
+        path = tempfile.mkdtemp(prefix="webscraper-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def main():
+    settings = Settings()
+    Log.setup(logging.INFO)
+    logger = Log.get_logger(__name__)
+
+    setup_multiprocess_metrics()
+
+    from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+    from webscraper.worker.supervisor import WorkerSupervisor
+
+    if settings.metrics_port:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(settings.metrics_port, registry=registry)
+        logger.info(f"Serving metrics of all workers on port {settings.metrics_port}")
+
+    logger.info("Starting Scrape Worker Supervisor...")
+    WorkerSupervisor.from_settings(settings).run()
+
+
+if __name__ == "__main__":
+    main()
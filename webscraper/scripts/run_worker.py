@@ -1,5 +1,7 @@
 import asyncio
 import logging
+import signal
+from prometheus_client import start_http_server
 from webscraper.worker.worker import ScrapeWorker
 from webscraper.config import Settings
 
@@ -11,8 +13,17 @@ async def main():
     Log.setup(logging.INFO)
     logger = Log.get_logger(__name__)
 
+    if settings.metrics_port:
+        start_http_server(settings.metrics_port)
+        logger.info(f"Serving metrics on port {settings.metrics_port}")
+
     logger.info("Starting Scrape Worker...")
     worker = ScrapeWorker(settings)
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, worker.stop)
+
     await worker.start_worker()
 
 
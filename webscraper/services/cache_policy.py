@@ -0,0 +1,67 @@
+import time
+
+
+class CacheTTLPolicy(object):
+    """
+    Expiration policy of the cached scrape jobs, by status.
+
+    IN_PROGRESS and RETRYING entries work as a lease, FAILED entries as a negative cache that keeps
+    failing CNPJs from being scraped over and over, and COMPLETED entries are fresh for
+    'completed_ttl' seconds and then served as stale for 'stale_ttl' more seconds while
+    they are refreshed.
+    """
+
+    def __init__(
+        self, in_progress_ttl=600, failed_ttl=300, completed_ttl=3600, stale_ttl=0
+    ):
+        """
+        :param int in_progress_ttl: Seconds an IN_PROGRESS or RETRYING entry is kept. Defaults to 600
+        :param int failed_ttl: Seconds a FAILED entry is kept. Defaults to 300
+        :param int completed_ttl: Seconds a COMPLETED entry is fresh. Defaults to 3600
+        :param int stale_ttl: Seconds a COMPLETED entry is kept after it is no longer fresh.
+        Defaults to 0
+        :rtype: None
+        """
+        self.in_progress_ttl = in_progress_ttl
+        self.failed_ttl = failed_ttl
+        self.completed_ttl = completed_ttl
+        self.stale_ttl = stale_ttl
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Creates the policy configured by the application settings.
+
+        :param webscraper.config.Settings settings: Application settings
+        :return: The cache policy
+        :rtype: CacheTTLPolicy
+        """
+        return cls(
+            in_progress_ttl=settings.cache_ttl_in_progress,
+            failed_ttl=settings.cache_ttl_failed,
+            completed_ttl=settings.cache_ttl_completed,
+            stale_ttl=settings.cache_stale_ttl,
+        )
+
+    def ttl(self, status):
+        """
+        :param str status: Status of the cached job
+        :return: Seconds the entry is kept in Redis
+        :rtype: int
+        """
+        if status == "COMPLETED":
+            return self.completed_ttl + self.stale_ttl
+        if status == "FAILED":
+            return self.failed_ttl
+        return self.in_progress_ttl
+
+    def is_stale(self, cache):
+        """
+        :param webscraper.models.cache_dto.CacheMessageDTO cache: The cached job
+        :return: True if the job is COMPLETED and its result is older than the freshness TTL
+        :rtype: bool
+        """
+        return (
+            cache.status == "COMPLETED"
+            and time.time() - cache.updated_at > self.completed_ttl
+        )
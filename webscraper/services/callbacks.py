@@ -0,0 +1,183 @@
+import asyncio
+import ipaddress
+import socket
+
+import httpx
+
+from webscraper.exceptions import ForbiddenCallbackException
+
+from webscraper.helpers.log import Log
+
+
+class CallbackService(object):
+    """
+    Notifies the callback URLs registered for a scrape job with its result.
+
+    Callback URLs come from the API clients, so the workers only send them to the allowed
+    hosts, if any are set, and never to loopback, private, link-local or reserved addresses
+    unless private networks are allowed. The host is resolved and checked right before the
+    request, which is then sent to the checked address, so a DNS answer that changes in
+    between can not redirect it. Redirects are not followed.
+    """
+
+    DEFAULT_PORTS = {"http": 80, "https": 443}
+
+    def __init__(
+        self,
+        timeout=10,
+        max_connections=20,
+        allowed_hosts=(),
+        allow_private_networks=False,
+    ):
+        """
+        :param float timeout: Timeout in seconds of each callback request
+        :param int max_connections: Maximum number of connections kept by the HTTP client pool
+        :param list[str] allowed_hosts: Hosts, and their subdomains, the callbacks may be sent to.
+        Defaults to any host
+        :param bool allow_private_networks: Allows the callbacks to loopback, private, link-local
+        and reserved addresses. Defaults to False
+        :rtype: None
+        """
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.allowed_hosts = tuple(host.lower().strip(".") for host in allowed_hosts)
+        self.allow_private_networks = allow_private_networks
+        self._client = None
+        self.logger = Log.get_logger(__name__)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Creates the callback service configured by the application settings.
+
+        :param webscraper.config.Settings settings: Application settings
+        :return: The callback service
+        :rtype: CallbackService
+        """
+        return cls(
+            timeout=settings.callback_timeout,
+            allowed_hosts=settings.callback_allowed_hosts,
+            allow_private_networks=settings.callback_allow_private_networks,
+        )
+
+    def _get_client(self):
+        """
+        Creates the pooled HTTP client, if it was not created yet.
+
+        :return: The HTTP client shared by all the callbacks
+        :rtype: httpx.AsyncClient
+        """
+        if not self._client or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=False,
+                limits=httpx.Limits(max_connections=self.max_connections),
+            )
+        return self._client
+
+    async def resolve(self, url):
+        """
+        Checks that a callback may be sent to the URL and resolves its host.
+
+        :param str url: The callback URL
+        :return: The IP address the callback is sent to
+        :rtype: str
+        :raises webscraper.exceptions.ForbiddenCallbackException: If the URL is not HTTP(S), its host
+        is not allowed or can not be resolved, or it resolves to a non-public address while
+        private networks are not allowed
+        """
+        try:
+            parsed = httpx.URL(url)
+        except httpx.InvalidURL as e:
+            raise ForbiddenCallbackException(f"Invalid callback URL: {e}")
+
+        host = parsed.host
+        if parsed.scheme not in self.DEFAULT_PORTS or not host:
+            raise ForbiddenCallbackException("Only absolute HTTP(S) URLs are allowed")
+        if self.allowed_hosts and not any(
+            host == allowed or host.endswith(f".{allowed}")
+            for allowed in self.allowed_hosts
+        ):
+            raise ForbiddenCallbackException(f"Host '{host}' is not allowed")
+
+        port = parsed.port or self.DEFAULT_PORTS[parsed.scheme]
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                host, port, type=socket.SOCK_STREAM
+            )
+        except socket.gaierror as e:
+            raise ForbiddenCallbackException(f"Host '{host}' can not be resolved: {e}")
+
+        addresses = [info[4][0] for info in infos]
+        if not self.allow_private_networks:
+            for address in addresses:
+                if not self.is_public_address(address):
+                    raise ForbiddenCallbackException(
+                        f"Host '{host}' resolves to the non-public address {address}"
+                    )
+        return addresses[0]
+
+    @staticmethod
+    def is_public_address(address):
+        """
+        :param str address: An IPv4 or IPv6 address
+        :return: False for loopback, private, link-local, shared, multicast and reserved addresses,
+        including IPv4 addresses mapped to IPv6
+        :rtype: bool
+        """
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        return ip.is_global and not ip.is_multicast
+
+    async def _post(self, url, payload):
+        """
+        POSTs the payload to the checked address of the callback URL, keeping its host in the
+        Host header and, for HTTPS, in the TLS server name.
+
+        :param str url: The callback URL
+        :param dict payload: JSON-serializable result of the job
+        :rtype: None
+        :raises webscraper.exceptions.ForbiddenCallbackException: If the callback is not allowed
+        :raises httpx.HTTPError: If the request fails or the response is not a success
+        """
+        address = await self.resolve(url)
+        parsed = httpx.URL(url)
+        request = self._get_client().build_request(
+            "POST",
+            parsed.copy_with(host=address),
+            json=payload,
+            headers={"Host": parsed.netloc.decode("ascii")},
+            extensions={"sni_hostname": parsed.host},
+        )
+        response = await self._get_client().send(request)
+        response.raise_for_status()
+
+    async def notify(self, callback_urls, payload):
+        """
+        POSTs the payload to every callback URL. Failures are logged and not retried.
+
+        :param set[str] callback_urls: URLs to notify
+        :param dict payload: JSON-serializable result of the job
+        :rtype: None
+        """
+
+        async def post(url):
+            try:
+                await self._post(url, payload)
+            except ForbiddenCallbackException as e:
+                self.logger.warning(f"Refused to notify callback '{url}': {e}")
+            except httpx.HTTPError as e:
+                self.logger.warning(f"Failed to notify callback '{url}': {e}")
+
+        await asyncio.gather(*(post(url) for url in callback_urls))
+
+    async def close(self):
+        """
+        Closes the HTTP client and its connections.
+
+        :rtype: None
+        """
+        if self._client and not self._client.is_closed:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,255 @@
+import csv
+import io
+import re
+
+import orjson
+
+from webscraper.services.scrape import ScrapeService
+
+from webscraper.exceptions import InvalidParameterException
+
+from webscraper.helpers.metrics import Metrics
+
+
+class _ChunkSink(object):
+    """
+    Write-only file object buffering what a writer wrote since the last take().
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        """
+        :return: The bytes written since the last call
+        :rtype: bytes
+        """
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ResultExporter(object):
+    """
+    Streams the scrape results as NDJSON, CSV or Parquet, a batch at a time, so the memory used
+    does not depend on the number of results.
+
+    Results are read from the Redis cache with SCAN over the job keys, or from the last
+    versions kept by the result store. Each record has the CNPJ, status, update time and data.
+    In CSV and Parquet, the data is a JSON column unless 'fields' picks the fields to write
+    as columns of their own.
+    """
+
+    MEDIA_TYPES = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+        "parquet": "application/vnd.apache.parquet",
+    }
+    SOURCES = ("cache", "store")
+    COLUMNS = ("cnpj", "status", "updated_at")
+
+    def __init__(self, redis_client=None, result_store=None, batch_size=1000):
+        """
+        :param webscraper.clients.redis.AsyncRedisClient redis_client: Redis client of the cache
+        :param webscraper.clients.result_store.ResultStore result_store: Durable result store
+        :param int batch_size: Results read and written per batch. Defaults to 1000
+        :rtype: None
+        """
+        self.redis_client = redis_client
+        self.result_store = result_store
+        self.batch_size = batch_size
+
+    def validate(self, export_format, source, prefix=""):
+        """
+        Checks the options of an export before it starts streaming.
+
+        :param str export_format: "ndjson", "csv" or "parquet"
+        :param str source: "cache" or "store"
+        :param str prefix: CNPJ prefix filter
+        :raises webscraper.exceptions.InvalidParameterException: If an option is not valid, the source
+        is not available or pyarrow is missing for Parquet
+        :rtype: None
+        """
+        if export_format not in self.MEDIA_TYPES:
+            raise InvalidParameterException(f"Unknown export format '{export_format}'")
+        if source not in self.SOURCES:
+            raise InvalidParameterException(f"Unknown export source '{source}'")
+        if source == "store" and not self.result_store:
+            raise InvalidParameterException("The result store is disabled")
+        if source == "cache" and not self.redis_client:
+            raise InvalidParameterException("The cache is not available")
+        if not re.fullmatch(r"\d*", prefix):
+            raise InvalidParameterException("The CNPJ prefix must only have digits")
+        if export_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise InvalidParameterException(
+                    "The Parquet export needs pyarrow, install it with 'pip install pyarrow'"
+                )
+
+    async def records(
+        self, source="cache", statuses=None, prefix="", since=None, until=None
+    ):
+        """
+        Iterates over the results matching the filters, a batch at a time.
+
+        :param str source: "cache" or "store". Defaults to "cache"
+        :param list[str] statuses: Only the results with one of these statuses. Defaults to all
+        :param str prefix: Only the CNPJs starting with it. Defaults to all
+        :param float since: Only the results updated at or after this Unix timestamp
+        :param float until: Only the results updated before this Unix timestamp
+        :return: Async iterator of the batches of records
+        :rtype: collections.abc.AsyncIterator[list[dict]]
+        """
+        if source == "store":
+            if statuses and "COMPLETED" not in statuses:
+                return
+            async for snapshots in self.result_store.iter_latest(
+                prefix, since, until, self.batch_size
+            ):
+                yield [
+                    {
+                        "cnpj": snapshot.cnpj,
+                        "status": "COMPLETED",
+                        "updated_at": snapshot.last_seen,
+                        "data": snapshot.data,
+                    }
+                    for snapshot in snapshots
+                ]
+            return
+
+        key_prefix = ScrapeService.SCRAPE_JOB_REDIS_PREFIX
+        async for values in self.redis_client.scan_many(
+            f"{key_prefix}{prefix}*", count=self.batch_size
+        ):
+            batch = []
+            for key, value in values.items():
+                record = {
+                    "cnpj": key.removeprefix(key_prefix),
+                    "status": value.get("status"),
+                    "updated_at": value.get("updated_at"),
+                    "data": value.get("data") or {},
+                }
+                if self._matches(record, statuses, since, until):
+                    batch.append(record)
+            if batch:
+                yield batch
+
+    @staticmethod
+    def _matches(record, statuses, since, until):
+        """
+        :param dict record: The record of a result
+        :param list[str] statuses: Statuses allowed, None for all
+        :param float since: Minimum update time, None for no minimum
+        :param float until: Maximum update time (excluded), None for no maximum
+        :return: True if the record passes the filters. Records without an update time only
+        pass when there is no time filter
+        :rtype: bool
+        """
+        if statuses and record["status"] not in statuses:
+            return False
+        if since is None and until is None:
+            return True
+        updated_at = record["updated_at"]
+        if updated_at is None:
+            return False
+        return (since is None or updated_at >= since) and (
+            until is None or updated_at < until
+        )
+
+    async def stream(self, export_format, batches, fields=None):
+        """
+        Encodes the batches of records, yielding a chunk of output per batch.
+
+        :param str export_format: "ndjson", "csv" or "parquet"
+        :param collections.abc.AsyncIterator[list[dict]] batches: The batches of records
+        :param list[str] fields: Data fields written as columns in CSV and Parquet.
+        Defaults to a single JSON 'data' column
+        :return: Async iterator of the chunks of the output
+        :rtype: collections.abc.AsyncIterator[bytes]
+        """
+        encoders = {
+            "ndjson": self._ndjson,
+            "csv": self._csv,
+            "parquet": self._parquet,
+        }
+        async for chunk in encoders[export_format](batches, fields):
+            yield chunk
+
+    @staticmethod
+    async def _ndjson(batches, fields):
+        async for batch in batches:
+            Metrics.EXPORTED_RESULTS_TOTAL.labels(format="ndjson").inc(len(batch))
+            yield b"".join(orjson.dumps(record) + b"\n" for record in batch)
+
+    @classmethod
+    def _rows(cls, batch, fields):
+        """
+        :param list[dict] batch: The records
+        :param list[str] fields: Data fields written as columns, None for a JSON 'data' column
+        :return: The flat rows of the records
+        :rtype: list[dict]
+        """
+        rows = []
+        for record in batch:
+            row = {column: record[column] for column in cls.COLUMNS}
+            if fields:
+                row.update((field, record["data"].get(field)) for field in fields)
+            else:
+                row["data"] = orjson.dumps(record["data"]).decode()
+            rows.append(row)
+        return rows
+
+    @classmethod
+    async def _csv(cls, batches, fields):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(
+            buffer, fieldnames=[*cls.COLUMNS, *(fields or ["data"])]
+        )
+        writer.writeheader()
+        async for batch in batches:
+            writer.writerows(cls._rows(batch, fields))
+            Metrics.EXPORTED_RESULTS_TOTAL.labels(format="csv").inc(len(batch))
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode()
+
+    @classmethod
+    async def _parquet(cls, batches, fields):
+        import pyarrow
+        import pyarrow.parquet
+
+        schema = pyarrow.schema(
+            [
+                ("cnpj", pyarrow.string()),
+                ("status", pyarrow.string()),
+                ("updated_at", pyarrow.float64()),
+                *((field, pyarrow.string()) for field in (fields or ["data"])),
+            ]
+        )
+        sink = _ChunkSink()
+        # Every batch is written as a row group, only the footer is kept until the end
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+        try:
+            async for batch in batches:
+                writer.write_table(
+                    pyarrow.Table.from_pylist(cls._rows(batch, fields), schema=schema)
+                )
+                Metrics.EXPORTED_RESULTS_TOTAL.labels(format="parquet").inc(len(batch))
+                yield sink.take()
+        finally:
+            writer.close()
+        yield sink.take()
@@ -0,0 +1,92 @@
+from selectolax.lexbor import LexborHTMLParser
+
+from webscraper.exceptions import ScrapeEngineException
+
+
+class DocumentExtractor(object):
+    """
+    Extracts the title/value pairs of a result document from a declarative selector spec.
+
+    The same spec is used to extract from a live Playwright page, in a single round trip,
+    and from saved or downloaded HTML, without a browser.
+    """
+
+    DEFAULT_SPEC = {
+        # Container that is only present when the result document was rendered
+        "document": "div.container.doc",
+        # Each field of the document
+        "item": "div.item, div.col.box",
+        # Title and value of a field, relative to its item
+        "title": "span.label_title, div.label_title, span.label_text:has(strong)",
+        "value": "span.label_text:not(:has(strong))",
+    }
+
+    # Runs in the page and returns all the [title, value] pairs at once
+    EXTRACT_SCRIPT = """
+    (spec) => Array.from(document.querySelectorAll(spec.item), (item) => {
+        const title = item.querySelector(spec.title);
+        const value = item.querySelector(spec.value);
+        return [title ? title.textContent : null, value ? value.textContent : null];
+    })
+    """
+
+    def __init__(self, spec=None):
+        """
+        :param dict spec: Selector spec with the 'document', 'item', 'title' and 'value' keys.
+        Defaults to DEFAULT_SPEC
+        :rtype: None
+        """
+        self.spec = spec or self.DEFAULT_SPEC
+
+    @staticmethod
+    def to_dict(pairs):
+        """
+        Builds the result dictionary from the extracted pairs, skipping incomplete ones.
+
+        :param list pairs: List of (title, value) pairs, where any of them may be None
+        :return: A dictionary mapping field titles to their corresponding values
+        :rtype: dict
+        """
+        data = {}
+        for title, value in pairs:
+            if title and value:
+                data[title.strip()] = value.strip()
+        return data
+
+    async def from_page(self, page):
+        """
+        Extracts the document from a Playwright page with a single evaluate call.
+
+        :param playwright.async_api.Page page: Page where the result document is rendered
+        :return: A dictionary mapping field titles to their corresponding values
+        :rtype: dict
+        """
+        pairs = await page.evaluate(self.EXTRACT_SCRIPT, self.spec)
+        return self.to_dict(pairs)
+
+    def from_html(self, html):
+        """
+        Extracts the document from its HTML markup.
+
+        :param str html: Markup of the result page
+        :return: A dictionary mapping field titles to their corresponding values
+        :rtype: dict
+        :raises webscraper.exceptions.ScrapeEngineException: If the result document is not in the page
+        """
+        tree = LexborHTMLParser(html)
+
+        if tree.css_first(self.spec["document"]) is None:
+            raise ScrapeEngineException("Result document not found in the page")
+
+        pairs = []
+        for item in tree.css(self.spec["item"]):
+            title_el = item.css_first(self.spec["title"])
+            value_el = item.css_first(self.spec["value"])
+            pairs.append(
+                (
+                    title_el.text(deep=True) if title_el else None,
+                    value_el.text(deep=True) if value_el else None,
+                )
+            )
+
+        return self.to_dict(pairs)
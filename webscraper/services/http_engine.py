@@ -0,0 +1,163 @@
+from urllib.parse import urljoin
+
+import httpx
+from selectolax.lexbor import LexborHTMLParser
+
+from webscraper.exceptions import ScrapeEngineException
+
+from webscraper.services.extraction import DocumentExtractor
+
+from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
+
+
+class HttpScrapeEngine(object):
+    """
+    Lightweight scrape engine that submits the CNPJ form over plain HTTP, without a browser.
+
+    The form page is fetched, its fields are filled as a browser would and the form is
+    posted with a pooled HTTP client. The resulting markup is parsed with a fast HTML parser.
+    """
+
+    FORM_INPUT_SELECTOR = "input#tCNPJ"
+    CNPJ_TYPE_SELECTOR = "input#rTipoDocCNPJ"
+    SUBMIT_NAME = "btCGC"
+
+    def __init__(self, scrape_url, timeout=30, max_connections=20, extractor=None):
+        """
+        :param str scrape_url: URL of the page with the CNPJ form
+        :param float timeout: Timeout in seconds for each HTTP request
+        :param int max_connections: Maximum number of connections kept by the HTTP client pool
+        :param webscraper.services.extraction.DocumentExtractor extractor: Extractor of the result
+        document. Defaults to one with the default selector spec
+        :rtype: None
+        """
+        self.scrape_url = scrape_url
+        self.extractor = extractor or DocumentExtractor()
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+        self.logger = Log.get_logger(__name__)
+
+    def _get_client(self):
+        """
+        Creates the pooled HTTP client, if it was not created yet.
+
+        :return: The HTTP client shared by all the jobs of this engine
+        :rtype: httpx.AsyncClient
+        """
+        if not self._client or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def scrape(self, cnpj):
+        """
+        Submits the CNPJ form and extracts the key-value pairs of the resulting document.
+
+        :param str cnpj: The CNPJ number to be searched
+        :return: A dictionary mapping field titles to their corresponding values
+        :rtype: dict
+        :raises webscraper.exceptions.ScrapeEngineException: If the form or the result document
+        are not found, e.g. when a challenge page is returned
+        :raises httpx.HTTPError: If any of the HTTP requests fails
+        """
+        client = self._get_client()
+
+        with Metrics.time_stage("http_form"):
+            form_response = await client.get(self.scrape_url)
+            form_response.raise_for_status()
+
+        method, action, fields = self.build_form(
+            form_response.text, str(form_response.url), cnpj
+        )
+
+        with Metrics.time_stage("http_submit"):
+            if method == "POST":
+                result_response = await client.post(action, data=fields)
+            else:
+                result_response = await client.get(action, params=fields)
+            result_response.raise_for_status()
+
+        with Metrics.time_stage("extraction"):
+            return self.extractor.from_html(result_response.text)
+
+    @classmethod
+    def build_form(cls, html, base_url, cnpj):
+        """
+        Finds the CNPJ form in the page and builds the request a browser would send on submit.
+
+        :param str html: Markup of the form page
+        :param str base_url: URL the form page was loaded from, used to resolve the form action
+        :param str cnpj: The CNPJ number to fill in the form
+        :return: The HTTP method, the absolute action URL and the form fields
+        :rtype: tuple[str, str, dict]
+        :raises webscraper.exceptions.ScrapeEngineException: If the CNPJ form is not in the page
+        """
+        tree = LexborHTMLParser(html)
+
+        form = None
+        for candidate in tree.css("form"):
+            if candidate.css_first(cls.FORM_INPUT_SELECTOR):
+                form = candidate
+                break
+
+        if form is None:
+            raise ScrapeEngineException("CNPJ form not found in the page")
+
+        fields = {}
+        for field in form.css("input, select, textarea"):
+            name = field.attributes.get("name")
+            if not name:
+                continue
+
+            kind = (field.attributes.get("type") or "text").lower()
+            value = field.attributes.get("value") or ""
+
+            if field.tag == "select":
+                option = field.css_first("option[selected]") or field.css_first(
+                    "option"
+                )
+                value = (
+                    (option.attributes.get("value") or option.text()) if option else ""
+                )
+            elif field.tag == "textarea":
+                value = field.text()
+            elif kind in ("submit", "button", "image", "reset"):
+                if name != cls.SUBMIT_NAME:
+                    continue
+            elif kind in ("radio", "checkbox") and "checked" not in field.attributes:
+                continue
+
+            fields[name] = value
+
+        cnpj_type = form.css_first(cls.CNPJ_TYPE_SELECTOR)
+        if cnpj_type and cnpj_type.attributes.get("name"):
+            fields[cnpj_type.attributes["name"]] = (
+                cnpj_type.attributes.get("value") or "on"
+            )
+
+        fields[
+            form.css_first(cls.FORM_INPUT_SELECTOR).attributes.get("name", "tCNPJ")
+        ] = cnpj
+
+        method = (form.attributes.get("method") or "GET").upper()
+        action = urljoin(base_url, form.attributes.get("action") or "")
+
+        return method, action, fields
+
+    async def close(self):
+        """
+        Closes the HTTP client and its connections.
+
+        :rtype: None
+        """
+        if self._client and not self._client.is_closed:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,347 @@
+import asyncio
+import csv
+import gzip
+import os
+import time
+from collections import deque
+
+import orjson
+
+from webscraper.models.message_dto import ScrapeJobMessageDTO
+from webscraper.services.scrape import ScrapeService
+
+from webscraper.exceptions import InvalidParameterException
+
+from webscraper.helpers.cnpj import normalize_cnpj
+from webscraper.helpers.log import Log
+
+
+class CNPJIngestor(object):
+    """
+    Loads a large file of CNPJs, plain lines or CSV and optionally gzip compressed, as scrape jobs.
+
+    The file is read as a stream. Each CNPJ is sanitized like ScrapeJobMessageDTO does and its
+    check digits are validated. Repeated CNPJs of the file are dropped by a Bloom filter, and
+    the ones with a fresh result or a job in flight are dropped with a Redis round trip per batch,
+    like the batch endpoint does. The remaining jobs are claimed and published in batches with
+    publisher confirms, several batches at a time.
+
+    After each confirmed batch, in the order of the file, the number of rows done is written to
+    a checkpoint file, so an interrupted load resumes from the last confirmed batch.
+    """
+
+    FORMATS = ("lines", "csv")
+    STATS = ("rows", "invalid", "duplicated", "cached", "in_flight", "published")
+
+    def __init__(
+        self,
+        scrape_service,
+        rabbitmq_client,
+        seen,
+        claim_ttl=600,
+        batch_size=1000,
+        concurrency=4,
+        priority="bulk",
+        tenant="ingest",
+        progress_interval=10,
+    ):
+        """
+        :param webscraper.services.scrape.ScrapeService scrape_service: Service used to check the cache
+        and claim the jobs
+        :param webscraper.clients.rabbitmq.AsyncRabbitMQClient rabbitmq_client: Client the jobs are
+        published with
+        :param webscraper.helpers.bloom_filter.BloomFilter seen: Filter of the CNPJs already read
+        :param int claim_ttl: Expiration time of the claims of the jobs in seconds. Defaults to 600
+        :param int batch_size: CNPJs checked and published per batch. Defaults to 1000
+        :param int concurrency: Batches published at the same time. Defaults to 4
+        :param str priority: Lane of the jobs. Defaults to "bulk"
+        :param str tenant: Tenant of the jobs. Defaults to "ingest"
+        :param float progress_interval: Seconds between progress logs. Defaults to 10
+        :raises webscraper.exceptions.InvalidParameterException: If batch_size or concurrency are lower than 1
+        :rtype: None
+        """
+        if batch_size < 1 or concurrency < 1:
+            raise InvalidParameterException(
+                "'batch_size' and 'concurrency' must be greater than 0"
+            )
+
+        self.scrape_service = scrape_service
+        self.rabbitmq_client = rabbitmq_client
+        self.seen = seen
+        self.claim_ttl = claim_ttl
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.priority = priority
+        self.tenant = tenant
+        self.progress_interval = progress_interval
+        self.stats = dict.fromkeys(self.STATS, 0)
+        self.logger = Log.get_logger(__name__)
+
+    @classmethod
+    def input_format(cls, path):
+        """
+        :param str path: Path of the input file
+        :return: "csv" for .csv and .csv.gz files, "lines" otherwise
+        :rtype: str
+        """
+        return "csv" if path.removesuffix(".gz").endswith(".csv") else "lines"
+
+    @staticmethod
+    def open_input(path):
+        """
+        :param str path: Path of the input file, decompressed on the fly if it ends with .gz
+        :return: The file opened for reading text
+        :rtype: typing.TextIO
+        """
+        if path.endswith(".gz"):
+            return gzip.open(path, "rt", encoding="utf-8", newline="")
+        return open(path, encoding="utf-8", newline="")
+
+    @classmethod
+    def read_values(cls, file, input_format="lines", column="0"):
+        """
+        Iterates over the raw CNPJs of the file, one per row.
+
+        :param typing.TextIO file: The input file
+        :param str input_format: "lines" or "csv". Defaults to "lines"
+        :param str column: Index or header name of the CSV column with the CNPJs. When it is a name,
+        the first row is the header and is not counted as a row. Defaults to "0"
+        :raises webscraper.exceptions.InvalidParameterException: If the format is unknown or
+        the column is not in the header
+        :return: Iterator of the raw CNPJs, empty for the rows without one
+        :rtype: collections.abc.Iterator[str]
+        """
+        if input_format not in cls.FORMATS:
+            raise InvalidParameterException(f"Unknown input format '{input_format}'")
+
+        if input_format == "lines":
+            for line in file:
+                yield line.strip()
+            return
+
+        reader = csv.reader(file)
+        if column.isdigit():
+            index = int(column)
+        else:
+            header = next(reader, [])
+            if column not in header:
+                raise InvalidParameterException(
+                    f"Column '{column}' is not in the header"
+                )
+            index = header.index(column)
+
+        for row in reader:
+            yield row[index].strip() if index < len(row) else ""
+
+    async def ingest(
+        self, path, input_format=None, column="0", checkpoint_path=None, resume=True
+    ):
+        """
+        Loads the CNPJs of a file as scrape jobs.
+
+        :param str path: Path of the input file
+        :param str input_format: "lines" or "csv". Defaults to the format given by the file extension
+        :param str column: Index or header name of the CSV column with the CNPJs. Defaults to "0"
+        :param str checkpoint_path: File where the progress is kept. Defaults to no checkpoint
+        :param bool resume: Skips the rows done according to the checkpoint. Defaults to True
+        :raises Exception: If a batch can not be published. The jobs of the batch that were not
+        published are released and the load can be resumed from the checkpoint
+        :return: Counters of the load: rows read, invalid and duplicated CNPJs, CNPJs with a fresh
+        result, with a job in flight, and published jobs
+        :rtype: dict[str, int]
+        """
+        input_format = input_format or self.input_format(path)
+        skip = 0
+        if resume and checkpoint_path:
+            checkpoint = self._load_checkpoint(checkpoint_path, path)
+            if checkpoint:
+                skip = checkpoint["rows"]
+                self.stats.update(checkpoint["stats"])
+                self.logger.info(f"Resuming {path} after {skip} rows")
+
+        pending = deque()
+        counts = dict.fromkeys(self.STATS, 0)
+        batch = []
+        row = 0
+        next_report = time.monotonic() + self.progress_interval
+        try:
+            with self.open_input(path) as file:
+                for row, value in enumerate(
+                    self.read_values(file, input_format, column), 1
+                ):
+                    if row <= skip:
+                        # The rows already done are only read to rebuild the filter of the file
+                        cnpj = normalize_cnpj(value) if value else None
+                        if cnpj:
+                            self.seen.add(cnpj)
+                        continue
+
+                    counts["rows"] += 1
+                    if not value:
+                        continue
+                    cnpj = normalize_cnpj(value)
+                    if cnpj is None:
+                        counts["invalid"] += 1
+                    elif not self.seen.add(cnpj):
+                        counts["duplicated"] += 1
+                    else:
+                        batch.append(cnpj)
+
+                    if len(batch) >= self.batch_size:
+                        await self._submit(
+                            pending, batch, row, counts, checkpoint_path, path
+                        )
+                        batch = []
+                        counts = dict.fromkeys(self.STATS, 0)
+
+                    if time.monotonic() >= next_report:
+                        self._report_progress(row)
+                        next_report = time.monotonic() + self.progress_interval
+
+            await self._submit(pending, batch, row, counts, checkpoint_path, path)
+            while pending:
+                await self._commit(pending.popleft(), checkpoint_path, path)
+        finally:
+            # Batches already publishing are finished, so their claims are either used or released
+            if pending:
+                await asyncio.gather(
+                    *(task for task, _, _ in pending), return_exceptions=True
+                )
+
+        self._report_progress(row)
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return self.stats
+
+    async def _submit(self, pending, batch, row, counts, checkpoint_path, path):
+        """
+        Starts publishing a batch, waiting for the oldest one first when too many are in flight.
+
+        :param collections.deque pending: The batches in flight, in the order of the file
+        :param list[str] batch: The CNPJs of the batch
+        :param int row: Number of rows read up to the end of the batch
+        :param dict[str, int] counts: Counters of the rows of the batch
+        :param str checkpoint_path: File where the progress is kept, None for no checkpoint
+        :param str path: Path of the input file
+        :rtype: None
+        """
+        while len(pending) >= self.concurrency:
+            await self._commit(pending.popleft(), checkpoint_path, path)
+        pending.append((asyncio.create_task(self._publish(batch)), row, counts))
+
+    async def _commit(self, entry, checkpoint_path, path):
+        """
+        Waits for a batch and adds its counters to the stats, saving the checkpoint.
+
+        :param tuple entry: The task publishing the batch, the rows read up to its end and its counters
+        :param str checkpoint_path: File where the progress is kept, None for no checkpoint
+        :param str path: Path of the input file
+        :rtype: None
+        """
+        task, row, counts = entry
+        for name, count in (await task).items():
+            counts[name] += count
+        for name, count in counts.items():
+            self.stats[name] += count
+        if checkpoint_path:
+            self._save_checkpoint(checkpoint_path, path, row)
+
+    async def _publish(self, cnpjs):
+        """
+        Publishes the jobs of the CNPJs without a fresh result or a job in flight.
+
+        :param list[str] cnpjs: The CNPJs of the batch, valid and unique
+        :raises Exception: If a job can not be published. Only the claims of the failed jobs are
+        released, the published ones are counted in the stats
+        :return: Counters of the batch
+        :rtype: dict[str, int]
+        """
+        counts = {"cached": 0, "in_flight": 0, "published": 0}
+        if not cnpjs:
+            return counts
+
+        service = self.scrape_service
+        caches = await service.get_cache_many(cnpjs)
+        pending = []
+        for cnpj, cache in caches.items():
+            if not cache or service.is_stale(cache):
+                pending.append(cnpj)
+            elif cache.status in ScrapeService.IN_FLIGHT_STATUSES:
+                counts["in_flight"] += 1
+            else:
+                counts["cached"] += 1
+
+        claims = await service.claim_jobs(pending, self.claim_ttl)
+        claimed = [cnpj for cnpj in pending if claims[cnpj]]
+        counts["in_flight"] += len(pending) - len(claimed)
+
+        messages = [
+            ScrapeJobMessageDTO(cnpj=cnpj, priority=self.priority, tenant=self.tenant)
+            for cnpj in claimed
+        ]
+        try:
+            errors = await self.rabbitmq_client.publish_many(messages)
+        except Exception:
+            # publish_many only raises before sending anything, so none of the claims is used
+            await service.release_jobs(claimed)
+            raise
+
+        failed = [cnpj for cnpj, error in zip(claimed, errors) if error]
+        counts["published"] = len(claimed) - len(failed)
+        if failed:
+            # The published jobs keep their claims, so resuming does not publish them again
+            await service.release_jobs(failed)
+            self.stats["published"] += counts["published"]
+            self.logger.error(
+                f"Published {counts['published']} of {len(claimed)} jobs of a batch, "
+                f"released the claims of the {len(failed)} failed ones"
+            )
+            raise next(error for error in errors if error)
+
+        return counts
+
+    def _report_progress(self, row):
+        """
+        :param int row: Number of rows read so far
+        :rtype: None
+        """
+        stats = ", ".join(f"{name}={count}" for name, count in self.stats.items())
+        self.logger.info(f"Read {row} rows, confirmed: {stats}")
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_path, path):
+        """
+        :param str checkpoint_path: File where the progress is kept
+        :param str path: Path of the input file
+        :return: The checkpoint of the file, or None if there is none or it is of another file
+        :rtype: dict | None
+        """
+        try:
+            with open(checkpoint_path, "rb") as file:
+                checkpoint = orjson.loads(file.read())
+        except FileNotFoundError:
+            return None
+
+        same_path = checkpoint.get("path") == os.path.abspath(path)
+        same_size = checkpoint.get("size") == os.stat(path).st_size
+        return checkpoint if same_path and same_size else None
+
+    def _save_checkpoint(self, checkpoint_path, path, row):
+        """
+        Replaces the checkpoint atomically, so it is never left half written.
+
+        :param str checkpoint_path: File where the progress is kept
+        :param str path: Path of the input file
+        :param int row: Number of rows done
+        :rtype: None
+        """
+        checkpoint = {
+            "path": os.path.abspath(path),
+            "size": os.stat(path).st_size,
+            "rows": row,
+            "stats": self.stats,
+        }
+        temporary_path = f"{checkpoint_path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(orjson.dumps(checkpoint))
+        os.replace(temporary_path, checkpoint_path)
@@ -0,0 +1,148 @@
+import asyncio
+from contextlib import contextmanager
+
+from webscraper.services.scrape import ScrapeService
+
+from webscraper.helpers.log import Log
+
+
+class JobEventsListener(object):
+    """
+    Listens to the scrape job events published by the workers and dispatches them
+    to the requests waiting for a CNPJ.
+
+    A single Redis pub/sub connection is shared by all the waiting requests of the process.
+    """
+
+    def __init__(self, redis_client):
+        """
+        :param webscraper.clients.redis.AsyncRedisClient redis_client: Redis client to listen with
+        :rtype: None
+        """
+        self._redis_client = redis_client
+        self._subscribers = {}
+        self._handlers = []
+        self._reset_handlers = []
+        self._task = None
+        self.logger = Log.get_logger(__name__)
+
+    def start(self):
+        """
+        Starts listening in a background task, if not already started.
+
+        :rtype: None
+        """
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        """
+        Stops listening.
+
+        :rtype: None
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def add_handler(self, handler):
+        """
+        Registers a function called with every event received.
+
+        :param callable(str, dict) handler: Function accepting the CNPJ and the event
+        :rtype: None
+        """
+        self._handlers.append(handler)
+
+    def add_reset_handler(self, handler):
+        """
+        Registers a function called whenever the subscription is (re)established and confirmed,
+        since events published while it was down are lost.
+
+        :param callable() handler: Function without parameters
+        :rtype: None
+        """
+        self._reset_handlers.append(handler)
+
+    @contextmanager
+    def subscribe(self, cnpj):
+        """
+        Subscribes to the events of a CNPJ while the context is open.
+
+        :param str cnpj: The CNPJ number
+        :return: Queue receiving the events of the CNPJ
+        :rtype: asyncio.Queue
+        """
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(cnpj, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[cnpj].discard(queue)
+            if not self._subscribers[cnpj]:
+                del self._subscribers[cnpj]
+
+    def _dispatch(self, cnpj, event):
+        """
+        Dispatches an event to the handlers and the subscribers of its CNPJ.
+
+        :param str cnpj: The CNPJ number
+        :param dict event: The cached job published by the worker
+        :rtype: None
+        """
+        for handler in self._handlers:
+            try:
+                handler(cnpj, event)
+            except Exception as e:
+                self.logger.error(f"Error handling event for CNPJ {cnpj}: {e}")
+
+        for queue in self._subscribers.get(cnpj, ()):
+            queue.put_nowait(event)
+
+    async def _on_subscribe(self):
+        """
+        Runs the reset handlers once the subscription is confirmed, and sends the cached job of
+        every subscribed CNPJ to its subscribers, since its events may have been published
+        before the subscription, after the subscribers read Redis.
+
+        :rtype: None
+        """
+        for handler in self._reset_handlers:
+            handler()
+
+        cnpjs = list(self._subscribers)
+        if not cnpjs:
+            return
+
+        prefix = ScrapeService.SCRAPE_JOB_REDIS_PREFIX
+        caches = await self._redis_client.get_many(
+            [f"{prefix}{cnpj}" for cnpj in cnpjs]
+        )
+        for cnpj in cnpjs:
+            cache = caches.get(f"{prefix}{cnpj}")
+            if cache:
+                for queue in self._subscribers.get(cnpj, ()):
+                    queue.put_nowait(cache)
+
+    async def _listen_forever(self):
+        """
+        Listens to the events channel forever, reconnecting on errors.
+
+        :rtype: None
+        """
+        prefix = ScrapeService.SCRAPE_EVENTS_REDIS_PREFIX
+
+        while True:
+            try:
+                async for channel, event in self._redis_client.listen(
+                    f"{prefix}*", on_subscribe=self._on_subscribe
+                ):
+                    self._dispatch(channel.removeprefix(prefix), event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(
+                    f"Lost job events subscription, retrying in 1 second: {e}"
+                )
+                await asyncio.sleep(1)
@@ -0,0 +1,443 @@
+import asyncio
+import hashlib
+import math
+import time
+
+import orjson
+
+from webscraper.models.message_dto import ScrapeJobMessageDTO
+
+from webscraper.exceptions import InvalidParameterException
+
+from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
+
+
+class RefreshScheduler(object):
+    """
+    Keeps a watchlist of CNPJs fresh, refreshing each one as often as its data changes.
+
+    The watchlist is a Redis sorted set of the CNPJs scored by when they are due. The workers
+    report every COMPLETED result of a watched CNPJ, which updates its change statistics and
+    schedules its next refresh. Changes are modelled as a Poisson process, whose rate is
+    estimated from the changes seen over the observed time (with a prior of one change per
+    'default_interval'); the next refresh happens when the probability that the CNPJ changed
+    reaches 'change_probability'. Each real change is reported with its field-level diff.
+
+    The scheduler feeds the due CNPJs to the "bulk" lane at 'rate' jobs/s, pausing while the
+    lane is backlogged.
+    """
+
+    WATCHLIST_KEY = "refresh_watchlist"
+    STATS_REDIS_PREFIX = "refresh_stats:"
+    CHANGES_KEY = "refresh_changes"
+    TENANT = "refresh"
+    # Keeps the scripts short enough not to block Redis
+    SCRIPT_CHUNK_SIZE = 1000
+
+    WATCH_SCRIPT = """
+    local added = 0
+    for i = 2, #ARGV do
+        added = added + redis.call('ZADD', KEYS[1], 'NX', ARGV[1], ARGV[i])
+    end
+    return added
+    """
+
+    UNWATCH_SCRIPT = """
+    local removed = 0
+    for i = 2, #ARGV do
+        removed = removed + redis.call('ZREM', KEYS[1], ARGV[i])
+        redis.call('DEL', ARGV[1] .. ARGV[i])
+    end
+    return removed
+    """
+
+    # Takes the due CNPJs and pushes them back by the claim TTL, so they are not taken again
+    # while their job runs, but are if it never completes
+    CLAIM_DUE_SCRIPT = """
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+    for _, cnpj in ipairs(due) do
+        redis.call('ZADD', KEYS[1], 'XX', ARGV[1] + ARGV[3], cnpj)
+    end
+    return due
+    """
+
+    RECORD_SCRIPT = """
+    if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+        return false
+    end
+    local now = tonumber(ARGV[3])
+    local stats = redis.call('HMGET', KEYS[2], 'hash', 'checked_at', 'checks', 'changes', 'observed')
+    local checks = tonumber(stats[3]) or 0
+    local changes = tonumber(stats[4]) or 0
+    local observed = tonumber(stats[5]) or 0
+    local result = 'first'
+    if stats[1] then
+        checks = checks + 1
+        observed = observed + math.max(0, now - tonumber(stats[2]))
+        result = 'unchanged'
+        if stats[1] ~= ARGV[2] then
+            changes = changes + 1
+            result = 'changed'
+            redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[8], '*',
+                'cnpj', ARGV[1], 'detected_at', now, 'diff', ARGV[9])
+        end
+    end
+    local rate = (changes + 1) / (observed + tonumber(ARGV[4]))
+    local interval = math.min(tonumber(ARGV[6]), math.max(tonumber(ARGV[5]), tonumber(ARGV[7]) / rate))
+    redis.call('HSET', KEYS[2], 'hash', ARGV[2], 'checked_at', now, 'checks', checks,
+        'changes', changes, 'observed', observed, 'interval', interval)
+    redis.call('ZADD', KEYS[1], now + interval, ARGV[1])
+    return {result, tostring(interval)}
+    """
+
+    SUMMARY_SCRIPT = """
+    return {redis.call('ZCARD', KEYS[1]), redis.call('ZCOUNT', KEYS[1], '-inf', ARGV[1])}
+    """
+
+    CHANGES_SCRIPT = """
+    return redis.call('XREVRANGE', KEYS[1], '+', '-', 'COUNT', ARGV[1])
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        scrape_service=None,
+        rabbitmq_client=None,
+        rate=10,
+        default_interval=604800,
+        min_interval=86400,
+        max_interval=7776000,
+        change_probability=0.5,
+        max_queue_depth=10000,
+        ignored_fields=(),
+        changes_max_len=100000,
+        claim_ttl=600,
+    ):
+        """
+        :param webscraper.clients.redis.AsyncRedisClient redis_client: Redis client holding the watchlist
+        :param webscraper.services.scrape.ScrapeService scrape_service: Service used to claim the jobs.
+        Only needed to run the scheduler
+        :param webscraper.clients.rabbitmq.AsyncRabbitMQClient rabbitmq_client: Client to publish the jobs
+        with. Only needed to run the scheduler
+        :param float rate: Jobs/s fed to the "bulk" lane. Defaults to 10
+        :param float default_interval: Seconds between refreshes of a CNPJ without statistics.
+        Defaults to 7 days
+        :param float min_interval: Lower bound of the refresh interval. Defaults to 1 day
+        :param float max_interval: Upper bound of the refresh interval. Defaults to 90 days
+        :param float change_probability: Estimated probability of a change that triggers a refresh.
+        Defaults to 0.5
+        :param int max_queue_depth: Ready "bulk" messages above which the feeding pauses,
+        0 disables the check. Defaults to 10000
+        :param list[str] ignored_fields: Fields left out of the change detection
+        :param int changes_max_len: Approximate number of change reports kept. Defaults to 100000
+        :param int claim_ttl: Seconds before a due CNPJ whose job never completed is due again.
+        Defaults to 600
+        :raises webscraper.exceptions.InvalidParameterException: If the rate or intervals are not
+        positive, or change_probability is not between 0 and 1
+        :rtype: None
+        """
+        if min(rate, default_interval, min_interval, max_interval) <= 0:
+            raise InvalidParameterException(
+                "'rate' and the intervals must be greater than 0"
+            )
+        if min_interval > max_interval:
+            raise InvalidParameterException(
+                "'min_interval' must not be greater than 'max_interval'"
+            )
+        if not 0 < change_probability < 1:
+            raise InvalidParameterException(
+                "'change_probability' must be between 0 and 1"
+            )
+
+        self.redis_client = redis_client
+        self.scrape_service = scrape_service
+        self.rabbitmq_client = rabbitmq_client
+        self.rate = rate
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_queue_depth = max_queue_depth
+        self.ignored_fields = frozenset(ignored_fields)
+        self.changes_max_len = changes_max_len
+        self.claim_ttl = claim_ttl
+        # A CNPJ changing at a rate of r changes/s reaches the change probability after rate_factor / r
+        self.rate_factor = -math.log(1 - change_probability)
+        self.prior_seconds = default_interval / self.rate_factor
+
+        self._stopping = asyncio.Event()
+        self.logger = Log.get_logger(__name__)
+
+    @classmethod
+    def from_settings(
+        cls, redis_client, settings, scrape_service=None, rabbitmq_client=None
+    ):
+        """
+        Creates the refresh scheduler configured by the application settings.
+
+        :param webscraper.clients.redis.AsyncRedisClient redis_client: Redis client holding the watchlist
+        :param webscraper.config.Settings settings: Application settings
+        :param webscraper.services.scrape.ScrapeService scrape_service: Service used to claim the jobs
+        :param webscraper.clients.rabbitmq.AsyncRabbitMQClient rabbitmq_client: Client to publish
+        the jobs with
+        :return: The refresh scheduler
+        :rtype: RefreshScheduler
+        """
+        return cls(
+            redis_client,
+            scrape_service=scrape_service,
+            rabbitmq_client=rabbitmq_client,
+            rate=settings.refresh_rate,
+            default_interval=settings.refresh_default_interval,
+            min_interval=settings.refresh_min_interval,
+            max_interval=settings.refresh_max_interval,
+            change_probability=settings.refresh_change_probability,
+            max_queue_depth=settings.refresh_max_queue_depth,
+            ignored_fields=settings.refresh_ignored_fields,
+            changes_max_len=settings.refresh_changes_max_len,
+            claim_ttl=settings.scrape_claim_ttl,
+        )
+
+    def normalize(self, data):
+        """
+        Drops the ignored fields and collapses the whitespace of the values,
+        so layout changes of the page are not reported as changes.
+
+        :param dict data: The scraped data
+        :return: The data compared by the change detection
+        :rtype: dict
+        """
+        return {
+            field: " ".join(str(value).split())
+            for field, value in data.items()
+            if field not in self.ignored_fields
+        }
+
+    @staticmethod
+    def diff(previous, current):
+        """
+        :param dict previous: Normalized data of the previous scrape
+        :param dict current: Normalized data of the new scrape
+        :return: Dictionary of the changed fields to their [previous, current] values,
+        None for a missing field
+        :rtype: dict[str, list]
+        """
+        return {
+            field: [previous.get(field), current.get(field)]
+            for field in sorted(previous.keys() | current.keys())
+            if previous.get(field) != current.get(field)
+        }
+
+    async def watch(self, cnpjs, due_at=None):
+        """
+        Adds CNPJs to the watchlist. CNPJs already watched keep their schedule.
+
+        :param list[str] cnpjs: The CNPJ numbers
+        :param float due_at: Unix timestamp of their first refresh. Defaults to now
+        :return: Number of CNPJs added
+        :rtype: int
+        """
+        return await self._run_chunked(
+            self.WATCH_SCRIPT, cnpjs, due_at if due_at is not None else time.time()
+        )
+
+    async def unwatch(self, cnpjs):
+        """
+        Removes CNPJs from the watchlist along with their statistics.
+
+        :param list[str] cnpjs: The CNPJ numbers
+        :return: Number of CNPJs removed
+        :rtype: int
+        """
+        return await self._run_chunked(
+            self.UNWATCH_SCRIPT, cnpjs, self.STATS_REDIS_PREFIX
+        )
+
+    async def _run_chunked(self, script, cnpjs, first_arg):
+        """
+        :param str script: WATCH_SCRIPT or UNWATCH_SCRIPT
+        :param list[str] cnpjs: The CNPJ numbers
+        :param first_arg: First ARGV of the script
+        :return: Sum of the replies of the script
+        :rtype: int
+        """
+        cnpjs = list(cnpjs)
+        total = 0
+        for start in range(0, len(cnpjs), self.SCRIPT_CHUNK_SIZE):
+            end = start + self.SCRIPT_CHUNK_SIZE
+            total += await self.redis_client.run_script(
+                script, keys=[self.WATCHLIST_KEY], args=[first_arg, *cnpjs[start:end]]
+            )
+        return total
+
+    async def summary(self):
+        """
+        :return: Number of watched CNPJs and how many of them are due
+        :rtype: dict[str, int]
+        """
+        watched, due = await self.redis_client.run_script(
+            self.SUMMARY_SCRIPT, keys=[self.WATCHLIST_KEY], args=[time.time()]
+        )
+        return {"watched": watched, "due": due}
+
+    async def changes(self, limit=100):
+        """
+        :param int limit: Maximum number of reports, the most recent first. Defaults to 100
+        :return: The last changes detected, with the CNPJ, when it was detected and the diff
+        :rtype: list[dict]
+        """
+        entries = await self.redis_client.run_script(
+            self.CHANGES_SCRIPT, keys=[self.CHANGES_KEY], args=[limit]
+        )
+        changes = []
+        for _, fields in entries:
+            report = dict(zip(fields[::2], fields[1::2]))
+            changes.append(
+                {
+                    "cnpj": report[b"cnpj"].decode(),
+                    "detected_at": float(report[b"detected_at"]),
+                    "diff": orjson.loads(report[b"diff"]),
+                }
+            )
+        return changes
+
+    async def record_result(self, cnpj, data, previous=None):
+        """
+        Updates the change statistics of a watched CNPJ with a COMPLETED result and schedules
+        its next refresh. A change is reported only if the normalized data changed.
+
+        :param str cnpj: The CNPJ number
+        :param dict data: The scraped data
+        :param dict previous: Data of the previous scrape, if known, to report the changed fields.
+        When it is not known the change is reported without a diff
+        :return: "first", "changed" or "unchanged", None if the CNPJ is not watched
+        :rtype: str | None
+        """
+        current = self.normalize(data)
+        content_hash = hashlib.sha256(
+            orjson.dumps(current, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+        diff = self.diff(self.normalize(previous), current) if previous else None
+
+        reply = await self.redis_client.run_script(
+            self.RECORD_SCRIPT,
+            keys=[
+                self.WATCHLIST_KEY,
+                f"{self.STATS_REDIS_PREFIX}{cnpj}",
+                self.CHANGES_KEY,
+            ],
+            args=[
+                cnpj,
+                content_hash,
+                time.time(),
+                self.prior_seconds,
+                self.min_interval,
+                self.max_interval,
+                self.rate_factor,
+                self.changes_max_len,
+                orjson.dumps(diff),
+            ],
+        )
+        if reply is None:
+            return None
+
+        result, interval = reply[0].decode(), float(reply[1])
+        Metrics.REFRESH_CHECKS_TOTAL.labels(result=result).inc()
+        if result == "changed":
+            self.logger.info(
+                f"CNPJ {cnpj} changed, fields: {sorted(diff) if diff else 'unknown'}"
+            )
+        self.logger.debug(f"Next refresh of CNPJ {cnpj} in {interval:.0f} seconds")
+        return result
+
+    async def run_forever(self, tick=1):
+        """
+        Feeds the due CNPJs to the "bulk" lane until stop() is called.
+
+        :param float tick: Seconds between two feeding rounds. Defaults to 1
+        :rtype: None
+        """
+        budget = 0.0
+        while not self._stopping.is_set():
+            budget = min(budget + self.rate * tick, max(self.rate * tick, 1))
+            try:
+                if await self._backlogged():
+                    Metrics.REFRESH_PAUSED.set(1)
+                else:
+                    Metrics.REFRESH_PAUSED.set(0)
+                    budget -= await self.feed(int(budget))
+            except Exception as e:
+                self.logger.error(f"Error while feeding the refresh jobs: {e}")
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), tick)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        """
+        Makes run_forever return after the current round.
+
+        :rtype: None
+        """
+        self._stopping.set()
+
+    async def _backlogged(self):
+        """
+        :return: True if the "bulk" queue has 'max_queue_depth' ready messages or more
+        :rtype: bool
+        """
+        if not self.max_queue_depth:
+            return False
+        depths = await self.rabbitmq_client.queue_depths()
+        return (
+            depths.get(self.rabbitmq_client.queue_for("bulk"), 0)
+            >= self.max_queue_depth
+        )
+
+    async def feed(self, limit):
+        """
+        Publishes the jobs of up to 'limit' due CNPJs to the "bulk" lane.
+        CNPJs whose job is already queued are skipped.
+
+        :param int limit: Maximum number of CNPJs to take
+        :return: Number of due CNPJs taken
+        :rtype: int
+        """
+        if limit < 1:
+            return 0
+
+        due = await self.redis_client.run_script(
+            self.CLAIM_DUE_SCRIPT,
+            keys=[self.WATCHLIST_KEY],
+            args=[time.time(), limit, self.claim_ttl],
+        )
+        cnpjs = [cnpj.decode() for cnpj in due]
+        if not cnpjs:
+            return 0
+
+        claimed = await self.scrape_service.claim_jobs(cnpjs, self.claim_ttl)
+        messages = [
+            ScrapeJobMessageDTO(cnpj=cnpj, priority="bulk", tenant=self.TENANT)
+            for cnpj in cnpjs
+            if claimed[cnpj]
+        ]
+        if not messages:
+            return len(cnpjs)
+
+        try:
+            errors = await self.rabbitmq_client.publish_many(messages)
+        except Exception:
+            await self.scrape_service.release_jobs([m.cnpj for m in messages])
+            raise
+
+        failed = [message.cnpj for message, error in zip(messages, errors) if error]
+        if failed:
+            # The watchlist makes them due again once claim_ttl is over, so they are retried then
+            await self.scrape_service.release_jobs(failed)
+            self.logger.warning(
+                f"Failed to publish the refresh jobs of {len(failed)} CNPJ(s): "
+                f"{next(error for error in errors if error)}"
+            )
+
+        Metrics.REFRESH_JOBS_TOTAL.inc(len(messages) - len(failed))
+        return len(cnpjs)
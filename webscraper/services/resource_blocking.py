@@ -0,0 +1,147 @@
+import asyncio
+from urllib.parse import urlsplit
+
+from webscraper.helpers.metrics import Metrics
+
+
+class PageStats(object):
+    """
+    Network usage of a page, reported and reset after each scrape job.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.blocked = 0
+        self.bytes = 0
+        self._pending = set()
+
+    def track(self, page):
+        """
+        Accounts the size of every request finished by a page.
+
+        :param playwright.async_api.Page page: The page to track
+        :rtype: None
+        """
+        page.on("requestfinished", self._on_request_finished)
+
+    def _on_request_finished(self, request):
+        """
+        :param playwright.async_api.Request request: The finished request
+        :rtype: None
+        """
+        self.requests += 1
+        task = asyncio.create_task(request.sizes())
+        self._pending.add(task)
+        task.add_done_callback(self._add_sizes)
+
+    def _add_sizes(self, task):
+        """
+        :param asyncio.Task task: The finished request.sizes() call
+        :rtype: None
+        """
+        self._pending.discard(task)
+        if not task.cancelled() and not task.exception():
+            sizes = task.result()
+            self.bytes += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+
+    async def report(self):
+        """
+        Waits for the pending size lookups, records the job in the metrics and resets the counters.
+
+        :return: None
+        """
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        Metrics.PAGE_BYTES.observe(self.bytes)
+        Metrics.PAGE_REQUESTS_TOTAL.labels(outcome="loaded").inc(self.requests)
+        Metrics.PAGE_REQUESTS_TOTAL.labels(outcome="blocked").inc(self.blocked)
+        self.requests = self.blocked = self.bytes = 0
+
+
+class ResourceBlocker(object):
+    """
+    Request interception of the scrape pages, aborting the requests the extraction does not need.
+
+    Requests are aborted when their resource type is in 'blocked_types' (e.g. images, fonts,
+    stylesheets) or, with 'block_third_party', when their host is neither the target site
+    nor one of its subdomains or of the 'allowed_domains' (e.g. analytics and ads).
+    """
+
+    def __init__(
+        self, scrape_url, blocked_types=(), block_third_party=True, allowed_domains=()
+    ):
+        """
+        :param str scrape_url: URL of the target site, its host is always allowed
+        :param list[str] blocked_types: Playwright resource types to abort
+        :param bool block_third_party: Aborts requests to other domains. Defaults to True
+        :param list[str] allowed_domains: Other domains that are not aborted
+        :rtype: None
+        """
+        self.blocked_types = frozenset(blocked_types)
+        self.block_third_party = block_third_party
+        self.allowed_domains = tuple(
+            domain.lower().lstrip(".")
+            for domain in (urlsplit(scrape_url).hostname, *allowed_domains)
+            if domain
+        )
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Creates the resource blocker configured by the application settings.
+
+        :param webscraper.config.Settings settings: Application settings
+        :return: The resource blocker, None if nothing is blocked
+        :rtype: ResourceBlocker | None
+        """
+        if (
+            not settings.browser_block_resources
+            and not settings.browser_block_third_party
+        ):
+            return None
+        return cls(
+            settings.scrape_url,
+            blocked_types=settings.browser_block_resources,
+            block_third_party=settings.browser_block_third_party,
+            allowed_domains=settings.browser_allowed_domains,
+        )
+
+    def is_blocked(self, url, resource_type):
+        """
+        :param str url: URL of the request
+        :param str resource_type: Playwright resource type of the request
+        :return: True if the request should be aborted
+        :rtype: bool
+        """
+        if resource_type in self.blocked_types:
+            return True
+        if resource_type == "document" or not self.block_third_party:
+            return False
+
+        host = (urlsplit(url).hostname or "").lower()
+        if not host:
+            return False
+        return not any(
+            host == domain or host.endswith(f".{domain}")
+            for domain in self.allowed_domains
+        )
+
+    async def attach(self, page, stats=None):
+        """
+        Intercepts the requests of a page.
+
+        :param playwright.async_api.Page page: The page to intercept
+        :param PageStats stats: Optional stats where the aborted requests are counted
+        :rtype: None
+        """
+
+        async def handle(route):
+            request = route.request
+            if self.is_blocked(request.url, request.resource_type):
+                if stats:
+                    stats.blocked += 1
+                await route.abort("blockedbyclient")
+            else:
+                await route.continue_()
+
+        await page.route("**/*", handle)
@@ -0,0 +1,66 @@
+import random
+
+from webscraper.services.throttle import is_upstream_failure
+
+
+class RetryPolicy(object):
+    """
+    Retry policy of the failed scrape jobs.
+
+    Only failures caused by the target site (timeouts, connection errors, 429/5xx) are
+    retried, after an exponential backoff with "equal jitter": half of the delay is fixed
+    and the other half random, so retries of jobs that failed together spread out.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=5, max_delay=300):
+        """
+        :param int max_attempts: Attempts of a job before it is dead-lettered, 1 disables retries.
+        Defaults to 3
+        :param float base_delay: Seconds before the first retry, doubled on each retry. Defaults to 5
+        :param float max_delay: Upper bound of the delay in seconds. Defaults to 300
+        :rtype: None
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Creates the policy configured by the application settings.
+
+        :param webscraper.config.Settings settings: Application settings
+        :return: The retry policy
+        :rtype: RetryPolicy
+        """
+        return cls(
+            max_attempts=settings.retry_max_attempts,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+        )
+
+    def is_retryable(self, error):
+        """
+        :param Exception error: The error raised while scraping
+        :return: True if the job may succeed when tried again later
+        :rtype: bool
+        """
+        return is_upstream_failure(error)
+
+    def should_retry(self, attempts, error):
+        """
+        :param int attempts: Attempts of the job so far, including the failed one
+        :param Exception error: The error raised by the last attempt
+        :return: True if the job should be retried
+        :rtype: bool
+        """
+        return attempts < self.max_attempts and self.is_retryable(error)
+
+    def delay(self, attempts):
+        """
+        :param int attempts: Attempts of the job so far, including the failed one
+        :return: Seconds to wait before the next attempt
+        :rtype: float
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
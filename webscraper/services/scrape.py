@@ -1,7 +1,22 @@
+import asyncio
+import time
+from collections import deque
+
+import httpx
 from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 from webscraper.models.cache_dto import CacheMessageDTO
 
+from webscraper.exceptions import ScrapeEngineException
+
+from webscraper.services.extraction import DocumentExtractor
+from webscraper.services.cache_policy import CacheTTLPolicy
+from webscraper.services.resource_blocking import PageStats
+
+from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
+
 
 class ScrapeService(object):
     """
@@ -9,18 +24,67 @@ class ScrapeService(object):
     """
 
     SCRAPE_JOB_REDIS_PREFIX = "scrape_job:"
-    DEFAULT_SCRAPE_CACHE_TTL = "3600"
+    SCRAPE_CLAIM_REDIS_PREFIX = "scrape_claim:"
+    SCRAPE_EVENTS_REDIS_PREFIX = "scrape_job_events:"
+    SCRAPE_CALLBACKS_REDIS_PREFIX = "scrape_callbacks:"
+    TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+    IN_FLIGHT_STATUSES = ("IN_PROGRESS", "RETRYING")
 
-    def __init__(self, scrape_url, redis_client=None):
+    def __init__(
+        self,
+        scrape_url,
+        redis_client=None,
+        browser_pool=None,
+        http_engine=None,
+        http_fallback=True,
+        local_cache=None,
+        ttl_policy=None,
+        resource_blocker=None,
+        wait_until="load",
+        reuse_form_page=False,
+        reuse_max_jobs=50,
+        result_store=None,
+    ):
         """
         Initialize the ScrapeService with the URL to scrape.
 
         :param str scrape_url: URL of the page to scrape
         :param webscraper.clients.redis.AsynchRedisClient: An optional Redis client for caching results
+        :param webscraper.clients.browser_pool.BrowserPool browser_pool: An optional pool of long-lived
+        browsers. If not given, a browser is launched for each scrape
+        :param webscraper.services.http_engine.HttpScrapeEngine http_engine: An optional browserless
+        engine. If given, it is tried before Playwright
+        :param bool http_fallback: Falls back to Playwright when the HTTP engine fails. Defaults to True
+        :param webscraper.helpers.lru_cache.TTLCache local_cache: An optional in-process cache of
+        terminal results, checked before Redis
+        :param webscraper.services.cache_policy.CacheTTLPolicy ttl_policy: Expiration policy of the
+        cached jobs. Defaults to CacheTTLPolicy()
+        :param webscraper.services.resource_blocking.ResourceBlocker resource_blocker: An optional
+        interception of the browser requests the extraction does not need
+        :param str wait_until: Event page.goto waits for. Defaults to "load"
+        :param bool reuse_form_page: Keeps the pool pages open across jobs, going back to the form
+        after each one. Only used with a browser pool. Defaults to False
+        :param int reuse_max_jobs: Number of jobs after which a reused page is closed. Defaults to 50
+        :param webscraper.clients.result_store.ResultStore result_store: An optional durable store
+        where COMPLETED results are kept, checked after a Redis miss
         :rtype: None
         """
         self.scrape_url = scrape_url
         self._redis_client = redis_client
+        self._browser_pool = browser_pool
+        self._http_engine = http_engine
+        self._http_fallback = http_fallback
+        self._local_cache = local_cache
+        self._ttl_policy = ttl_policy or CacheTTLPolicy()
+        self._resource_blocker = resource_blocker
+        self._wait_until = wait_until
+        self._reuse_form_page = reuse_form_page and browser_pool is not None
+        self._reuse_max_jobs = reuse_max_jobs
+        self._idle_pages = []
+        self._page_waiters = deque()
+        self._result_store = result_store
+        self._extractor = DocumentExtractor()
+        self.logger = Log.get_logger(__name__)
 
     async def scrape(self, cnpj):
         """
@@ -30,67 +94,511 @@ class ScrapeService(object):
         submits it, waits for the results, and extracts key-value pairs
         from the resulting document.
 
+        When an HTTP engine was given, the form is first posted without a browser and
+        Playwright is only used as a fallback if that fails (e.g. on a challenge page).
+
         :param str cnpj: The CNPJ number to be searched on the page
         :return: A dictionary mapping field titles to their corresponding values
         :rtype: dict
         """
+        if self._http_engine:
+            try:
+                with Metrics.time_stage("http_scrape"):
+                    return await self._http_engine.scrape(cnpj)
+            except (ScrapeEngineException, httpx.HTTPError) as e:
+                if not self._http_fallback:
+                    raise
+                self.logger.warning(
+                    f"HTTP engine failed for CNPJ {cnpj}, falling back to Playwright: {e}"
+                )
+
+        return await self._scrape_with_browser(cnpj)
+
+    async def _scrape_with_browser(self, cnpj):
+        """
+        Perform a web scraping job for a given CNPJ using Playwright.
+
+        When a browser pool was given, the page is opened in an isolated context of
+        one of its long-lived browsers, or an idle page of a previous job is reused.
+        Otherwise a browser is launched for this job only.
+
+        :param str cnpj: The CNPJ number to be searched on the page
+        :return: A dictionary mapping field titles to their corresponding values
+        :rtype: dict
+        """
+        started = time.perf_counter()
+
+        if self._reuse_form_page:
+            return await self._scrape_with_leased_page(cnpj, started)
+
+        if self._browser_pool:
+            async with self._browser_pool.context() as context:
+                page = await context.new_page()
+                stats = await self._prepare_page(page)
+                Metrics.SCRAPE_STAGE_SECONDS.labels(stage="browser_context").observe(
+                    time.perf_counter() - started
+                )
+                try:
+                    return await self._scrape_page(page, cnpj)
+                finally:
+                    await stats.report()
+
         async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
             try:
-                browser = await p.chromium.launch(headless=True)
                 page = await browser.new_page()
+                stats = await self._prepare_page(page)
+                Metrics.SCRAPE_STAGE_SECONDS.labels(stage="browser_launch").observe(
+                    time.perf_counter() - started
+                )
+                try:
+                    return await self._scrape_page(page, cnpj)
+                finally:
+                    await stats.report()
+            finally:
+                await browser.close()
+
+    async def _scrape_with_leased_page(self, cnpj, started):
+        """
+        Runs a job on an idle leased page, left on the form by a previous job, or on a new one.
+        After the job the page goes back to the form and is kept for the next job, unless
+        it failed or served 'reuse_max_jobs' jobs.
+
+        :param str cnpj: The CNPJ number to be searched on the page
+        :param float started: perf_counter() value when the job started
+        :return: A dictionary mapping field titles to their corresponding values
+        :rtype: dict
+        """
+        leased = await self._acquire_leased_page()
+        if leased.stats is not None:
+            Metrics.FORM_PAGE_REUSES_TOTAL.labels(result="reused").inc()
+        else:
+            try:
+                leased.stats = await self._prepare_page(leased.page)
+            except BaseException:
+                await self._close_leased_page(leased)
+                raise
+            Metrics.FORM_PAGE_REUSES_TOTAL.labels(result="new").inc()
+            Metrics.SCRAPE_STAGE_SECONDS.labels(stage="browser_context").observe(
+                time.perf_counter() - started
+            )
+
+        keep = False
+        try:
+            data = await self._scrape_page(leased.page, cnpj, reuse=leased.jobs > 0)
+            leased.jobs += 1
+            if leased.jobs < self._reuse_max_jobs:
+                with Metrics.time_stage("go_back"):
+                    await leased.page.go_back(wait_until=self._wait_until)
+                keep = True
+            return data
+        finally:
+            await leased.stats.report()
+            if keep:
+                self._release_leased_page(leased)
+            else:
+                await self._close_leased_page(leased)
+
+    async def _acquire_leased_page(self):
+        """
+        Takes an idle leased page or leases a new one from the browser pool.
+
+        Idle pages keep their pool slot, so when the pool is full the job waits for a page
+        released by another job instead of for a slot, which would only be freed when a page
+        is closed. A page released while jobs are waiting goes to the oldest of them, and a
+        closed one wakes it up to lease a new page.
+
+        :return: The leased page. Its stats are None if it is new
+        :rtype: webscraper.clients.browser_pool.LeasedPage
+        """
+        while not self._idle_pages and self._browser_pool.exhausted:
+            waiter = asyncio.get_running_loop().create_future()
+            self._page_waiters.append(waiter)
+            try:
+                leased = await waiter
+            except asyncio.CancelledError:
+                # A page handed over right before the cancellation goes to the next job
+                if waiter.done() and not waiter.cancelled():
+                    if waiter.result():
+                        self._release_leased_page(waiter.result())
+                    else:
+                        self._hand_over_page(None)
+                raise
+            finally:
+                if waiter in self._page_waiters:
+                    self._page_waiters.remove(waiter)
+            if leased:
+                return leased
+
+        if self._idle_pages:
+            return self._idle_pages.pop()
 
-                await page.goto(self.scrape_url)
+        try:
+            return await self._browser_pool.lease_page()
+        except BaseException:
+            # The slot taken by the failed lease is free again
+            self._hand_over_page(None)
+            raise
+
+    def _release_leased_page(self, leased):
+        """
+        Hands a page on the form over to the oldest waiting job, or keeps it as idle.
+
+        :param webscraper.clients.browser_pool.LeasedPage leased: The page
+        :rtype: None
+        """
+        if not self._hand_over_page(leased):
+            self._idle_pages.append(leased)
+
+    async def _close_leased_page(self, leased):
+        """
+        Closes a page, giving its slot back to the browser pool, and wakes up the oldest
+        waiting job to lease a new one.
+
+        :param webscraper.clients.browser_pool.LeasedPage leased: The page
+        :rtype: None
+        """
+        try:
+            await leased.close()
+        finally:
+            self._hand_over_page(None)
+
+    def _hand_over_page(self, leased):
+        """
+        :param webscraper.clients.browser_pool.LeasedPage leased: The page given to the oldest
+        waiting job, or None to wake it up to lease a new one
+        :return: True if a job was waiting
+        :rtype: bool
+        """
+        while self._page_waiters:
+            waiter = self._page_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(leased)
+                return True
+        return False
+
+    async def _prepare_page(self, page):
+        """
+        Starts tracking the network usage of a new page and intercepts its requests.
+
+        :param playwright.async_api.Page page: The new page
+        :return: The network usage of the page
+        :rtype: webscraper.services.resource_blocking.PageStats
+        """
+        stats = PageStats()
+        stats.track(page)
+        if self._resource_blocker:
+            await self._resource_blocker.attach(page, stats)
+        return stats
+
+    async def _scrape_page(self, page, cnpj, reuse=False):
+        """
+        Fills and submits the CNPJ form in the given page and extracts the resulting document.
+
+        :param playwright.async_api.Page page: A blank page to run the job on
+        :param str cnpj: The CNPJ number to be searched on the page
+        :param bool reuse: The page may already show the form of a previous job, which is
+        only loaded again if it is missing. Defaults to False
+        :return: A dictionary mapping field titles to their corresponding values
+        :rtype: dict
+        """
+        try:
+            if not reuse or not await page.query_selector("input#tCNPJ"):
+                with Metrics.time_stage("goto"):
+                    await page.goto(self.scrape_url, wait_until=self._wait_until)
+
+            with Metrics.time_stage("form_submit"):
                 await page.click("input#rTipoDocCNPJ")
                 await page.fill("input#tCNPJ", cnpj)
                 await page.click('input[name="btCGC"][type="submit"]')
-                await page.wait_for_selector("div.container.doc", state="visible")
-
-                items = await page.query_selector_all("div.item, div.col.box")
-                data = {}
-
-                for item in items:
 
-                    title_el = await item.query_selector(
-                        "span.label_title, div.label_title, span.label_text:has(strong)"
-                    )
-                    value_el = await item.query_selector(
-                        "span.label_text:not(:has(strong))"
-                    )
+            with Metrics.time_stage("wait_for_selector"):
+                await page.wait_for_selector(
+                    self._extractor.spec["document"], state="visible"
+                )
 
-                    title = await title_el.text_content() if title_el else None
-                    value = await value_el.text_content() if value_el else None
+            with Metrics.time_stage("extraction"):
+                return await self._extractor.from_page(page)
+        except PlaywrightTimeoutError as e:
+            self.logger.error(f"Timeout error during scraping for CNPJ {cnpj}: {e}")
+            raise
 
-                    if title and value:
-                        data[title.strip()] = value.strip()
+    async def close(self):
+        """
+        Closes the idle leased pages, giving their contexts back to the browser pool.
 
-                await browser.close()
-                return data
-            except async_playwright.PlaywrightTimeoutError as e:
-                self.logger.error(f"Timeout error during scraping for CNPJ {cnpj}: {e}")
-                raise
+        :rtype: None
+        """
+        while self._idle_pages:
+            leased = self._idle_pages.pop()
+            try:
+                await leased.close()
+            except Exception as e:
+                self.logger.warning(f"Error while closing a reused page: {e}")
 
-    async def set_cache(self, cnpj, cache):
+    async def set_cache(self, cnpj, cache, release=False):
         """
-        Caches the scraped data in Redis with a key based on the CNPJ.
+        Caches the scraped data in Redis with a key based on the CNPJ, and publishes
+        it to the CNPJ events channel in the same transaction.
+        COMPLETED results are also saved to the result store, if any.
 
         :param str cnpj: The CNPJ number
         :param webscraper.models.cache_dto.CacheMessageDTO cache: The scraped data to cache
+        :param bool release: Also releases the claim of the CNPJ job in the same transaction.
+        Defaults to False
         """
         if self._redis_client:
             key = f"{self.SCRAPE_JOB_REDIS_PREFIX}{cnpj}"
-            await self._redis_client.set_value(key, cache.model_dump(), ttl=3600)
+            delete_keys = (
+                [f"{self.SCRAPE_CLAIM_REDIS_PREFIX}{cnpj}"] if release else None
+            )
+            with Metrics.time_redis("set_cache"):
+                await self._redis_client.set_with_status(
+                    key,
+                    cache.status,
+                    cache.model_dump(),
+                    ttl=self._ttl_policy.ttl(cache.status),
+                    delete_keys=delete_keys,
+                    channel=f"{self.SCRAPE_EVENTS_REDIS_PREFIX}{cnpj}",
+                )
+
+        if self._result_store and cache.status == "COMPLETED":
+            await self._result_store.save(cnpj, cache.data, scraped_at=cache.updated_at)
 
     async def get_cache(self, cnpj):
         """
-        Retrieves cached scraped data from Redis for a given CNPJ.
+        Retrieves cached scraped data from Redis for a given CNPJ,
+        falling back to the last result kept by the result store.
 
         :param str cnpj: The CNPJ number
         :return: The cached scraped data if available, None otherwise
         :rtype: webscraper.models.cache_dto.CacheMessageDTO | None
         """
+        local = self._get_local_cache(cnpj)
+        if local:
+            return local
+
         if self._redis_client:
             key = f"{self.SCRAPE_JOB_REDIS_PREFIX}{cnpj}"
-            cache = await self._redis_client.get_value(key)
+            with Metrics.time_redis("get_cache"):
+                cache = await self._redis_client.get_value(key)
             if cache:
-                return CacheMessageDTO(**cache)
-        return None
+                Metrics.CACHE_LOOKUPS_TOTAL.labels(result="hit").inc()
+                cache = CacheMessageDTO(**cache)
+                self.update_local_cache(self._local_cache, cnpj, cache)
+                return cache
+            Metrics.CACHE_LOOKUPS_TOTAL.labels(result="miss").inc()
+
+        return (await self._get_stored([cnpj])).get(cnpj)
+
+    async def get_cache_many(self, cnpjs):
+        """
+        Retrieves the cached scraped data of many CNPJs with a single Redis round trip,
+        falling back to the result store for the missing ones.
+
+        :param list[str] cnpjs: The CNPJ numbers
+        :return: Dictionary of CNPJ to its cached data, or None if not cached
+        :rtype: dict[str, webscraper.models.cache_dto.CacheMessageDTO | None]
+        """
+        result = {cnpj: self._get_local_cache(cnpj) for cnpj in cnpjs}
+        missing = [cnpj for cnpj, cache in result.items() if cache is None]
+
+        if self._redis_client and missing:
+            keys = [f"{self.SCRAPE_JOB_REDIS_PREFIX}{cnpj}" for cnpj in missing]
+            with Metrics.time_redis("get_cache_many"):
+                caches = await self._redis_client.get_many(keys)
+            hits = 0
+            for cnpj, key in zip(missing, keys):
+                if caches.get(key):
+                    result[cnpj] = CacheMessageDTO(**caches[key])
+                    self.update_local_cache(self._local_cache, cnpj, result[cnpj])
+                    hits += 1
+            Metrics.CACHE_LOOKUPS_TOTAL.labels(result="hit").inc(hits)
+            Metrics.CACHE_LOOKUPS_TOTAL.labels(result="miss").inc(len(missing) - hits)
+
+        missing = [cnpj for cnpj, cache in result.items() if cache is None]
+        result.update(await self._get_stored(missing))
+        return result
+
+    async def _get_stored(self, cnpjs):
+        """
+        Looks up the last results kept by the result store, if any. They are returned as
+        COMPLETED jobs updated when they were last scraped, so the TTL policy tells if they are stale.
+        Errors of the store are logged and treated as misses.
+
+        :param list[str] cnpjs: The CNPJ numbers
+        :return: Dictionary of CNPJ to its stored result, without the CNPJs never stored
+        :rtype: dict[str, webscraper.models.cache_dto.CacheMessageDTO]
+        """
+        if not self._result_store or not cnpjs:
+            return {}
+
+        try:
+            snapshots = await self._result_store.latest_many(cnpjs)
+        except Exception as e:
+            self.logger.error(f"Error while reading the result store: {e}")
+            return {}
+
+        Metrics.RESULT_STORE_LOOKUPS_TOTAL.labels(result="hit").inc(len(snapshots))
+        Metrics.RESULT_STORE_LOOKUPS_TOTAL.labels(result="miss").inc(
+            len(cnpjs) - len(snapshots)
+        )
+        return {
+            cnpj: CacheMessageDTO(
+                status="COMPLETED", data=snapshot.data, updated_at=snapshot.last_seen
+            )
+            for cnpj, snapshot in snapshots.items()
+        }
+
+    def is_stale(self, cache):
+        """
+        :param webscraper.models.cache_dto.CacheMessageDTO cache: The cached job
+        :return: True if the job is COMPLETED but its result should be refreshed
+        :rtype: bool
+        """
+        return self._ttl_policy.is_stale(cache)
+
+    async def enqueue_job(self, message, rabbitmq_client, lease_ttl):
+        """
+        Claims the scraping job of a CNPJ and publishes it, unless it is already queued.
+
+        :param webscraper.models.message_dto.ScrapeJobMessageDTO message: The job to publish
+        :param webscraper.clients.rabbitmq.AsyncRabbitMQClient rabbitmq_client: Client to publish with
+        :param int lease_ttl: Expiration time of the claim in seconds
+        :return: True if the job was published, False if it was already queued
+        :rtype: bool
+        :raises Exception: If publishing fails, after releasing the claim
+        """
+        if not await self.claim_job(message.cnpj, lease_ttl):
+            return False
+
+        try:
+            await rabbitmq_client.publish(message)
+        except Exception:
+            await self.release_job(message.cnpj)
+            raise
+
+        return True
+
+    def _get_local_cache(self, cnpj):
+        """
+        Looks up a CNPJ in the in-process cache, if any.
+
+        :param str cnpj: The CNPJ number
+        :return: The cached terminal result if available, None otherwise
+        :rtype: webscraper.models.cache_dto.CacheMessageDTO | None
+        """
+        if self._local_cache is None:
+            return None
+
+        cache = self._local_cache.get(cnpj)
+        Metrics.LOCAL_CACHE_LOOKUPS_TOTAL.labels(
+            result="hit" if cache else "miss"
+        ).inc()
+        return cache
+
+    @classmethod
+    def update_local_cache(cls, local_cache, cnpj, cache):
+        """
+        Keeps an in-process cache coherent with a new state of a CNPJ job.
+        Only terminal results are cached, any other state invalidates the entry.
+
+        :param webscraper.helpers.lru_cache.TTLCache local_cache: The in-process cache, may be None
+        :param str cnpj: The CNPJ number
+        :param webscraper.models.cache_dto.CacheMessageDTO | dict cache: The new state of the job
+        :rtype: None
+        """
+        if local_cache is None:
+            return
+
+        if isinstance(cache, dict):
+            cache = CacheMessageDTO(**cache)
+
+        if cache.status in cls.TERMINAL_STATUSES:
+            local_cache.set(cnpj, cache)
+        else:
+            local_cache.invalidate(cnpj)
+
+    async def claim_job(self, cnpj, lease_ttl):
+        """
+        Atomically claims the scraping job of a CNPJ, so only one job per CNPJ is queued at a time.
+        The claim expires after 'lease_ttl' seconds in case it is never released.
+
+        :param str cnpj: The CNPJ number
+        :param int lease_ttl: Expiration time of the claim in seconds
+        :return: True if the job was claimed, False if it was already claimed by another request
+        :rtype: bool
+        """
+        if self._redis_client:
+            key = f"{self.SCRAPE_CLAIM_REDIS_PREFIX}{cnpj}"
+            return await self._redis_client.set_value(
+                key, {"status": "QUEUED"}, ttl=lease_ttl, nx=True
+            )
+        return True
+
+    async def release_job(self, cnpj):
+        """
+        Releases the claim of the scraping job of a CNPJ.
+
+        :param str cnpj: The CNPJ number
+        :rtype: None
+        """
+        if self._redis_client:
+            key = f"{self.SCRAPE_CLAIM_REDIS_PREFIX}{cnpj}"
+            await self._redis_client.delete_value(key)
+
+    async def claim_jobs(self, cnpjs, lease_ttl):
+        """
+        Atomically claims the scraping jobs of many CNPJs with a single Redis round trip.
+
+        :param list[str] cnpjs: The CNPJ numbers
+        :param int lease_ttl: Expiration time of the claims in seconds
+        :return: Dictionary of CNPJ to True if its job was claimed, False otherwise
+        :rtype: dict[str, bool]
+        """
+        if not self._redis_client:
+            return dict.fromkeys(cnpjs, True)
+
+        mapping = {
+            f"{self.SCRAPE_CLAIM_REDIS_PREFIX}{cnpj}": {"status": "QUEUED"}
+            for cnpj in cnpjs
+        }
+        claimed = await self._redis_client.set_many(mapping, ttl=lease_ttl, nx=True)
+        return {cnpj: claimed[key] for cnpj, key in zip(cnpjs, mapping)}
+
+    async def release_jobs(self, cnpjs):
+        """
+        Releases the claims of the scraping jobs of many CNPJs.
+
+        :param list[str] cnpjs: The CNPJ numbers
+        :rtype: None
+        """
+        if self._redis_client:
+            keys = [f"{self.SCRAPE_CLAIM_REDIS_PREFIX}{cnpj}" for cnpj in cnpjs]
+            await self._redis_client.delete_value(*keys)
+
+    async def add_callback(self, cnpj, callback_url, ttl):
+        """
+        Registers a URL to be notified with the result of the scraping job of a CNPJ.
+
+        :param str cnpj: The CNPJ number
+        :param str callback_url: URL the result is POSTed to
+        :param int ttl: Expiration time of the registered callbacks in seconds
+        :rtype: None
+        """
+        if self._redis_client:
+            key = f"{self.SCRAPE_CALLBACKS_REDIS_PREFIX}{cnpj}"
+            await self._redis_client.add_members(key, callback_url, ttl=ttl)
+
+    async def pop_callbacks(self, cnpj):
+        """
+        Retrieves and removes the URLs registered to be notified about a CNPJ.
+
+        :param str cnpj: The CNPJ number
+        :return: The registered callback URLs
+        :rtype: set[str]
+        """
+        if self._redis_client:
+            key = f"{self.SCRAPE_CALLBACKS_REDIS_PREFIX}{cnpj}"
+            return await self._redis_client.pop_members(key)
+        return set()
@@ -0,0 +1,357 @@
+import asyncio
+
+import httpx
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from webscraper.exceptions import InvalidParameterException
+
+from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
+
+
+def is_upstream_failure(error):
+    """
+    Tells whether an error of a scrape means the target site is struggling,
+    as opposed to an error of the job itself.
+
+    :param Exception error: The error raised while scraping
+    :return: True for timeouts, connection errors and 429/5xx responses
+    :rtype: bool
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (PlaywrightTimeoutError, httpx.TransportError))
+
+
+class RateLimiter(object):
+    """
+    Token bucket shared by all the workers through Redis, limiting the requests to the target site.
+
+    The rate adapts AIMD-style: every successful scrape increases it by about 'increase'
+    requests/s per second, and every upstream failure multiplies it by 'decrease', at most
+    once per 'cooldown' seconds so a burst of failures from many workers counts once.
+    """
+
+    BUCKET_SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'rate', 'tokens', 'ts')
+    local rate = tonumber(state[1]) or tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local tokens = tonumber(state[2]) or burst
+    local ts = tonumber(state[3]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return tostring(wait)
+    """
+
+    ADAPT_SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'rate', 'decreased_at')
+    local rate = tonumber(state[1]) or tonumber(ARGV[2])
+    if ARGV[1] == 'increase' then
+        rate = math.min(tonumber(ARGV[4]), rate + tonumber(ARGV[5]) / rate)
+    else
+        if now - (tonumber(state[2]) or 0) < tonumber(ARGV[7]) then
+            return tostring(rate)
+        end
+        rate = math.max(tonumber(ARGV[3]), rate * tonumber(ARGV[6]))
+        redis.call('HSET', KEYS[1], 'decreased_at', now)
+    end
+    redis.call('HSET', KEYS[1], 'rate', rate)
+    redis.call('EXPIRE', KEYS[1], ARGV[8])
+    return tostring(rate)
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        key="scrape_rate_limit",
+        initial_rate=5,
+        min_rate=0.2,
+        max_rate=50,
+        burst=5,
+        increase=0.5,
+        decrease=0.5,
+        cooldown=5,
+        state_ttl=86400,
+    ):
+        """
+        :param webscraper.clients.redis.AsyncRedisClient redis_client: Redis client holding the bucket
+        :param str key: Redis key of the bucket
+        :param float initial_rate: Requests/s allowed before any adaptation. Defaults to 5
+        :param float min_rate: Lower bound of the adapted rate. Defaults to 0.2
+        :param float max_rate: Upper bound of the adapted rate. Defaults to 50
+        :param int burst: Maximum number of tokens in the bucket. Defaults to 5
+        :param float increase: Additive increase of the rate, in requests/s per second. Defaults to 0.5
+        :param float decrease: Multiplicative decrease of the rate on failures. Defaults to 0.5
+        :param float cooldown: Minimum seconds between two decreases. Defaults to 5
+        :param int state_ttl: Seconds the bucket state is kept after its last use. Defaults to 86400
+        :raises webscraper.exceptions.InvalidParameterException: If the rates or burst are not positive,
+        or decrease is not between 0 and 1
+        :rtype: None
+        """
+        if min(initial_rate, min_rate, max_rate, burst) <= 0 or min_rate > max_rate:
+            raise InvalidParameterException(
+                "Rates and 'burst' must be greater than 0 and 'min_rate' lower than 'max_rate'"
+            )
+        if not 0 < decrease < 1:
+            raise InvalidParameterException("'decrease' must be between 0 and 1")
+
+        self.redis_client = redis_client
+        self.key = key
+        self.initial_rate = min(max(initial_rate, min_rate), max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.state_ttl = state_ttl
+        self.logger = Log.get_logger(__name__)
+
+    @classmethod
+    def from_settings(cls, redis_client, settings):
+        """
+        Creates the rate limiter configured by the application settings.
+
+        :param webscraper.clients.redis.AsyncRedisClient redis_client: Redis client holding the bucket
+        :param webscraper.config.Settings settings: Application settings
+        :return: The rate limiter
+        :rtype: RateLimiter
+        """
+        return cls(
+            redis_client,
+            initial_rate=settings.upstream_rate_initial,
+            min_rate=settings.upstream_rate_min,
+            max_rate=settings.upstream_rate_max,
+            burst=settings.upstream_rate_burst,
+            increase=settings.upstream_rate_increase,
+            decrease=settings.upstream_rate_decrease,
+        )
+
+    async def acquire(self):
+        """
+        Waits until a token of the shared bucket is available and takes it.
+
+        :return: Seconds spent waiting
+        :rtype: float
+        """
+        waited = 0.0
+        while True:
+            wait = float(
+                await self.redis_client.run_script(
+                    self.BUCKET_SCRIPT,
+                    keys=[self.key],
+                    args=[self.initial_rate, self.burst, self.state_ttl],
+                )
+            )
+            if not wait:
+                Metrics.RATE_LIMIT_WAIT_SECONDS.observe(waited)
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    async def record_success(self):
+        """
+        Additively increases the shared rate.
+
+        :return: The new rate in requests/s
+        :rtype: float
+        """
+        return await self._adapt("increase")
+
+    async def record_failure(self):
+        """
+        Multiplicatively decreases the shared rate, unless it was decreased within the cooldown.
+
+        :return: The new rate in requests/s
+        :rtype: float
+        """
+        rate = await self._adapt("decrease")
+        self.logger.warning(
+            f"Upstream failure, rate limit is now {rate:.2f} requests/s"
+        )
+        return rate
+
+    async def _adapt(self, mode):
+        """
+        :param str mode: "increase" or "decrease"
+        :return: The new rate in requests/s
+        :rtype: float
+        """
+        rate = float(
+            await self.redis_client.run_script(
+                self.ADAPT_SCRIPT,
+                keys=[self.key],
+                args=[
+                    mode,
+                    self.initial_rate,
+                    self.min_rate,
+                    self.max_rate,
+                    self.increase,
+                    self.decrease,
+                    self.cooldown,
+                    self.state_ttl,
+                ],
+            )
+        )
+        Metrics.UPSTREAM_RATE_LIMIT.set(rate)
+        return rate
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker shared by all the workers through Redis.
+
+    It opens after 'failure_threshold' upstream failures in a row and stays open for
+    'open_seconds', ignoring the failures of the jobs that were already running. Then a
+    single worker is let through as a probe: a success closes the circuit, a failure
+    opens it again. A probe that never reports back is replaced after 'open_seconds'.
+    """
+
+    CHECK_SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'state', 'opened_until')
+    local opened_until = tonumber(state[2]) or 0
+    if now < opened_until then
+        return tostring(opened_until - now)
+    end
+    if state[1] == 'open' or state[1] == 'probing' then
+        redis.call('HSET', KEYS[1], 'state', 'probing', 'opened_until', now + tonumber(ARGV[1]))
+    end
+    return '0'
+    """
+
+    RECORD_SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    if ARGV[1] == 'success' then
+        redis.call('HSET', KEYS[1], 'state', 'closed', 'failures', 0, 'opened_until', 0)
+        return '0'
+    end
+    local state = redis.call('HMGET', KEYS[1], 'state', 'failures')
+    if state[1] == 'open' then
+        return '0'
+    end
+    local failures = (tonumber(state[2]) or 0) + 1
+    if state[1] == 'probing' or failures >= tonumber(ARGV[2]) then
+        redis.call('HSET', KEYS[1], 'state', 'open', 'failures', 0,
+            'opened_until', now + tonumber(ARGV[3]))
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+        return ARGV[3]
+    end
+    redis.call('HSET', KEYS[1], 'failures', failures)
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    return '0'
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        key="scrape_circuit_breaker",
+        failure_threshold=5,
+        open_seconds=30,
+        state_ttl=86400,
+    ):
+        """
+        :param webscraper.clients.redis.AsyncRedisClient redis_client: Redis client holding the state
+        :param str key: Redis key of the circuit state
+        :param int failure_threshold: Upstream failures in a row that open the circuit. Defaults to 5
+        :param float open_seconds: Seconds the circuit stays open before a probe. Defaults to 30
+        :param int state_ttl: Seconds the state is kept after its last failure. Defaults to 86400
+        :raises webscraper.exceptions.InvalidParameterException: If the threshold or open_seconds
+        are lower than 1
+        :rtype: None
+        """
+        if failure_threshold < 1 or open_seconds < 1:
+            raise InvalidParameterException(
+                "'failure_threshold' and 'open_seconds' must be greater than 0"
+            )
+
+        self.redis_client = redis_client
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state_ttl = state_ttl
+        self.logger = Log.get_logger(__name__)
+
+    @classmethod
+    def from_settings(cls, redis_client, settings):
+        """
+        Creates the circuit breaker configured by the application settings.
+
+        :param webscraper.clients.redis.AsyncRedisClient redis_client: Redis client holding the state
+        :param webscraper.config.Settings settings: Application settings
+        :return: The circuit breaker
+        :rtype: CircuitBreaker
+        """
+        return cls(
+            redis_client,
+            failure_threshold=settings.upstream_circuit_threshold,
+            open_seconds=settings.upstream_circuit_open_seconds,
+        )
+
+    async def check(self):
+        """
+        Checks whether requests may go through. When the open period just ended,
+        the caller takes the probe and the circuit stays open for the others.
+
+        :return: Seconds until the circuit may close, 0 if the caller may go through
+        :rtype: float
+        """
+        remaining = float(
+            await self.redis_client.run_script(
+                self.CHECK_SCRIPT, keys=[self.key], args=[self.open_seconds]
+            )
+        )
+        Metrics.CIRCUIT_BREAKER_OPEN.set(1 if remaining else 0)
+        return remaining
+
+    async def record_success(self):
+        """
+        Closes the circuit and resets the failure count.
+
+        :rtype: None
+        """
+        await self._record("success")
+
+    async def record_failure(self):
+        """
+        Counts an upstream failure, opening the circuit at the threshold or after a failed probe.
+
+        :rtype: None
+        """
+        if await self._record("failure"):
+            Metrics.CIRCUIT_BREAKER_OPEN.set(1)
+            self.logger.warning(
+                f"Circuit breaker opened for {self.open_seconds} seconds"
+            )
+
+    async def _record(self, outcome):
+        """
+        :param str outcome: "success" or "failure"
+        :return: Seconds the circuit was opened for, 0 if it was not opened
+        :rtype: float
+        """
+        return float(
+            await self.redis_client.run_script(
+                self.RECORD_SCRIPT,
+                keys=[self.key],
+                args=[
+                    outcome,
+                    self.failure_threshold,
+                    self.open_seconds,
+                    self.state_ttl,
+                ],
+            )
+        )
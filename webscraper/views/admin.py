@@ -0,0 +1,300 @@
+import secrets
+from typing import Literal, Optional
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from webscraper.exceptions import InvalidParameterException
+from webscraper.services.export import ResultExporter
+from webscraper.helpers.views_helper import ViewsHelper
+from webscraper.models.batch_dto import BatchRequestDTO
+from webscraper.models.response_dto import BaseResponse
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def _check_token(request, token):
+    """
+    Checks the admin token of a request.
+
+    :param fastapi.Request request: The request being handled
+    :param str token: Token sent in the X-Admin-Token header
+    :return: An error response if the request is not allowed, None otherwise
+    :rtype: fastapi.responses.Response | None
+    """
+    expected = request.app.state.settings.admin_token
+    if not expected:
+        return ViewsHelper.make_response(
+            message="Admin endpoints are disabled", status="error", http_code=403
+        )
+    if not token or not secrets.compare_digest(token, expected):
+        return ViewsHelper.make_response(
+            message="Invalid admin token", status="error", http_code=401
+        )
+    return None
+
+
+@router.get(
+    "/dead-letters",
+    response_model=BaseResponse,
+    responses={
+        200: {"description": "Returns the jobs in the dead-letter queue"},
+        401: {"description": "Invalid admin token"},
+        403: {"description": "Admin endpoints are disabled"},
+        500: {"description": "Internal server error"},
+    },
+)
+async def dead_letters(
+    request: Request,
+    limit: int = 100,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint listing the scraping jobs that ran out of retries, oldest first,
+    without removing them from the dead-letter queue.
+    """
+
+    error = _check_token(request, x_admin_token)
+    if error:
+        return error
+
+    try:
+        bodies = await request.app.state.rabbitmq_client.get_dead(max(limit, 0))
+    except Exception as e:
+        return ViewsHelper.make_response(
+            message=f"Failed to read the dead-letter queue: {str(e)}",
+            status="error",
+            http_code=500,
+        )
+
+    return ViewsHelper.make_response(data=bodies)
+
+
+@router.post(
+    "/dead-letters/replay",
+    response_model=BaseResponse,
+    responses={
+        200: {"description": "Returns the replayed jobs"},
+        401: {"description": "Invalid admin token"},
+        403: {"description": "Admin endpoints are disabled"},
+        500: {"description": "Internal server error"},
+    },
+)
+async def replay_dead_letters(
+    request: Request,
+    limit: int = 100,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint moving up to 'limit' jobs of the dead-letter queue back into their lane queues,
+    with their attempts reset.
+    """
+
+    error = _check_token(request, x_admin_token)
+    if error:
+        return error
+
+    try:
+        bodies = await request.app.state.rabbitmq_client.replay_dead(max(limit, 0))
+    except Exception as e:
+        return ViewsHelper.make_response(
+            message=f"Failed to replay the dead-letter queue: {str(e)}",
+            status="error",
+            http_code=500,
+        )
+
+    return ViewsHelper.make_response(
+        data=bodies, message=f"Replayed {len(bodies)} job(s)"
+    )
+
+
+@router.post(
+    "/refresh/watchlist",
+    response_model=BaseResponse,
+    responses={
+        200: {"description": "Returns how many CNPJs were added to the watchlist"},
+        401: {"description": "Invalid admin token"},
+        403: {"description": "Admin endpoints are disabled"},
+        422: {"description": "Too many or invalid CNPJs"},
+    },
+)
+async def watch(
+    request: Request,
+    batch: BatchRequestDTO,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint adding CNPJs to the watchlist of the refresh scheduler. They are due right away,
+    the CNPJs already watched keep their schedule.
+    """
+
+    error = _check_token(request, x_admin_token)
+    if error:
+        return error
+
+    cnpjs, error = _validate_watchlist_batch(request, batch)
+    if error:
+        return error
+
+    added = await request.app.state.refresh_scheduler.watch(cnpjs)
+    return ViewsHelper.make_response(
+        data={"added": added}, message=f"Watching {added} new CNPJ(s)"
+    )
+
+
+@router.delete(
+    "/refresh/watchlist",
+    response_model=BaseResponse,
+    responses={
+        200: {"description": "Returns how many CNPJs were removed from the watchlist"},
+        401: {"description": "Invalid admin token"},
+        403: {"description": "Admin endpoints are disabled"},
+        422: {"description": "Too many or invalid CNPJs"},
+    },
+)
+async def unwatch(
+    request: Request,
+    batch: BatchRequestDTO,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint removing CNPJs from the watchlist of the refresh scheduler, with their statistics.
+    """
+
+    error = _check_token(request, x_admin_token)
+    if error:
+        return error
+
+    cnpjs, error = _validate_watchlist_batch(request, batch)
+    if error:
+        return error
+
+    removed = await request.app.state.refresh_scheduler.unwatch(cnpjs)
+    return ViewsHelper.make_response(data={"removed": removed})
+
+
+def _validate_watchlist_batch(request, batch):
+    """
+    :param fastapi.Request request: The request being handled
+    :param webscraper.models.batch_dto.BatchRequestDTO batch: The CNPJs sent
+    :return: The sanitized CNPJs, and an error response if the batch is not valid
+    :rtype: tuple[list[str], fastapi.responses.Response | None]
+    """
+    batch_max_size = request.app.state.settings.batch_max_size
+    if len(batch.cnpjs) > batch_max_size:
+        return [], ViewsHelper.make_response(
+            message=f"Batches are limited to {batch_max_size} CNPJs",
+            status="error",
+            http_code=422,
+        )
+
+    validated = ViewsHelper.validate_cnpjs(batch.cnpjs)
+    invalid = [raw_cnpj for raw_cnpj, message in validated if message is None]
+    if invalid:
+        return [], ViewsHelper.make_response(
+            data=invalid, message="Invalid CNPJ format", status="error", http_code=422
+        )
+    return list({message.cnpj: None for _, message in validated}), None
+
+
+@router.get(
+    "/refresh/status",
+    response_model=BaseResponse,
+    responses={
+        200: {
+            "description": "Returns the size of the watchlist and how many CNPJs are due"
+        },
+        401: {"description": "Invalid admin token"},
+        403: {"description": "Admin endpoints are disabled"},
+    },
+)
+async def refresh_status(
+    request: Request,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint with the number of watched CNPJs and how many of them are due for a refresh.
+    """
+
+    error = _check_token(request, x_admin_token)
+    if error:
+        return error
+
+    return ViewsHelper.make_response(
+        data=await request.app.state.refresh_scheduler.summary()
+    )
+
+
+@router.get(
+    "/refresh/changes",
+    response_model=BaseResponse,
+    responses={
+        200: {
+            "description": "Returns the last changes detected, the most recent first"
+        },
+        401: {"description": "Invalid admin token"},
+        403: {"description": "Admin endpoints are disabled"},
+    },
+)
+async def refresh_changes(
+    request: Request,
+    limit: int = 100,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint listing the changes detected in the watched CNPJs, with the changed fields and their
+    previous and current values. The diff is null when the previous data was no longer available.
+    """
+
+    error = _check_token(request, x_admin_token)
+    if error:
+        return error
+
+    changes = await request.app.state.refresh_scheduler.changes(max(limit, 0))
+    return ViewsHelper.make_response(data=changes)
+
+
+@router.get(
+    "/export",
+    responses={
+        200: {"description": "Streams the results in the requested format"},
+        401: {"description": "Invalid admin token"},
+        403: {"description": "Admin endpoints are disabled"},
+        422: {"description": "Invalid export options"},
+    },
+)
+async def export_results(
+    request: Request,
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    source: Literal["cache", "store"] = "cache",
+    status: Optional[list[str]] = Query(default=None),
+    prefix: str = "",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    fields: Optional[list[str]] = Query(default=None),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint streaming all the results of the cache (Redis) or of the result store, filtered
+    by status, CNPJ prefix and update time window (Unix timestamps). The output is written
+    in chunks while the results are read, so any number of results can be exported.
+    With 'fields', CSV and Parquet get a column per data field instead of a JSON 'data' column.
+    """
+
+    error = _check_token(request, x_admin_token)
+    if error:
+        return error
+
+    state = request.app.state
+    exporter = ResultExporter(
+        state.redis_client, state.result_store, state.settings.export_batch_size
+    )
+    try:
+        exporter.validate(format, source, prefix)
+    except InvalidParameterException as e:
+        return ViewsHelper.make_response(message=str(e), status="error", http_code=422)
+
+    batches = exporter.records(source, status, prefix, since, until)
+    return StreamingResponse(
+        exporter.stream(format, batches, fields),
+        media_type=ResultExporter.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="results.{format}"'},
+    )
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
+
+router = APIRouter(tags=["metrics"])
+logger = Log.get_logger(__name__)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """
+    Endpoint exposing the Prometheus metrics of the API.
+    The depth of the queues is read from RabbitMQ on every scrape.
+    """
+
+    try:
+        depths = await request.app.state.rabbitmq_client.queue_depths()
+        for queue, depth in depths.items():
+            Metrics.QUEUE_DEPTH.labels(queue=queue).set(depth)
+    except Exception as e:
+        logger.error(f"Error while reading the queue depths: {e}")
+
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
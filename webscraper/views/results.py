@@ -1,7 +1,12 @@
-import pydantic
-from fastapi import APIRouter, Request
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse
+from webscraper.models.cache_dto import CacheMessageDTO
 from webscraper.models.message_dto import ScrapeJobMessageDTO
+from webscraper.models.batch_dto import BatchRequestDTO, BatchItemDTO
 from webscraper.services.scrape import ScrapeService
+from webscraper.helpers.cnpj import normalize_cnpj
 from webscraper.helpers.views_helper import ViewsHelper
 from webscraper.models.response_dto import BaseResponse
 
@@ -19,34 +24,251 @@ router = APIRouter(prefix="/results", tags=["results"])
 )
 async def results(
     request: Request,
+    background_tasks: BackgroundTasks,
     task_id: str,
+    wait: float = 0,
 ):
     """
     Endpoint to retrieve scraping results for a given task ID.
     The task ID is a cnpj in this context.
+
+    With 'wait', the request is held for up to that many seconds until the job
+    finishes, instead of returning an in-progress status right away.
+    Stale results are returned as well, and a refresh job is queued after the response.
     """
 
-    try:
-        message = ScrapeJobMessageDTO(cnpj=task_id)
-    except pydantic.ValidationError:
+    cnpj = normalize_cnpj(task_id)
+    if cnpj is None:
         return ViewsHelper.make_response(
             message="Invalid CNPJ format",
             status="error",
             http_code=422,
         )
 
-    service = ScrapeService(
-        request.app.state.settings.scrape_url,
-        request.app.state.redis_client,
-    )
+    settings = request.app.state.settings
+    service = ViewsHelper.scrape_service(request)
+    wait = min(max(wait, 0), settings.results_max_wait)
 
-    data = await service.get_cache(cnpj=message.cnpj)
+    with request.app.state.job_events.subscribe(cnpj) as events:
+        data = await service.get_cache(cnpj=cnpj)
+
+        if wait and (not data or data.status not in ScrapeService.TERMINAL_STATUSES):
+            data = await _wait_for_result(events, data, wait)
 
     if not data:
         return ViewsHelper.make_response(
-            message=f"No job found for CNPJ {message.cnpj}",
+            message=f"No job found for CNPJ {cnpj}",
+            status="error",
+            http_code=404,
+        )
+
+    if service.is_stale(data):
+        background_tasks.add_task(
+            _refresh_stale_result,
+            service,
+            ScrapeJobMessageDTO(cnpj=cnpj, priority="bulk"),
+            request.app.state.rabbitmq_client,
+            settings.scrape_claim_ttl,
+        )
+        return ViewsHelper.make_raw_response(
+            data.json_bytes(),
+            message=f"Stale result for CNPJ {cnpj}, refresh queued",
+        )
+
+    return ViewsHelper.make_raw_response(data.json_bytes())
+
+
+async def _refresh_stale_result(service, message, rabbitmq_client, lease_ttl):
+    """
+    Queues a new scraping job for a stale result, unless one is already queued.
+
+    :param webscraper.services.scrape.ScrapeService service: The scrape service
+    :param webscraper.models.message_dto.ScrapeJobMessageDTO message: The job to queue
+    :param webscraper.clients.rabbitmq.AsyncRabbitMQClient rabbitmq_client: Client to publish with
+    :param int lease_ttl: Expiration time of the claim in seconds
+    :rtype: None
+    """
+    try:
+        await service.enqueue_job(message, rabbitmq_client, lease_ttl)
+    except Exception as e:
+        service.logger.error(
+            f"Failed to refresh stale result of CNPJ {message.cnpj}: {e}"
+        )
+
+
+async def _wait_for_result(events, data, timeout):
+    """
+    Waits for the job events until a terminal status is received or the timeout expires.
+
+    :param asyncio.Queue events: Queue subscribed to the events of the CNPJ
+    :param webscraper.models.cache_dto.CacheMessageDTO data: The current cached job, if any
+    :param float timeout: Maximum seconds to wait
+    :return: The last known state of the job
+    :rtype: webscraper.models.cache_dto.CacheMessageDTO | None
+    """
+    try:
+        async with asyncio.timeout(timeout):
+            while not data or data.status not in ScrapeService.TERMINAL_STATUSES:
+                data = CacheMessageDTO(**await events.get())
+    except TimeoutError:
+        pass
+    return data
+
+
+@router.get(
+    "/{task_id}/history",
+    response_model=BaseResponse,
+    responses={
+        200: {
+            "description": "Returns the versions of the result, the most recent first"
+        },
+        404: {"description": "The result store is disabled"},
+        422: {"description": "Invalid CNPJ format"},
+    },
+)
+async def results_history(
+    request: Request,
+    task_id: str,
+    since: Optional[float] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """
+    Endpoint listing the versions of the result of a CNPJ kept by the result store.
+    A new version is only kept when the scraped data changed, with 'since' (Unix timestamp)
+    the versions last seen before it are left out.
+    """
+
+    cnpj = normalize_cnpj(task_id)
+    if cnpj is None:
+        return ViewsHelper.make_response(
+            message="Invalid CNPJ format",
+            status="error",
+            http_code=422,
+        )
+
+    result_store = request.app.state.result_store
+    if not result_store:
+        return ViewsHelper.make_response(
+            message="The result store is disabled",
             status="error",
             http_code=404,
         )
 
-    return ViewsHelper.make_response(data=data)
+    snapshots = await result_store.history(cnpj, since=since, limit=limit)
+    return ViewsHelper.make_response(data=snapshots)
+
+
+@router.get(
+    "/{task_id}/stream",
+    responses={
+        200: {"description": "Server-sent events with every status change of the job"},
+        422: {"description": "Invalid CNPJ format"},
+    },
+)
+async def results_stream(
+    request: Request,
+    task_id: str,
+):
+    """
+    Endpoint streaming the status of the scraping job of a CNPJ as server-sent events.
+    The stream ends once the job reaches a terminal status.
+    """
+
+    cnpj = normalize_cnpj(task_id)
+    if cnpj is None:
+        return ViewsHelper.make_response(
+            message="Invalid CNPJ format",
+            status="error",
+            http_code=422,
+        )
+
+    settings = request.app.state.settings
+    service = ViewsHelper.scrape_service(request)
+    job_events = request.app.state.job_events
+
+    async def stream():
+        with job_events.subscribe(cnpj) as events:
+            data = await service.get_cache(cnpj=cnpj)
+
+            while True:
+                if data:
+                    yield f"event: status\ndata: {data.model_dump_json()}\n\n"
+                    if data.status in ScrapeService.TERMINAL_STATUSES:
+                        return
+
+                try:
+                    event = await asyncio.wait_for(
+                        events.get(), settings.results_stream_keepalive
+                    )
+                    data = CacheMessageDTO(**event)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    data = None
+                    yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@router.post(
+    "/batch",
+    response_model=BaseResponse,
+    responses={
+        200: {"description": "Returns the scraping result of each CNPJ"},
+        422: {"description": "Too many CNPJs in a single batch"},
+        500: {"description": "Internal server error"},
+    },
+)
+async def results_batch(
+    request: Request,
+    batch: BatchRequestDTO,
+):
+    """
+    Endpoint to retrieve the scraping results of many CNPJs with a single Redis round trip.
+    Stale results are flagged in the item message, refreshing them is up to POST /scrape/batch.
+    """
+
+    settings = request.app.state.settings
+
+    if len(batch.cnpjs) > settings.batch_max_size:
+        return ViewsHelper.make_response(
+            message=f"Batches are limited to {settings.batch_max_size} CNPJs",
+            status="error",
+            http_code=422,
+        )
+
+    validated = ViewsHelper.validate_cnpjs(batch.cnpjs)
+
+    service = ViewsHelper.scrape_service(request)
+    caches = await service.get_cache_many(
+        list({message.cnpj for _, message in validated if message is not None})
+    )
+
+    items = []
+    for raw_cnpj, message in validated:
+        if message is None:
+            item = BatchItemDTO(
+                cnpj=raw_cnpj, status="INVALID", message="Invalid CNPJ format"
+            )
+        elif not caches[message.cnpj]:
+            item = BatchItemDTO(
+                cnpj=message.cnpj,
+                status="NOT_FOUND",
+                message=f"No job found for CNPJ {message.cnpj}",
+            )
+        else:
+            item = BatchItemDTO(
+                cnpj=message.cnpj,
+                status=caches[message.cnpj].status,
+                message=(
+                    "Stale result" if service.is_stale(caches[message.cnpj]) else None
+                ),
+                data=caches[message.cnpj].data,
+            )
+        items.append(item)
+
+    return ViewsHelper.make_response(data=items)
@@ -1,6 +1,9 @@
 import pydantic
-from fastapi import APIRouter, Request
+from typing import Literal, Optional
+from fastapi import APIRouter, Header, Request
 from webscraper.models.message_dto import ScrapeJobMessageDTO
+from webscraper.models.batch_dto import BatchRequestDTO, BatchItemDTO
+from webscraper.services.scrape import ScrapeService
 from webscraper.helpers.views_helper import ViewsHelper
 from webscraper.models.response_dto import BaseResponse
 
@@ -12,37 +15,205 @@ router = APIRouter(prefix="/scrape", tags=["scraping"])
     response_model=BaseResponse,
     responses={
         200: {"description": "Scraping job created successfully"},
-        422: {"description": "Invalid CNPJ format"},
+        422: {"description": "Invalid CNPJ or callback URL format"},
         500: {"description": "Internal server error"},
     },
 )
 async def scrape(
     request: Request,
     cnpj: str,
+    callback_url: Optional[str] = None,
+    priority: Literal["interactive", "bulk"] = "interactive",
+    x_tenant_id: Optional[str] = Header(default=None),
 ):
     """
     Endpoint to create a scraping job for a given CNPJ.
     Sends a message to RabbitMQ to initiate the scraping process.
+
+    If a fresh completed result is cached it is returned right away, and a stale one is
+    returned while a refresh job is queued. A recently failed job is returned as is until
+    its negative cache expires. If a job for the same CNPJ is already queued or in
+    progress no new message is sent.
+    When a callback URL is given, the result is POSTed to it once the job finishes.
+
+    Jobs are queued in the "interactive" lane unless another priority is given, and are
+    scheduled fairly across the tenants identified by the X-Tenant-ID header.
     """
 
     try:
-        message = ScrapeJobMessageDTO(cnpj=cnpj)
+        message = ScrapeJobMessageDTO(
+            cnpj=cnpj,
+            callback_url=callback_url,
+            priority=priority,
+            tenant=x_tenant_id,
+        )
     except pydantic.ValidationError:
         return ViewsHelper.make_response(
-            message="Invalid CNPJ format",
+            message="Invalid CNPJ or callback URL format",
             status="error",
             http_code=422,
         )
 
-    rabbitmq_client = request.app.state.rabbitmq_client
+    service = ViewsHelper.scrape_service(request)
+
+    settings = request.app.state.settings
+    cache = await service.get_cache(cnpj=message.cnpj)
+    stale = bool(cache) and service.is_stale(cache)
+
+    if cache and cache.status == "COMPLETED" and not stale:
+        return ViewsHelper.make_response(
+            data=cache, message=f"Cached result found for CNPJ {message.cnpj}"
+        )
+
+    if cache and cache.status == "FAILED":
+        return ViewsHelper.make_response(
+            data=cache,
+            message=f"Scraping job recently failed for CNPJ {message.cnpj}, try again later",
+        )
+
+    if message.callback_url:
+        await service.add_callback(
+            message.cnpj,
+            message.callback_url,
+            settings.scrape_claim_ttl,
+        )
+
+    if cache and cache.status in ScrapeService.IN_FLIGHT_STATUSES:
+        message.status = cache.status
+        return ViewsHelper.make_response(
+            data=message,
+            message=f"Scraping job already in progress for CNPJ {message.cnpj}",
+        )
 
     try:
-        await rabbitmq_client.publish(message)
+        queued = await service.enqueue_job(
+            message, request.app.state.rabbitmq_client, settings.scrape_claim_ttl
+        )
     except Exception as e:
+        if stale:
+            return ViewsHelper.make_response(
+                data=cache,
+                message=f"Stale cached result found for CNPJ {message.cnpj}, refresh failed: {str(e)}",
+            )
         return ViewsHelper.make_response(
             message=f"Failed to create scraping job: {str(e)}",
             status="error",
             http_code=500,
         )
 
+    if stale:
+        return ViewsHelper.make_response(
+            data=cache,
+            message=f"Stale cached result found for CNPJ {message.cnpj}, refresh queued",
+        )
+
+    if not queued:
+        return ViewsHelper.make_response(
+            data=message,
+            message=f"Scraping job already queued for CNPJ {message.cnpj}",
+        )
+
     return ViewsHelper.make_response(data=message)
+
+
+@router.post(
+    "/batch",
+    response_model=BaseResponse,
+    responses={
+        200: {"description": "Returns the status of the scraping job of each CNPJ"},
+        422: {"description": "Too many CNPJs in a single batch"},
+        500: {"description": "Internal server error"},
+    },
+)
+async def scrape_batch(
+    request: Request,
+    batch: BatchRequestDTO,
+    x_tenant_id: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint to create scraping jobs for many CNPJs at once.
+    The jobs go to the "bulk" lane by default, so backfills do not delay single lookups.
+    Cached results and in-flight jobs are resolved with a single Redis round trip, stale
+    results are returned and refreshed, recently failed jobs are not retried,
+    and the new jobs are published over a single RabbitMQ channel with publisher confirms.
+    """
+
+    settings = request.app.state.settings
+
+    if len(batch.cnpjs) > settings.batch_max_size:
+        return ViewsHelper.make_response(
+            message=f"Batches are limited to {settings.batch_max_size} CNPJs",
+            status="error",
+            http_code=422,
+        )
+
+    validated = ViewsHelper.validate_cnpjs(
+        batch.cnpjs, priority=batch.priority, tenant=x_tenant_id
+    )
+    messages = {
+        message.cnpj: message for _, message in validated if message is not None
+    }
+
+    service = ViewsHelper.scrape_service(request)
+    caches = await service.get_cache_many(list(messages))
+
+    stale = {
+        cnpj for cnpj, cache in caches.items() if cache and service.is_stale(cache)
+    }
+    pending = [cnpj for cnpj, cache in caches.items() if not cache or cnpj in stale]
+    claims = await service.claim_jobs(pending, settings.scrape_claim_ttl)
+    claimed = [cnpj for cnpj in pending if claims[cnpj]]
+
+    rabbitmq_client = request.app.state.rabbitmq_client
+
+    try:
+        errors = await rabbitmq_client.publish_many([messages[c] for c in claimed])
+    except Exception as e:
+        await service.release_jobs(claimed)
+        return ViewsHelper.make_response(
+            message=f"Failed to create scraping jobs: {str(e)}",
+            status="error",
+            http_code=500,
+        )
+
+    failed = {cnpj: error for cnpj, error in zip(claimed, errors) if error}
+    await service.release_jobs(list(failed))
+
+    items = []
+    for raw_cnpj, message in validated:
+        if message is None:
+            item = BatchItemDTO(
+                cnpj=raw_cnpj, status="INVALID", message="Invalid CNPJ format"
+            )
+        elif message.cnpj in failed:
+            item = BatchItemDTO(
+                cnpj=message.cnpj,
+                status="ERROR",
+                message=f"Failed to create scraping job: {failed[message.cnpj]}",
+            )
+        elif message.cnpj in stale:
+            item = BatchItemDTO(
+                cnpj=message.cnpj,
+                status="COMPLETED",
+                message="Stale result, refresh queued",
+                data=caches[message.cnpj].data,
+            )
+        elif caches[message.cnpj] and caches[message.cnpj].status in (
+            "COMPLETED",
+            "FAILED",
+        ):
+            item = BatchItemDTO(
+                cnpj=message.cnpj,
+                status=caches[message.cnpj].status,
+                data=caches[message.cnpj].data,
+            )
+        elif (
+            caches[message.cnpj]
+            and caches[message.cnpj].status in ScrapeService.IN_FLIGHT_STATUSES
+        ):
+            item = BatchItemDTO(cnpj=message.cnpj, status=caches[message.cnpj].status)
+        else:
+            item = BatchItemDTO(cnpj=message.cnpj, status="QUEUED")
+        items.append(item)
+
+    return ViewsHelper.make_response(data=items)
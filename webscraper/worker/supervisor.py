@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from prometheus_client import multiprocess
+
+from webscraper.config import Settings
+from webscraper.worker.worker import ScrapeWorker
+
+from webscraper.exceptions import InvalidParameterException
+
+from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
+
+HEARTBEAT_INTERVAL = 1
+
+
+def run_worker_process(heartbeat):
+    """
+    Entry point of a worker process: runs a ScrapeWorker with its own event loop,
+    browser pool and RabbitMQ consumer until it receives SIGTERM or SIGINT.
+
+    :param multiprocessing.Value heartbeat: Shared timestamp refreshed while the event loop is responsive
+    :rtype: None
+    """
+    Log.setup(logging.INFO)
+    asyncio.run(_run_worker(heartbeat))
+
+
+async def _run_worker(heartbeat):
+    """
+    :param multiprocessing.Value heartbeat: Shared timestamp refreshed while the event loop is responsive
+    :rtype: None
+    """
+    worker = ScrapeWorker(Settings())
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, worker.stop)
+
+    async def beat_forever():
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    beat_task = asyncio.create_task(beat_forever())
+    try:
+        await worker.start_worker()
+    finally:
+        beat_task.cancel()
+
+
+class WorkerProcess(object):
+    """
+    A slot of the supervisor, holding the current process running it and its restart backoff.
+    """
+
+    def __init__(self, index, heartbeat):
+        """
+        :param int index: Position of the slot in the supervisor
+        :param multiprocessing.Value heartbeat: Shared timestamp of the last heartbeat
+        :rtype: None
+        """
+        self.index = index
+        self.heartbeat = heartbeat
+        self.process = None
+        self.started_at = 0.0
+        self.crashes = 0
+        self.restart_at = 0.0
+
+    @property
+    def alive(self):
+        """
+        :return: True if the slot has a running process
+        :rtype: bool
+        """
+        return self.process is not None and self.process.is_alive()
+
+
+class WorkerSupervisor(object):
+    """
+    Runs several worker processes on the same host, so a single container uses all its cores.
+
+    Every process runs its own ScrapeWorker. Processes that exit or stop sending heartbeats
+    are restarted with exponential backoff. On SIGTERM or SIGINT the processes are asked to
+    drain and are killed if they are still running after the drain timeout.
+
+    When prometheus_client runs in multiprocess mode (PROMETHEUS_MULTIPROC_DIR), the metrics
+    of the processes are aggregated by a MultiProcessCollector, see run_supervisor.
+    """
+
+    POLL_INTERVAL = 1
+    SHUTDOWN_MARGIN = 10
+
+    def __init__(
+        self,
+        processes=0,
+        restart_base_delay=1,
+        restart_max_delay=60,
+        heartbeat_timeout=120,
+        drain_timeout=60,
+        target=run_worker_process,
+    ):
+        """
+        :param int processes: Number of worker processes, 0 uses the number of CPUs. Defaults to 0
+        :param float restart_base_delay: Seconds before the first restart of a crashed process.
+        Defaults to 1
+        :param float restart_max_delay: Upper bound of the restart delay. A process that ran for longer
+        than it resets its backoff. Defaults to 60
+        :param float heartbeat_timeout: Seconds without a heartbeat before a process is killed.
+        Defaults to 120
+        :param float drain_timeout: Seconds the processes get to drain their jobs on shutdown. Defaults to 60
+        :param callable(multiprocessing.Value) target: Function run by each process
+        :raises webscraper.exceptions.InvalidParameterException: If processes is negative
+        or the delays are not positive
+        :rtype: None
+        """
+        if processes < 0:
+            raise InvalidParameterException("'processes' must not be negative")
+        if min(restart_base_delay, restart_max_delay, heartbeat_timeout) <= 0:
+            raise InvalidParameterException(
+                "Restart delays and 'heartbeat_timeout' must be greater than 0"
+            )
+
+        self.processes = processes or os.cpu_count() or 1
+        self.restart_base_delay = restart_base_delay
+        self.restart_max_delay = restart_max_delay
+        self.heartbeat_timeout = heartbeat_timeout
+        self.drain_timeout = drain_timeout
+        self.target = target
+
+        # Spawned processes do not inherit the state of the supervisor (locks, threads)
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = [
+            WorkerProcess(index, self._context.Value("d", 0.0, lock=False))
+            for index in range(self.processes)
+        ]
+        self._stopping = False
+        self.logger = Log.get_logger(__name__)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Creates the supervisor configured by the application settings.
+
+        :param webscraper.config.Settings settings: Application settings
+        :return: The supervisor
+        :rtype: WorkerSupervisor
+        """
+        return cls(
+            processes=settings.supervisor_processes,
+            restart_base_delay=settings.supervisor_restart_base_delay,
+            restart_max_delay=settings.supervisor_restart_max_delay,
+            heartbeat_timeout=settings.supervisor_heartbeat_timeout,
+            drain_timeout=settings.worker_drain_timeout,
+        )
+
+    def run(self):
+        """
+        Starts the worker processes and supervises them until SIGTERM or SIGINT.
+
+        :rtype: None
+        """
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle_signal)
+
+        self.logger.info(f"Starting {self.processes} worker process(es)")
+        try:
+            while not self._stopping:
+                self.check()
+                time.sleep(self.POLL_INTERVAL)
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        """
+        Makes run() shut the worker processes down and return.
+
+        :rtype: None
+        """
+        self._stopping = True
+
+    def _handle_signal(self, signum, frame):
+        """
+        :param int signum: The received signal
+        :param frame: Current stack frame
+        :rtype: None
+        """
+        self.logger.info(f"Received {signal.Signals(signum).name}, stopping workers")
+        self.stop()
+
+    def check(self):
+        """
+        Starts the processes that are due, and schedules the restart of the ones that
+        exited or stopped sending heartbeats.
+
+        :rtype: None
+        """
+        now = time.time()
+        for slot in self._slots:
+            if slot.process is None:
+                if now >= slot.restart_at:
+                    self._start(slot)
+            elif not slot.process.is_alive():
+                self._reap(slot, f"exited with code {slot.process.exitcode}", "exited")
+            elif now - slot.heartbeat.value > self.heartbeat_timeout:
+                slot.process.kill()
+                slot.process.join()
+                self._reap(
+                    slot,
+                    f"sent no heartbeat for {self.heartbeat_timeout} seconds",
+                    "unresponsive",
+                )
+
+        Metrics.WORKER_PROCESSES.set(sum(slot.alive for slot in self._slots))
+
+    def _start(self, slot):
+        """
+        :param WorkerProcess slot: The slot to start a process in
+        :rtype: None
+        """
+        # The heartbeat timeout also covers the startup of the process
+        slot.heartbeat.value = slot.started_at = time.time()
+        slot.process = self._context.Process(
+            target=self.target,
+            args=(slot.heartbeat,),
+            name=f"webscraper-worker-{slot.index}",
+        )
+        slot.process.start()
+        self.logger.info(
+            f"Worker process {slot.index} started with pid {slot.process.pid}"
+        )
+
+    def _reap(self, slot, cause, reason):
+        """
+        Forgets a finished process and schedules its restart with exponential backoff.
+
+        :param WorkerProcess slot: The slot of the finished process
+        :param str cause: Description of why the process finished, for the logs
+        :param str reason: Label of the restart metric
+        :rtype: None
+        """
+        now = time.time()
+        self._mark_dead(slot.process)
+        slot.process = None
+
+        if now - slot.started_at >= self.restart_max_delay:
+            slot.crashes = 0
+        slot.crashes += 1
+        delay = min(
+            self.restart_base_delay * 2 ** (slot.crashes - 1), self.restart_max_delay
+        )
+        slot.restart_at = now + delay
+
+        Metrics.WORKER_RESTARTS_TOTAL.labels(reason=reason).inc()
+        self.logger.error(
+            f"Worker process {slot.index} {cause}, restarting in {delay:.1f} seconds"
+        )
+
+    def shutdown(self):
+        """
+        Asks every process to drain and stop, killing the ones still running after
+        the drain timeout.
+
+        :rtype: None
+        """
+        running = [slot.process for slot in self._slots if slot.alive]
+        for process in running:
+            process.terminate()
+
+        deadline = time.time() + self.drain_timeout + self.SHUTDOWN_MARGIN
+        for process in running:
+            process.join(max(deadline - time.time(), 0))
+            if process.is_alive():
+                self.logger.warning(
+                    f"Worker process {process.pid} did not stop in time, killing it"
+                )
+                process.kill()
+                process.join()
+
+        for slot in self._slots:
+            if slot.process is not None:
+                self._mark_dead(slot.process)
+                slot.process = None
+
+        Metrics.WORKER_PROCESSES.set(0)
+        self.logger.info("All worker processes stopped")
+
+    @staticmethod
+    def _mark_dead(process):
+        """
+        Drops the live gauges of a finished process from the multiprocess metrics.
+
+        :param multiprocessing.Process process: The finished process
+        :rtype: None
+        """
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            multiprocess.mark_process_dead(process.pid)
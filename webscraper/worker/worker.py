@@ -1,16 +1,31 @@
 import aio_pika
 import asyncio
+import time
 import pydantic
 
 from webscraper.clients.rabbitmq import AsyncRabbitMQClient
 from webscraper.clients.redis import AsyncRedisClient
+from webscraper.clients.browser_pool import BrowserPool
+from webscraper.clients.result_store import ResultStore
 
 from webscraper.models.message_dto import ScrapeJobMessageDTO
 from webscraper.models.cache_dto import CacheMessageDTO
 
 from webscraper.services.scrape import ScrapeService
+from webscraper.services.http_engine import HttpScrapeEngine
+from webscraper.services.callbacks import CallbackService
+from webscraper.services.cache_policy import CacheTTLPolicy
+from webscraper.services.retry_policy import RetryPolicy
+from webscraper.services.refresh import RefreshScheduler
+from webscraper.services.resource_blocking import ResourceBlocker
+from webscraper.services.throttle import (
+    CircuitBreaker,
+    RateLimiter,
+    is_upstream_failure,
+)
 
 from webscraper.helpers.log import Log
+from webscraper.helpers.metrics import Metrics
 
 from webscraper.exceptions import InvalidRabbitMQMessageException
 
@@ -25,10 +40,67 @@ class ScrapeWorker(object):
         """
 
         self._rabbitmq_client = AsyncRabbitMQClient(
-            settings.rabbitmq_url, settings.rabbitmq_queue
+            settings.rabbitmq_url,
+            settings.rabbitmq_queue,
+            publisher_confirms=settings.rabbitmq_publisher_confirms,
         )
-        self._redis_client = AsyncRedisClient(settings.redis_url)
-        self._scrape_service = ScrapeService(settings.scrape_url, self._redis_client)
+        self._redis_client = AsyncRedisClient.from_settings(settings)
+        self._browser_pool = BrowserPool(
+            size=settings.browser_pool_size,
+            max_pages=settings.browser_max_pages,
+            max_jobs_per_browser=settings.browser_max_jobs,
+            headless=settings.browser_headless,
+        )
+        self._http_engine = None
+        if settings.scrape_engine == "http":
+            self._http_engine = HttpScrapeEngine(
+                settings.scrape_url,
+                timeout=settings.scrape_http_timeout,
+                max_connections=settings.scrape_http_max_connections,
+            )
+        self._result_store = ResultStore.from_settings(settings)
+        self._scrape_service = ScrapeService(
+            settings.scrape_url,
+            self._redis_client,
+            self._browser_pool,
+            http_engine=self._http_engine,
+            http_fallback=settings.scrape_http_fallback,
+            ttl_policy=CacheTTLPolicy.from_settings(settings),
+            resource_blocker=ResourceBlocker.from_settings(settings),
+            wait_until=settings.browser_wait_until,
+            reuse_form_page=settings.browser_reuse_form_page,
+            reuse_max_jobs=settings.browser_reuse_max_jobs,
+            result_store=self._result_store,
+        )
+        self._rate_limiter = None
+        self._circuit_breaker = None
+        if settings.upstream_rate_limit:
+            self._rate_limiter = RateLimiter.from_settings(self._redis_client, settings)
+            self._circuit_breaker = CircuitBreaker.from_settings(
+                self._redis_client, settings
+            )
+        self._retry_policy = RetryPolicy.from_settings(settings)
+        self._refresh_scheduler = None
+        if settings.refresh_enabled:
+            self._refresh_scheduler = RefreshScheduler.from_settings(
+                self._redis_client, settings
+            )
+        self._callback_service = CallbackService.from_settings(settings)
+        self._callback_tasks = set()
+        self._health_check_interval = settings.browser_health_check_interval
+        self._stats_interval = settings.worker_stats_interval
+        self._drain_timeout = settings.worker_drain_timeout
+        self._concurrency = settings.worker_concurrency
+        self._in_flight = 0
+        prefetch = settings.worker_concurrency * settings.worker_prefetch_multiplier
+        self._prefetch = {
+            "interactive": prefetch,
+            "bulk": max(prefetch, settings.worker_bulk_prefetch),
+        }
+        self._lane_weights = {
+            "interactive": settings.worker_interactive_weight,
+            "bulk": settings.worker_bulk_weight,
+        }
 
         self.logger = Log.get_logger(__name__)
 
@@ -39,12 +111,136 @@ class ScrapeWorker(object):
         :return: None
         """
 
+        health_check_task = None
+        stats_task = None
+        Metrics.WORKER_CONCURRENCY.set(self._concurrency)
+        Metrics.WORKER_DRAINING.set(0)
+
         try:
+            # With the HTTP engine the pool is only started on the first fallback
+            if not self._http_engine:
+                await self._browser_pool.start()
+            health_check_task = asyncio.create_task(self._health_check_forever())
+            stats_task = asyncio.create_task(self._report_load_forever())
+
             await self._rabbitmq_client.connect()
-            await self._rabbitmq_client.consume_forever(self.process_message)
+            await self._rabbitmq_client.consume_forever(
+                self.process_message,
+                concurrency=self._concurrency,
+                weights=self._lane_weights,
+                prefetch=self._prefetch,
+                gate=self._wait_for_upstream if self._rate_limiter else None,
+                drain_timeout=self._drain_timeout,
+            )
         except aio_pika.exceptions.AMQPConnectionError:
             self.logger.warning("Connection lost to RabbitMQ. Retrying in 5 seconds...")
             await asyncio.sleep(5)
+        finally:
+            for task in (health_check_task, stats_task):
+                if task:
+                    task.cancel()
+            await self._scrape_service.close()
+            await self._browser_pool.close()
+            if self._http_engine:
+                await self._http_engine.close()
+            if self._callback_tasks:
+                await asyncio.gather(*self._callback_tasks, return_exceptions=True)
+            await self._callback_service.close()
+            await self._redis_client.close()
+            if self._result_store:
+                await self._result_store.close()
+            Metrics.WORKER_DRAINING.set(0)
+            self.logger.info("Worker stopped")
+
+    def stop(self):
+        """
+        Stops the worker gracefully: no more messages are consumed, the in-flight jobs get up to
+        'worker_drain_timeout' seconds to finish and then the browser, Redis and RabbitMQ are closed.
+        Safe to call from a signal handler.
+
+        :return: None
+        """
+        self.logger.info(
+            f"Stopping worker, draining {self._in_flight} in-flight job(s) "
+            f"for up to {self._drain_timeout} seconds"
+        )
+        Metrics.WORKER_DRAINING.set(1)
+        self._rabbitmq_client.stop()
+
+    async def _report_load_forever(self):
+        """
+        Periodically refreshes the queue depth and utilization metrics an autoscaler sizes the
+        workers from.
+
+        :return: None
+        """
+        while True:
+            Metrics.WORKER_UTILIZATION.set(self._in_flight / self._concurrency)
+            try:
+                depths = await self._rabbitmq_client.queue_depths()
+                for queue, depth in depths.items():
+                    Metrics.QUEUE_DEPTH.labels(queue=queue).set(depth)
+            except Exception as e:
+                self.logger.error(f"Error while reading the queue depths: {e}")
+            await asyncio.sleep(self._stats_interval)
+
+    async def _health_check_forever(self):
+        """
+        Periodically checks the browser pool, restarting crashed browsers.
+
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self._health_check_interval)
+            if not self._browser_pool.started:
+                continue
+            try:
+                if not await self._browser_pool.health_check():
+                    self.logger.warning("Browser pool is unhealthy")
+            except Exception as e:
+                self.logger.error(f"Error while checking browser pool health: {e}")
+
+    async def _wait_for_upstream(self):
+        """
+        Waits while the circuit breaker is open and then for a token of the rate limiter.
+        Fails open if Redis is unavailable, so a Redis outage does not stop the workers.
+
+        :return: None
+        """
+        try:
+            remaining = await self._circuit_breaker.check()
+            if remaining:
+                self.logger.warning(
+                    f"Circuit breaker is open, pausing consumption for {remaining:.1f} seconds"
+                )
+            while remaining:
+                await asyncio.sleep(remaining)
+                remaining = await self._circuit_breaker.check()
+
+            await self._rate_limiter.acquire()
+        except Exception as e:
+            self.logger.error(f"Error while checking the upstream rate limit: {e}")
+
+    async def _record_upstream(self, error=None):
+        """
+        Feeds the outcome of a scrape to the rate limiter and the circuit breaker.
+        Errors that are not caused by the target site are ignored.
+
+        :param Exception error: The error raised while scraping, None if it succeeded
+        :return: None
+        """
+        if not self._rate_limiter or (error and not is_upstream_failure(error)):
+            return
+
+        try:
+            if error:
+                await self._rate_limiter.record_failure()
+                await self._circuit_breaker.record_failure()
+            else:
+                await self._rate_limiter.record_success()
+                await self._circuit_breaker.record_success()
+        except Exception as e:
+            self.logger.error(f"Error while recording the upstream health: {e}")
 
     async def process_message(self, message_body):
         """
@@ -54,28 +250,146 @@ class ScrapeWorker(object):
         Should be able to be translated to ScrapeJobMessageDTO
         """
 
-        self.logger.info("Processing message:", message_body)
+        self.logger.debug("Processing message: %s", message_body)
 
         try:
             message = ScrapeJobMessageDTO(**message_body)
         except pydantic.ValidationError:
-            self.logger.error("Invalid message format:", message_body)
+            self.logger.error("Invalid message format: %s", message_body)
             raise InvalidRabbitMQMessageException("Invalid message format")
 
-        await self._scrape_service.set_cache(
-            message.cnpj, CacheMessageDTO(status="IN_PROGRESS")
-        )
+        started = time.time()
+        waited = max(started - message.created_at, 0)
+        Metrics.QUEUE_WAIT_SECONDS.labels(lane=message.priority).observe(waited)
+        Metrics.QUEUE_LAG_SECONDS.labels(lane=message.priority).set(waited)
+        Metrics.JOBS_IN_FLIGHT.inc()
+        self._in_flight += 1
+        Metrics.WORKER_UTILIZATION.set(self._in_flight / self._concurrency)
 
         try:
-            data = await self._scrape_service.scrape(message.cnpj)
-        except Exception as e:
-            self.logger.error(f"Error scraping data for CNPJ {message.cnpj}: {e}")
+            previous = await self._previous_result(message.cnpj)
             await self._scrape_service.set_cache(
-                message.cnpj, CacheMessageDTO(status="FAILED", data={str(e)})
+                message.cnpj, CacheMessageDTO(status="IN_PROGRESS")
+            )
+
+            try:
+                data = await self._scrape_service.scrape(message.cnpj)
+                self.logger.debug("Scraped data for CNPJ %s: %s", message.cnpj, data)
+                cache = CacheMessageDTO(status="COMPLETED", data=data)
+                await self._record_upstream()
+                await self._record_refresh(message.cnpj, data, previous)
+            except Exception as e:
+                self.logger.error(f"Error scraping data for CNPJ {message.cnpj}: {e}")
+                await self._record_upstream(e)
+                cache = await self._handle_failure(message, e)
+
+            await self._scrape_service.set_cache(
+                message.cnpj, cache, release=cache.status != "RETRYING"
+            )
+            Metrics.JOB_SECONDS.labels(status=cache.status).observe(
+                time.time() - started
             )
+        finally:
+            Metrics.JOBS_IN_FLIGHT.dec()
+            self._in_flight -= 1
+            Metrics.WORKER_UTILIZATION.set(self._in_flight / self._concurrency)
+
+        if cache.status != "RETRYING":
+            await self._notify_callbacks(message, cache)
+
+    async def _previous_result(self, cnpj):
+        """
+        Reads the data of the last COMPLETED result of a CNPJ before it is overwritten,
+        so the refresh scheduler can report which fields changed.
+
+        :param str cnpj: The CNPJ number
+        :return: The previous data, None if unknown or if changes are not tracked
+        :rtype: dict | None
+        """
+        if not self._refresh_scheduler:
+            return None
+
+        try:
+            cache = await self._scrape_service.get_cache(cnpj)
+        except Exception as e:
+            self.logger.error(f"Error while reading the previous result of {cnpj}: {e}")
+            return None
+        return cache.data if cache and cache.status == "COMPLETED" else None
+
+    async def _record_refresh(self, cnpj, data, previous):
+        """
+        Feeds a COMPLETED result to the change statistics of the refresh scheduler.
+
+        :param str cnpj: The CNPJ number
+        :param dict data: The scraped data
+        :param dict previous: The data of the previous result, if known
+        :return: None
+        """
+        if not self._refresh_scheduler:
+            return
+
+        try:
+            await self._refresh_scheduler.record_result(cnpj, data, previous)
+        except Exception as e:
+            self.logger.error(f"Error while recording the refresh of {cnpj}: {e}")
+
+    async def _handle_failure(self, message, error):
+        """
+        Schedules a delayed retry of a failed job, or dead-letters it when it ran out of retries.
+        The claim of the CNPJ is kept while the job waits for its retry.
+
+        :param webscraper.models.message_dto.ScrapeJobMessageDTO message: The failed job
+        :param Exception error: The error raised while scraping
+        :return: The RETRYING or FAILED status to cache
+        :rtype: webscraper.models.cache_dto.CacheMessageDTO
+        """
+        message.attempts += 1
+        message.last_error = str(error)
+        data = {"error": str(error), "attempts": message.attempts}
+
+        if self._retry_policy.should_retry(message.attempts, error):
+            delay = self._retry_policy.delay(message.attempts)
+            try:
+                await self._rabbitmq_client.publish_delayed(
+                    message, delay, message.attempts
+                )
+                Metrics.JOB_RETRIES_TOTAL.labels(lane=message.priority).inc()
+                return CacheMessageDTO(
+                    status="RETRYING", data={**data, "retry_in": round(delay, 3)}
+                )
+            except Exception as e:
+                self.logger.error(
+                    f"Failed to schedule a retry for CNPJ {message.cnpj}: {e}"
+                )
+        elif self._retry_policy.is_retryable(error):
+            try:
+                await self._rabbitmq_client.publish_dead(message)
+                Metrics.DEAD_LETTERS_TOTAL.labels(lane=message.priority).inc()
+            except Exception as e:
+                self.logger.error(
+                    f"Failed to dead-letter the job of CNPJ {message.cnpj}: {e}"
+                )
+
+        return CacheMessageDTO(status="FAILED", data=data)
+
+    async def _notify_callbacks(self, message, cache):
+        """
+        Notifies the callback URLs registered for the job in the background.
+
+        :param webscraper.models.message_dto.ScrapeJobMessageDTO message: The finished job
+        :param webscraper.models.cache_dto.CacheMessageDTO cache: The result of the job
+        :rtype: None
+        """
+        callback_urls = await self._scrape_service.pop_callbacks(message.cnpj)
+        if message.callback_url:
+            callback_urls.add(message.callback_url)
+
+        if not callback_urls:
             return
 
-        self.logger.info(f"Scraped data for CNPJ {message.cnpj}: {data}")
-        await self._scrape_service.set_cache(
-            message.cnpj, CacheMessageDTO(status="COMPLETED", data=data)
+        payload = {"cnpj": message.cnpj, **cache.model_dump()}
+        task = asyncio.create_task(
+            self._callback_service.notify(callback_urls, payload)
         )
+        self._callback_tasks.add(task)
+        task.add_done_callback(self._callback_tasks.discard)